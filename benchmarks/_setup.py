@@ -0,0 +1,51 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+The scripts are not part of the test suite. Run them from the
+repository root, e.g. `python benchmarks/batched_updates.py`.
+"""
+
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import django
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(
+        SECRET_KEY='secret',
+        INSTALLED_APPS=[
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'rdf',
+            'sparql',
+        ],
+        REST_FRAMEWORK={},
+        RDF_NAMESPACE_ROOT='http://localhost:8000/',
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': 'rdf-benchmark',
+            }
+        },
+    )
+    django.setup()
+
+
+class Timer:
+    """ Context manager that records the wall time of its block. """
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = perf_counter() - self.start
+
+
+def report(label, **columns):
+    cells = ', '.join('{}={}'.format(key, value) for key, value in columns.items())
+    print('{:<32} {}'.format(label, cells))
@@ -0,0 +1,65 @@
+"""
+Compare per-triple and batched writes through append_triples and
+prune_triples, using the in-process SPARQL stand-in with a simulated
+round-trip latency.
+"""
+
+import argparse
+
+import _setup
+from rdflib import Graph, Literal, URIRef
+
+from rdf.test_apps.local_store import LocalSPARQLStore
+from rdf.utils import append_triples, prune_triples
+
+EX = 'http://example.com/'
+
+
+def make_triples(n):
+    return [
+        (URIRef('{}item/{}'.format(EX, i)), URIRef(EX + 'label'), Literal(i))
+        for i in range(n)
+    ]
+
+
+def per_triple(graph, triples, method):
+    for triple in triples:
+        getattr(graph, method)(triple)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--triples', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='simulated seconds per round trip')
+    args = parser.parse_args()
+    triples = make_triples(args.triples)
+    identifier = URIRef(EX + 'graph')
+
+    store = LocalSPARQLStore(latency=args.latency)
+    graph = Graph(store, identifier=identifier)
+    with _setup.Timer() as add:
+        per_triple(graph, triples, 'add')
+    with _setup.Timer() as remove:
+        per_triple(graph, triples, 'remove')
+    _setup.report('per-triple add', seconds=round(add.elapsed, 3),
+                  round_trips=args.triples)
+    _setup.report('per-triple remove', seconds=round(remove.elapsed, 3),
+                  round_trips=args.triples)
+
+    store = LocalSPARQLStore(latency=args.latency)
+    graph = Graph(store, identifier=identifier)
+    with _setup.Timer() as add:
+        append_triples(graph, triples, args.batch_size)
+    trips = store.round_trips
+    with _setup.Timer() as remove:
+        prune_triples(graph, triples, args.batch_size)
+    _setup.report('batched append_triples', seconds=round(add.elapsed, 3),
+                  round_trips=trips)
+    _setup.report('batched prune_triples', seconds=round(remove.elapsed, 3),
+                  round_trips=store.round_trips - trips)
+
+
+if __name__ == '__main__':
+    main()
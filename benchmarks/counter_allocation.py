@@ -0,0 +1,77 @@
+"""
+Compare the throughput of subject URI allocation with BaseCounter:
+one `increment` per URI versus `allocate` from reserved blocks, with
+several threads allocating at once.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import _setup
+from django.db import connection, connections
+
+from rdf.baseclasses import BaseCounter, _blocks
+
+
+class BenchmarkCounter(BaseCounter):
+    class Meta:
+        app_label = 'rdf'
+
+    namespace = 'http://example.com/item/'
+
+
+def increment(n):
+    uris = []
+    for _ in range(n):
+        counter = BenchmarkCounter.current
+        counter.increment()
+        uris.append(str(counter))
+    return uris
+
+
+def allocate(n):
+    return [BenchmarkCounter.allocate() for _ in range(n)]
+
+
+def run(method, threads, per_thread):
+    def work(_):
+        try:
+            return method(per_thread)
+        finally:
+            connections.close_all()
+
+    with _setup.Timer() as timer:
+        with ThreadPoolExecutor(threads) as executor:
+            uris = [uri for batch in executor.map(work, range(threads)) for uri in batch]
+    assert len(set(uris)) == len(uris), 'duplicate URIs'
+    return timer.elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--uris', type=int, default=400,
+                        help='URIs allocated per thread')
+    parser.add_argument('--block-size', type=int, default=100)
+    args = parser.parse_args()
+    BenchmarkCounter.block_size = args.block_size
+
+    with connection.schema_editor() as editor:
+        editor.create_model(BenchmarkCounter)
+    try:
+        total = args.threads * args.uris
+        for label, method in (('increment', increment), ('allocate', allocate)):
+            _blocks.clear()
+            elapsed = run(method, args.threads, args.uris)
+            _setup.report(
+                label, threads=args.threads, uris=total,
+                seconds='{:.3f}'.format(elapsed),
+                per_second='{:.0f}'.format(total / elapsed),
+            )
+    finally:
+        with connection.schema_editor() as editor:
+            editor.delete_model(BenchmarkCounter)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare `rdf.store.FrozenStore` with rdflib's Memory store, in memory
+footprint and in the time of subject and predicate lookups.
+"""
+
+import argparse
+import gc
+import random
+import tracemalloc
+
+import _setup
+from rdflib import Graph, Literal, URIRef
+
+from rdf.ns import RDF, RDFS, SKOS
+from rdf.store import freeze_graph
+
+EX = 'http://example.com/'
+
+
+def make_triples(n):
+    """ Vocabulary-like data with 5 * `n` triples. """
+    triples = []
+    for i in range(n):
+        concept = URIRef('{}concept/{}'.format(EX, i))
+        triples.extend((
+            (concept, RDF.type, SKOS.Concept),
+            (concept, SKOS.prefLabel, Literal('concept {}'.format(i), lang='en')),
+            (concept, SKOS.altLabel, Literal('term {}'.format(i))),
+            (concept, SKOS.broader, URIRef('{}concept/{}'.format(EX, i // 10))),
+            (concept, RDFS.comment, Literal('A concept numbered {}.'.format(i))),
+        ))
+    return triples
+
+
+def make_graph(triples):
+    graph = Graph()
+    for triple in triples:
+        graph.add(triple)
+    return graph
+
+
+def traced_size(build):
+    """
+    Return the result of `build()` and the memory it allocated.
+
+    The terms are created beforehand, so only the indexes are counted.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def lookups(graph, subjects):
+    count = 0
+    for subject in subjects:
+        count += len(list(graph.triples((subject, None, None))))
+    count += len(list(graph.triples((None, SKOS.broader, URIRef(EX + 'concept/1')))))
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concepts', type=int, default=50000)
+    parser.add_argument('--lookups', type=int, default=10000)
+    args = parser.parse_args()
+    triples = make_triples(args.concepts)
+    memory, memory_size = traced_size(lambda: make_graph(triples))
+    frozen, frozen_size = traced_size(lambda: freeze_graph(memory))
+    subjects = [
+        URIRef('{}concept/{}'.format(EX, random.randrange(args.concepts)))
+        for _ in range(args.lookups)
+    ]
+    for label, graph, size in (('memory', memory, memory_size),
+                               ('frozen', frozen, frozen_size)):
+        with _setup.Timer() as timer:
+            count = lookups(graph, subjects)
+        _setup.report(label, triples=len(graph), mb=round(size / 2 ** 20, 1),
+                      lookup_seconds=round(timer.elapsed, 3), matches=count)
+
+
+if __name__ == '__main__':
+    main()
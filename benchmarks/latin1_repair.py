@@ -0,0 +1,72 @@
+"""
+Compare repairing latin-1 encoded literals with one `add` and one
+`remove` round trip per triple versus the paged, batched updates of
+`manage.py repairlatin1`, with several workers.
+"""
+
+import argparse
+from datetime import datetime, timezone
+
+import _setup
+from rdflib import Graph, Literal, URIRef
+
+from rdf.management.commands.repairlatin1 import Command
+from rdf.ns import DCTERMS, RDFS, XSD
+from rdf.test_apps.local_store import LocalSPARQLStore
+from rdf.utils import latin1_pages, latin1_to_utf8
+
+GRAPH = URIRef('http://example.com/graph')
+
+
+def fill(store, subjects):
+    graph = store.dataset.get_context(GRAPH)
+    created = Literal(datetime.now(timezone.utc))
+    for n in range(subjects):
+        subject = URIRef('http://example.com/item/{}'.format(n))
+        graph.add((subject, DCTERMS.created, created))
+        graph.add((subject, RDFS.label, Literal('cafÃ© {}'.format(n), datatype=XSD.string)))
+    store.reset_log()
+
+
+def per_triple(graph, page_size):
+    triples = [t for _, page in latin1_pages(graph, page_size) for t in page]
+    for s, p, o in triples:
+        graph.add((s, p, Literal(latin1_to_utf8(str(o)), datatype=o.datatype)))
+        graph.remove((s, p, o))
+
+
+def batched(workers):
+    def repair(graph, page_size):
+        Command().repair(graph, latin1_pages(graph, page_size), workers)
+    return repair
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subjects', type=int, default=500)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='seconds per store round trip')
+    args = parser.parse_args()
+
+    methods = (
+        ('per triple', per_triple),
+        ('batched, 1 worker', batched(1)),
+        ('batched, 4 workers', batched(4)),
+    )
+    for label, method in methods:
+        store = LocalSPARQLStore(latency=args.latency)
+        fill(store, args.subjects)
+        graph = Graph(store, identifier=GRAPH)
+        with _setup.Timer() as timer:
+            method(graph, args.page_size)
+        assert not any('Ã' in o for o in store.dataset.objects(None, RDFS.label))
+        _setup.report(
+            label, subjects=args.subjects,
+            seconds='{:.3f}'.format(timer.elapsed),
+            round_trips=store.round_trips,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare the streaming SPARQL results renderers with the previous
+serialize, parse and re-encode approach, in time and peak memory.
+"""
+
+import argparse
+import json
+import tracemalloc
+from io import StringIO
+
+import _setup
+from rdflib import Literal, URIRef, Variable
+from rdflib.plugins.sparql.results.jsonresults import JSONResultSerializer
+from rdflib.query import Result
+from rest_framework.renderers import JSONRenderer
+
+from sparql.renderers import (QueryResultsCSVRenderer, QueryResultsJSONRenderer,
+                              QueryResultsXMLRenderer)
+
+EX = 'http://example.com/'
+
+
+def make_results(n):
+    result = Result('SELECT')
+    s, p, o = Variable('s'), Variable('p'), Variable('o')
+    result.vars = [s, p, o]
+    result.bindings = [{
+        s: URIRef('{}item/{}'.format(EX, i)),
+        p: URIRef(EX + 'label'),
+        o: Literal('label {}'.format(i), lang='en'),
+    } for i in range(n)]
+    return result
+
+
+def previous_json(results):
+    with StringIO() as stream:
+        JSONResultSerializer(results).serialize(stream)
+        return JSONRenderer().render(json.loads(stream.getvalue()))
+
+
+def previous_xml(results):
+    return results.serialize(format='xml')
+
+
+def previous_csv(results):
+    return results.serialize(format='csv')
+
+
+def consume(chunks):
+    """ Discard the chunks as a streaming response would, counting bytes. """
+    return sum(len(chunk) for chunk in chunks)
+
+
+def measure(label, function, results):
+    tracemalloc.start()
+    with _setup.Timer() as timer:
+        output = function(results)
+        size = output if isinstance(output, int) else len(output)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    _setup.report(label, seconds=round(timer.elapsed, 3),
+                  peak_mb=round(peak / 2 ** 20, 1), bytes=size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+    results = make_results(args.rows)
+    for label, previous, renderer in (
+        ('json', previous_json, QueryResultsJSONRenderer()),
+        ('xml', previous_xml, QueryResultsXMLRenderer()),
+        ('csv', previous_csv, QueryResultsCSVRenderer()),
+    ):
+        measure(label + ' previous', previous, results)
+        measure(label + ' streaming', lambda r: consume(renderer.render_stream(r)), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare drawing a random sample of resources from a SPARQL endpoint by
+fetching all subjects and then the triples of every sampled subject,
+versus `rdf.utils.sample_resources`, which lets the store pick the
+sample and fetches it in one CONSTRUCT query.
+
+The endpoint (`rdf.test_apps.local_endpoint`) is served over HTTP, so
+the cost of sending every subject to the client is included. It
+evaluates queries with rdflib, which computes the MD5 hashes in Python;
+a real triplestore does so natively.
+"""
+
+import argparse
+import random
+
+import _setup
+from rdflib import Graph, Literal, URIRef
+
+from rdf.ns import RDF, RDFS
+from rdf.connection import PooledSPARQLUpdateStore
+from rdf.test_apps.local_endpoint import LocalSPARQLEndpoint
+from rdf.utils import append_triples, sample_resources
+
+GRAPH = URIRef('http://example.com/graph')
+ITEM = URIRef('http://example.com/Item')
+
+
+def fill(endpoint, subjects):
+    graph = endpoint.dataset.get_context(GRAPH)
+    for n in range(subjects):
+        subject = URIRef('http://example.com/item/{}'.format(n))
+        graph.add((subject, RDF.type, ITEM))
+        graph.add((subject, RDFS.label, Literal('item {}'.format(n))))
+
+
+def client_side(graph, n):
+    subjects = set(graph.subjects())
+    output = Graph()
+    for subject in random.sample(list(subjects), n):
+        append_triples(output, graph.triples((subject, None, None)))
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subjects', type=int, default=20000)
+    parser.add_argument('--sample', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='seconds per round trip')
+    args = parser.parse_args()
+
+    endpoint = LocalSPARQLEndpoint()
+    endpoint.delay = args.latency
+    fill(endpoint, args.subjects)
+    endpoint.start()
+    store = PooledSPARQLUpdateStore(
+        query_endpoint=endpoint.url, update_endpoint=endpoint.url,
+    )
+    graph = Graph(store, identifier=GRAPH)
+    methods = (
+        ('client-side random.sample', client_side),
+        ('sample_resources', sample_resources),
+    )
+    try:
+        for label, method in methods:
+            endpoint.log.clear()
+            with _setup.Timer() as timer:
+                sample = method(graph, args.sample)
+            assert len(set(sample.subjects())) == args.sample
+            _setup.report(
+                label, subjects=args.subjects, sample=args.sample,
+                seconds='{:.3f}'.format(timer.elapsed),
+                round_trips=len(endpoint.log),
+            )
+    finally:
+        endpoint.stop()
+
+
+if __name__ == '__main__':
+    main()
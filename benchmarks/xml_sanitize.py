@@ -0,0 +1,74 @@
+"""
+Compare sanitizing a graph triple by triple, as `xml_sanitize_triple`
+used to, with `rdf.xml.XMLSanitizer`, and rdflib's RDF/XML serializer
+on a cleaned copy with the streaming `RdfXMLRenderer`.
+"""
+
+import argparse
+import re
+import tracemalloc
+
+import _setup
+from rdflib import Graph, Literal, URIRef
+
+from rdf.renderers import RdfXMLRenderer
+from rdf.xml import CLEANABLE_DATATYPES, ILLEGAL_XML_RE, XMLSanitizer
+
+EX = 'http://example.com/'
+
+
+def make_graph(n, dirty_every):
+    graph = Graph()
+    for i in range(n):
+        subject = URIRef('{}item/{}'.format(EX, i))
+        text = 'label {}\x07'.format(i % 100) if i % dirty_every == 0 else 'label {}'.format(i % 100)
+        graph.add((subject, URIRef(EX + 'label'), Literal(text)))
+        graph.add((subject, URIRef(EX + 'comment'), Literal('same text\nfor every item')))
+    return graph
+
+
+def previous_clean_term(term):
+    if not (isinstance(term, Literal) and term.datatype in CLEANABLE_DATATYPES):
+        return term
+    return Literal(re.sub(ILLEGAL_XML_RE, ' ', term.value),
+                   lang=term.language, datatype=term.datatype)
+
+
+def previous_sanitize(graph):
+    cleaned = Graph()
+    for triple in graph:
+        if any(isinstance(term, Literal) for term in triple):
+            triple = tuple(previous_clean_term(t) for t in triple)
+        cleaned.add(triple)
+    return cleaned
+
+
+def measure(label, function, *args):
+    tracemalloc.start()
+    with _setup.Timer() as timer:
+        output = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    _setup.report(label, seconds=round(timer.elapsed, 3),
+                  peak_mb=round(peak / 2 ** 20, 1), size=output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subjects', type=int, default=20000)
+    parser.add_argument('--dirty-every', type=int, default=10,
+                        help='one in this many labels has a control character')
+    args = parser.parse_args()
+    graph = make_graph(args.subjects, args.dirty_every)
+    measure('sanitize previous', lambda: len(previous_sanitize(graph)))
+    measure('sanitize XMLSanitizer', lambda: sum(1 for _ in XMLSanitizer().triples(graph)))
+    measure('rdf/xml previous', lambda: len(
+        previous_sanitize(graph).serialize(format='xml', encoding='utf-8')
+    ))
+    measure('rdf/xml streaming', lambda: sum(
+        map(len, RdfXMLRenderer().render_stream(graph))
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class RdfConfig(AppConfig):
     name = 'rdf'
+
+    def ready(self):
+        # Start counting graph changes for HTTP validators.
+        from . import versions
@@ -0,0 +1,55 @@
+"""
+ASGI middleware for asynchronous RDF and SPARQL views.
+
+Django 3.2 reads the request body and then runs the view to completion,
+even if the client has gone away in the meantime. `CancelOnDisconnect`
+listens for the disconnect instead and cancels the request handler when
+it arrives. Asynchronous views (see `rdf.views.AsyncViewMixin`) are
+cancelled while they await the triplestore, which closes the upstream
+connection. Wrap the application in your asgi.py:
+
+    application = CancelOnDisconnect(get_asgi_application())
+"""
+
+import asyncio
+
+
+class CancelOnDisconnect:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        body_received = asyncio.Event()
+        disconnected = asyncio.Event()
+
+        async def receive_body():
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+            if not message.get('more_body', False):
+                body_received.set()
+            return message
+
+        handler = asyncio.ensure_future(self.app(scope, receive_body, send))
+
+        async def watch():
+            # The application does not read any further messages after the
+            # body, so the next message can only be a disconnect.
+            await body_received.wait()
+            while not disconnected.is_set():
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    disconnected.set()
+            handler.cancel()
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not disconnected.is_set():
+                raise
+        finally:
+            watcher.cancel()
@@ -1,17 +1,63 @@
-from django.db import models
-from django.db.models import F
-from django.db.transaction import atomic
+import os
+from threading import Lock
+
+from django.db import models, router, transaction
 # See https://docs.djangoproject.com/en/3.2/_modules/django/utils/functional
 from django.utils.functional import classproperty
 
+# Primary key of the singleton row that `BaseCounter.current` creates.
+SINGLETON_PK = 1
+
+# Per-process blocks of reserved counts, see BaseCounter.allocate.
+_blocks = {}
+_blocks_lock = Lock()
+
+
+def _forget_blocks():
+    # A forked process must not hand out the counts of its parent.
+    _blocks.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_blocks)
+
+
+class CounterBlock:
+    """ Counts reserved by one process, handed out one by one. """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counts = iter(())
+
+    def next(self, counter_class, refill=True):
+        """ The next reserved count; None if there is none and not `refill`. """
+        with self.lock:
+            count = next(self.counts, None)
+            if count is None and refill:
+                self.counts = iter(counter_class.reserve(counter_class.block_size))
+                count = next(self.counts)
+            return count
+
 
 class BaseCounter(models.Model):
     class Meta:
         abstract = True
 
-    """ AUTOINCREMENT for RDF subject URIs. """
+    """
+    AUTOINCREMENT for RDF subject URIs.
+
+    Counts are claimed with a compare-and-swap UPDATE, so no row lock is
+    held between statements and no count is handed out twice. `reserve`
+    claims a range of counts in one update and `allocate` hands out URIs
+    from a per-process block of `block_size` reserved counts. Counts
+    that a process reserved but did not use are skipped, so the URIs
+    are unique but may have gaps.
+    """
     count = models.PositiveIntegerField()
 
+    # Number of counts that `allocate` reserves at once.
+    block_size = 100
+
     @property
     def namespace(self):
         raise NotImplementedError()
@@ -19,19 +65,64 @@ class BaseCounter(models.Model):
     @classproperty
     def current(cls):
         """ Get or create a singleton instance of ItemCounter. """
-        instance = cls.objects.all().first()
+        instance = cls.objects.order_by('pk').first()
         if not instance:
-            instance = cls(count=1)
-            instance.save()
+            # Concurrent creations collide on the primary key;
+            # get_or_create then returns the row that won.
+            instance, created = cls.objects.get_or_create(
+                pk=SINGLETON_PK, defaults={'count': 1},
+            )
         return instance
 
     def __str__(self):
         """ The subject URI associated with the current value of `count`. """
         return '{}{}'.format(self.namespace, self.count)
 
-    @atomic
+    def claim(self, n):
+        """
+        Add `n` to the count and save immediately.
+
+        Returns the range of claimed counts. The update only succeeds if
+        the count in the database is still the one of this instance;
+        otherwise the count is reloaded and the update is tried again.
+        """
+        manager = type(self)._default_manager
+        while True:
+            start = self.count
+            if manager.filter(pk=self.pk, count=start).update(count=start + n):
+                self.count = start + n
+                return range(start + 1, start + n + 1)
+            self.refresh_from_db(fields=['count'])
+
     def increment(self):
         """ Add 1 to the count and save immediately. """
-        self.count = F('count') + 1
-        self.save()
-        self.refresh_from_db()
+        self.claim(1)
+
+    @classmethod
+    def reserve(cls, n):
+        """ Claim `n` consecutive counts and return them as a range. """
+        return cls.current.claim(n)
+
+    @classmethod
+    def subject_uri(cls, count):
+        """ The subject URI associated with `count`. """
+        return str(cls(count=count))
+
+    @classmethod
+    def allocate(cls):
+        """
+        Return a new subject URI from the block reserved by this process.
+
+        A new block of `block_size` counts is reserved when the current
+        one runs out. Inside a transaction, no new block is reserved,
+        because a rollback would return its counts to the database while
+        this process kept handing them out; a single count is claimed in
+        the transaction instead. Safe to call from several threads.
+        """
+        with _blocks_lock:
+            block = _blocks.setdefault(cls, CounterBlock())
+        connection = transaction.get_connection(router.db_for_write(cls))
+        count = block.next(cls, refill=not connection.in_atomic_block)
+        if count is None:
+            count = cls.reserve(1)[0]
+        return cls.subject_uri(count)
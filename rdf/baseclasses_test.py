@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.db import connections, transaction
+
+from .test_apps.counters import ThingCounter
+
+
+def test_current(counter_table):
+    counter = ThingCounter.current
+    assert counter.count == 1
+    assert ThingCounter.current.pk == counter.pk
+    assert ThingCounter.objects.count() == 1
+
+
+def test_increment(counter_table):
+    counter = ThingCounter.current
+    other = ThingCounter.current
+    counter.increment()
+    assert str(counter) == 'http://example.com/thing/2'
+    # `other` has a stale count, so its first attempt fails.
+    other.increment()
+    assert other.count == 3
+    assert ThingCounter.current.count == 3
+
+
+def test_reserve(counter_table):
+    assert ThingCounter.reserve(5) == range(2, 7)
+    assert ThingCounter.reserve(1) == range(7, 8)
+    assert ThingCounter.current.count == 7
+
+
+def test_allocate(counter_table):
+    uris = [ThingCounter.allocate() for _ in range(25)]
+    assert uris[0] == 'http://example.com/thing/2'
+    assert len(set(uris)) == 25
+    # Three blocks of ten were reserved.
+    assert ThingCounter.current.count == 31
+
+
+def test_allocate_rollback(counter_table):
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            assert ThingCounter.allocate() == 'http://example.com/thing/2'
+            raise RuntimeError()
+    assert ThingCounter.current.count == 1
+    # The rolled back count was not kept for later calls.
+    assert ThingCounter.allocate() == 'http://example.com/thing/2'
+    assert ThingCounter.current.count == 11
+    with transaction.atomic():
+        # Counts from a committed block are still handed out.
+        assert ThingCounter.allocate() == 'http://example.com/thing/3'
+
+
+def test_allocate_threads(counter_table):
+    def allocate(_):
+        try:
+            return [ThingCounter.allocate() for _ in range(20)]
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(4) as executor:
+        uris = [uri for batch in executor.map(allocate, range(4)) for uri in batch]
+    assert len(set(uris)) == 80
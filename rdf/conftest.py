@@ -2,12 +2,15 @@ from importlib import import_module
 from datetime import datetime, date
 
 from django.conf import settings
+from django.db import connection
 from pytest import fixture
 from rdf.utils import graph_from_triples, prune_triples
 from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
 from rdflib import ConjunctiveGraph, Graph, Literal, URIRef
 
 from .ns import *
+from .test_apps.local_endpoint import LocalSPARQLEndpoint
+from .test_apps.local_store import LocalSPARQLStore
 
 CREATION_DATE = Literal(datetime.now())
 
@@ -125,6 +128,19 @@ def app_without_rdf_migrations():
     return without_migrations.__name__
 
 
+@fixture
+def local_store():
+    return LocalSPARQLStore()
+
+
+@fixture
+def local_endpoint():
+    endpoint = LocalSPARQLEndpoint()
+    endpoint.start()
+    yield endpoint
+    endpoint.stop()
+
+
 @fixture
 def prefixed_query():
     return '''
@@ -151,3 +167,16 @@ def sparqlstore(settings):
     yield store
     store.update('CLEAR ALL')
 
+
+@fixture
+def counter_table(transactional_db):
+    # Models can only be defined once Django is set up.
+    from .baseclasses import _blocks
+    from .test_apps.counters import ThingCounter
+    with connection.schema_editor() as editor:
+        editor.create_model(ThingCounter)
+    _blocks.clear()
+    yield ThingCounter
+    _blocks.clear()
+    with connection.schema_editor() as editor:
+        editor.delete_model(ThingCounter)
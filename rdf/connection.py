@@ -0,0 +1,696 @@
+"""
+SPARQL stores that reuse their HTTP connections.
+
+The SPARQL stores from rdflib open a new connection for every query
+and update. `PooledSPARQLStore` and `PooledSPARQLUpdateStore` are drop-in
+replacements that keep idle connections to each endpoint open and reuse
+them, so consecutive requests skip the TCP and TLS handshakes. Use them
+as `settings.RDFLIB_STORE`:
+
+    RDFLIB_STORE = PooledSPARQLUpdateStore(
+        query_endpoint=TRIPLESTORE_SPARQL_QUERY_ENDPOINT,
+        update_endpoint=TRIPLESTORE_SPARQL_UPDATE_ENDPOINT,
+        pool_size=8,
+        timeout=60,
+    )
+
+Their additional keyword arguments are `pool_size` (the number of idle
+connections kept per endpoint), `timeout` (in seconds, per socket
+operation), `retries` (the number of times a request is repeated after
+failing to connect, and a query also after its connection was dropped
+or a 502, 503 or 504 response), `backoff` (the delay before the first
+retry in seconds, doubling on each next retry), `timeout_parameter` and
+`timeout_scale` (see below). Updates are not repeated once they have
+been sent, since the endpoint may have applied them, and no request is
+repeated after a timeout.
+
+Within `with query_timeout(seconds):`, the requests of these stores
+must finish within `seconds` in total, retries included; otherwise
+`QueryTimeout` is raised and the connection is closed. If the store
+has a `timeout_parameter`, queries also tell the endpoint how much
+time is left, in seconds times `timeout_scale`. For example, use
+`timeout_parameter='timeout'` for Fuseki and
+`timeout_parameter='maxQueryTimeMillis', timeout_scale=1000` for
+Blazegraph.
+
+Like the stores they replace, they raise `urllib.error.HTTPError` when
+the endpoint responds with an error status.
+
+For asynchronous views, `query_graph` and `update_graph` are coroutine
+versions of `Graph.query` and `Graph.update`. For graphs backed by a
+SPARQL store, they send requests through an `AsyncSPARQLConnector` with
+the same endpoints and settings as the store.
+"""
+
+import asyncio
+import http.client
+import socket
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.parser import BytesParser
+from io import BytesIO
+from queue import Empty, Full, LifoQueue
+from select import select
+from threading import Lock
+from math import ceil
+from time import monotonic, sleep
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urlsplit
+from weakref import WeakKeyDictionary
+
+from asgiref.sync import sync_to_async
+from rdflib import ConjunctiveGraph
+from rdflib.plugins.stores.sparqlconnector import (
+    SPARQLConnector, SPARQLConnectorException, _response_mime_types)
+from rdflib.plugins.stores.sparqlstore import SPARQLStore, SPARQLUpdateStore
+from rdflib.query import Result
+from rdflib.term import BNode
+
+RETRY_STATUSES = (502, 503, 504)
+# Raised when a kept-alive connection turns out to have been closed
+# by the server. Such a request is repeated at once on a new connection.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError,
+)
+# Raised when a response does not arrive within the socket timeout.
+TIMEOUT_ERRORS = (socket.timeout, asyncio.TimeoutError)
+# Response bodies are read in blocks of this size, so the deadline of
+# `query_timeout` can be checked in between.
+READ_SIZE = 64 * 1024
+
+_deadline = ContextVar('query_deadline', default=None)
+
+
+class QueryTimeout(TimeoutError):
+    """ Raised when a request does not finish within `query_timeout`. """
+
+
+class ConnectError(ConnectionError):
+    """ Raised when no connection to an endpoint can be opened. """
+
+
+@contextmanager
+def query_timeout(seconds):
+    """
+    Limit the requests of the pooled stores in this context to `seconds`.
+
+    None means no limit. A nested limit cannot extend an outer one.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(deadline, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time():
+    """
+    Seconds left within the current `query_timeout`, or None.
+
+    Raises QueryTimeout if no time is left.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - monotonic()
+    if remaining <= 0:
+        raise QueryTimeout('The query did not finish in time.')
+    return remaining
+
+
+def read_response(response):
+    """ Read the body of `response`, within the current `query_timeout`. """
+    if _deadline.get() is None:
+        return response.read()
+    blocks = []
+    while True:
+        remaining_time()
+        block = response.read(READ_SIZE)
+        if not block:
+            return b''.join(blocks)
+        blocks.append(block)
+
+
+class ConnectionPool:
+    """ Keep-alive HTTP connections to a single host. """
+
+    def __init__(self, scheme, host, port=None, size=4, timeout=None):
+        if scheme == 'https':
+            self.connection_class = http.client.HTTPSConnection
+        elif scheme == 'http':
+            self.connection_class = http.client.HTTPConnection
+        else:
+            raise SPARQLConnectorException(
+                'Unsupported URL scheme: {}'.format(scheme)
+            )
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle = LifoQueue(size)
+
+    def connect(self):
+        return self.connection_class(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self):
+        """ Return an idle connection, or a new one if there is none. """
+        while True:
+            try:
+                connection = self.idle.get_nowait()
+            except Empty:
+                return self.connect(), False
+            # An idle connection is readable only if the server closed it.
+            if connection.sock is not None and \
+                    not select([connection.sock], [], [], 0)[0]:
+                return connection, True
+            connection.close()
+
+    def release(self, connection):
+        try:
+            self.idle.put_nowait(connection)
+        except Full:
+            connection.close()
+
+    def request(self, method, url, body=None, headers={}, timeout=None,
+                idempotent=True):
+        """
+        Send a request and read the response.
+
+        Returns the response and its body. The connection is returned to
+        the pool unless the server asked to close it. `timeout` replaces
+        the socket timeout of the pool for this request. If a reused
+        connection turns out to be closed, the request is repeated on a
+        new one, unless it is not `idempotent` and was sent in full.
+        Raises ConnectError if no connection can be opened.
+        """
+        while True:
+            connection, reused = self.acquire()
+            connection.timeout = self.timeout if timeout is None else timeout
+            sent = False
+            try:
+                if connection.sock is None:
+                    try:
+                        connection.connect()
+                    except OSError as error:
+                        raise ConnectError(error) from error
+                connection.sock.settimeout(connection.timeout)
+                connection.request(method, url, body, headers)
+                sent = True
+                response = connection.getresponse()
+                content = read_response(response)
+            except STALE_CONNECTION_ERRORS:
+                connection.close()
+                if reused and (idempotent or not sent):
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.release(connection)
+            return response, content
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Empty:
+                return
+
+
+class PooledSPARQLConnector(SPARQLConnector):
+    """
+    SPARQLConnector that sends its requests through a `ConnectionPool`.
+
+    See the module documentation for the additional keyword arguments.
+    """
+
+    def __init__(self, *args, pool_size=4, timeout=None, retries=2,
+                 backoff=0.5, timeout_parameter=None, timeout_scale=1,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout_parameter = timeout_parameter
+        self.timeout_scale = timeout_scale
+        self._pools = {}
+        self._pools_lock = Lock()
+
+    def pool(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        with self._pools_lock:
+            if key not in self._pools:
+                self._pools[key] = ConnectionPool(
+                    *key, size=self.pool_size, timeout=self.timeout
+                )
+            return self._pools[key]
+
+    def close_connections(self):
+        with self._pools_lock:
+            for pool in self._pools.values():
+                pool.close()
+
+    def request_timeout(self):
+        """ Socket timeout of the next request, within any `query_timeout`. """
+        remaining = remaining_time()
+        if remaining is None or self.timeout is not None and self.timeout < remaining:
+            return self.timeout
+        return remaining
+
+    def retry_delay(self, attempt):
+        """ Backoff before retry `attempt`, within any `query_timeout`. """
+        delay = self.backoff * 2 ** (attempt - 1)
+        remaining = remaining_time()
+        return delay if remaining is None else min(delay, remaining)
+
+    def send(self, method, url, body=None, headers={}, idempotent=True):
+        """
+        Send a request, retrying with backoff, and return the response
+        headers and body. Raises HTTPError if the final status is an error.
+
+        A request that is not `idempotent` is only retried if it could
+        not be sent (see the module documentation).
+        """
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path = '{}?{}'.format(path, parts.query)
+        pool = self.pool(url)
+        if body is not None:
+            body = body.encode() if isinstance(body, str) else body
+        for attempt in range(self.retries + 1):
+            if attempt:
+                sleep(self.retry_delay(attempt))
+            last_attempt = attempt == self.retries
+            try:
+                response, content = pool.request(
+                    method, path, body, headers, self.request_timeout(),
+                    idempotent,
+                )
+            except TIMEOUT_ERRORS:
+                remaining_time()
+                raise
+            except ConnectError:
+                if last_attempt:
+                    raise
+                continue
+            except STALE_CONNECTION_ERRORS:
+                if last_attempt or not idempotent:
+                    raise
+                continue
+            if response.status in RETRY_STATUSES and idempotent and \
+                    not last_attempt:
+                continue
+            if response.status >= 400:
+                raise HTTPError(
+                    url, response.status, response.reason,
+                    response.headers, BytesIO(content)
+                )
+            return response.headers, content
+
+    def request_args(self, params, headers):
+        """ Merge `params` and `headers` with those from the constructor. """
+        args = dict(self.kwargs)
+        args_params = dict(args.get('params', {}))
+        args_params.update(params)
+        args_headers = dict(args.get('headers', {}))
+        args_headers.update(headers)
+        return args_params, args_headers
+
+    def query_request(self, query, default_graph=None):
+        """ Method, URL, body and headers of the request for `query`. """
+        if not self.query_endpoint:
+            raise SPARQLConnectorException('Query endpoint not set!')
+
+        params = {}
+        remaining = remaining_time()
+        if self.timeout_parameter and remaining is not None:
+            params[self.timeout_parameter] = ceil(remaining * self.timeout_scale)
+        # Graph().query() passes BNode identifiers, which are useless here.
+        if default_graph is not None and type(default_graph) != BNode:
+            params['default-graph-uri'] = default_graph
+        headers = {'Accept': _response_mime_types[self.returnFormat]}
+
+        if self.method == 'GET':
+            params['query'] = query
+            params, headers = self.request_args(params, headers)
+            url = '{}?{}'.format(self.query_endpoint, urlencode(params))
+            return 'GET', url, None, headers
+        if self.method == 'POST':
+            headers['Content-Type'] = 'application/sparql-query; charset=utf-8'
+            url = '{}?{}'.format(self.query_endpoint, urlencode(params))
+            _, headers = self.request_args({}, headers)
+            return 'POST', url, query, headers
+        if self.method == 'POST_FORM':
+            params['query'] = query
+            params, headers = self.request_args(params, headers)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            return 'POST', self.query_endpoint, urlencode(params), headers
+        raise SPARQLConnectorException('Unknown method %s' % self.method)
+
+    def update_request(self, query, default_graph=None, named_graph=None):
+        """ Method, URL, body and headers of the request for an update. """
+        if not self.update_endpoint:
+            raise SPARQLConnectorException('Update endpoint not set!')
+
+        params = {}
+        if default_graph is not None:
+            params['using-graph-uri'] = default_graph
+        if named_graph is not None:
+            params['using-named-graph-uri'] = named_graph
+        params, headers = self.request_args(params, {
+            'Accept': _response_mime_types[self.returnFormat],
+            # Unlike rdflib, declare the charset (see rdf.utils).
+            'Content-Type': 'application/sparql-update; charset=utf-8',
+        })
+        url = '{}?{}'.format(self.update_endpoint, urlencode(params))
+        return 'POST', url, query, headers
+
+    def parse_result(self, headers, content):
+        return Result.parse(
+            BytesIO(content),
+            content_type=headers['Content-Type'].split(';')[0]
+        )
+
+    def query(self, query, default_graph=None, named_graph=None):
+        request = self.query_request(query, default_graph)
+        return self.parse_result(*self.send(*request))
+
+    def update(self, query, default_graph=None, named_graph=None):
+        self.send(
+            *self.update_request(query, default_graph, named_graph),
+            idempotent=False
+        )
+
+
+class PooledSPARQLStore(SPARQLStore, PooledSPARQLConnector):
+    """ SPARQLStore with keep-alive connections. """
+
+
+class PooledSPARQLUpdateStore(SPARQLUpdateStore, PooledSPARQLConnector):
+    """ SPARQLUpdateStore with keep-alive connections. """
+
+    def _update(self, update):
+        # SPARQLUpdateStore calls SPARQLConnector.update explicitly.
+        self._updates += 1
+        PooledSPARQLConnector.update(self, update)
+
+
+class AsyncConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections to a single host, using asyncio.
+
+    This is a minimal client for the requests of `AsyncSPARQLConnector`.
+    If the task that sends a request is cancelled, the connection is
+    closed, so the server may stop working on the request as well.
+    """
+
+    def __init__(self, scheme, host, port=None, size=4, timeout=None):
+        if scheme not in ('http', 'https'):
+            raise SPARQLConnectorException(
+                'Unsupported URL scheme: {}'.format(scheme)
+            )
+        self.ssl = scheme == 'https'
+        self.host = host
+        self.port = port or (443 if self.ssl else 80)
+        # As http.client, name the port only if it is not the default.
+        self.host_header = '[{}]'.format(host) if ':' in host else host
+        if self.port != (443 if self.ssl else 80):
+            self.host_header += ':{}'.format(self.port)
+        self.size = size
+        self.timeout = timeout
+        self.idle = []
+
+    async def acquire(self, timeout=None):
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return (reader, writer), True
+            writer.close()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl or None
+            ), timeout)
+        except (OSError, asyncio.TimeoutError) as error:
+            raise ConnectError(error) from error
+        return (reader, writer), False
+
+    def release(self, connection):
+        if len(self.idle) < self.size:
+            self.idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def request(self, method, url, body=None, headers={}, timeout=None,
+                      idempotent=True):
+        """
+        Send a request and return its status, reason, headers and body.
+
+        `timeout` replaces the timeout of the pool for this request, for
+        connecting, sending and receiving each. See `ConnectionPool.request`
+        for `idempotent`.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        while True:
+            connection, reused = await self.acquire(timeout)
+            sent = False
+            try:
+                await asyncio.wait_for(
+                    self.send(connection, method, url, body, headers), timeout
+                )
+                sent = True
+                response = await asyncio.wait_for(
+                    self.receive(connection), timeout
+                )
+            except STALE_CONNECTION_ERRORS + (asyncio.IncompleteReadError,):
+                connection[1].close()
+                if reused and (idempotent or not sent):
+                    continue
+                raise
+            except BaseException:
+                # Includes cancellation.
+                connection[1].close()
+                raise
+            *response, keep_alive = response
+            if keep_alive:
+                self.release(connection)
+            else:
+                connection[1].close()
+            return response
+
+    async def send(self, connection, method, url, body, headers):
+        writer = connection[1]
+        lines = ['{} {} HTTP/1.1'.format(method, url), 'Host: {}'.format(self.host_header)]
+        lines.extend('{}: {}'.format(*header) for header in headers.items())
+        lines.append('Content-Length: {}'.format(len(body or b'')))
+        writer.write('\r\n'.join(lines).encode('latin-1') + b'\r\n\r\n')
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+    async def receive(self, connection):
+        reader = connection[0]
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected(
+                'Remote end closed connection without response'
+            )
+        version, status, reason = (
+            status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + ['']
+        )[:3]
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_lines.append(line)
+        response_headers = BytesParser(_class=http.client.HTTPMessage).parsebytes(
+            b''.join(header_lines)
+        )
+
+        keep_alive = (
+            version == 'HTTP/1.1' and
+            response_headers.get('Connection', '').lower() != 'close'
+        )
+        if response_headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            content = b''.join(chunks)
+        elif 'Content-Length' in response_headers:
+            content = await reader.readexactly(
+                int(response_headers['Content-Length'])
+            )
+        else:
+            content = await reader.read()
+            keep_alive = False
+        return int(status), reason, response_headers, content, keep_alive
+
+    def close(self):
+        while self.idle:
+            self.idle.pop()[1].close()
+
+
+class AsyncSPARQLConnector(PooledSPARQLConnector):
+    """
+    Connector with coroutine `query` and `update` methods.
+
+    It takes the same arguments as `PooledSPARQLConnector`. Its
+    connection pools are bound to the running event loop. Many requests
+    can be in flight at once, for example with `asyncio.gather`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pools = WeakKeyDictionary()
+
+    def pool(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        pools = self._pools.setdefault(asyncio.get_running_loop(), {})
+        if key not in pools:
+            pools[key] = AsyncConnectionPool(
+                *key, size=self.pool_size, timeout=self.timeout
+            )
+        return pools[key]
+
+    def close_connections(self):
+        for pools in self._pools.values():
+            for pool in pools.values():
+                pool.close()
+
+    async def send(self, method, url, body=None, headers={}, idempotent=True):
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path = '{}?{}'.format(path, parts.query)
+        pool = self.pool(url)
+        if body is not None:
+            body = body.encode() if isinstance(body, str) else body
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_delay(attempt))
+            last_attempt = attempt == self.retries
+            try:
+                status, reason, response_headers, content = await pool.request(
+                    method, path, body, headers, self.request_timeout(),
+                    idempotent,
+                )
+            except TIMEOUT_ERRORS:
+                remaining_time()
+                raise
+            except ConnectError:
+                if last_attempt:
+                    raise
+                continue
+            except STALE_CONNECTION_ERRORS + (asyncio.IncompleteReadError,):
+                if last_attempt or not idempotent:
+                    raise
+                continue
+            if status in RETRY_STATUSES and idempotent and not last_attempt:
+                continue
+            if status >= 400:
+                raise HTTPError(
+                    url, status, reason, response_headers, BytesIO(content)
+                )
+            return response_headers, content
+
+    async def query(self, query, default_graph=None, named_graph=None):
+        request = self.query_request(query, default_graph)
+        return self.parse_result(*await self.send(*request))
+
+    async def update(self, query, default_graph=None, named_graph=None):
+        await self.send(
+            *self.update_request(query, default_graph, named_graph),
+            idempotent=False
+        )
+
+    @classmethod
+    def from_store(cls, store):
+        """ Connector for the endpoints and settings of a SPARQL `store`. """
+        kwargs = dict(store.kwargs)
+        for name in ('pool_size', 'timeout', 'retries', 'backoff',
+                     'timeout_parameter', 'timeout_scale'):
+            if hasattr(store, name):
+                kwargs[name] = getattr(store, name)
+        return cls(
+            query_endpoint=store.query_endpoint,
+            update_endpoint=getattr(store, 'update_endpoint', None),
+            returnFormat=store.returnFormat,
+            method=store.method,
+            **kwargs
+        )
+
+
+_async_connectors = WeakKeyDictionary()
+
+
+def async_connector(store):
+    """ The shared `AsyncSPARQLConnector` for a SPARQL `store`. """
+    if store not in _async_connectors:
+        _async_connectors[store] = AsyncSPARQLConnector.from_store(store)
+    return _async_connectors[store]
+
+
+def _query_graph(graph):
+    """ The queryGraph argument that `graph` passes to its store. """
+    if isinstance(graph, ConjunctiveGraph) and graph.default_union:
+        return '__UNION__'
+    return graph.identifier
+
+
+async def query_graph(graph, query):
+    """
+    Coroutine version of `graph.query(query)`.
+
+    Graphs backed by a SPARQL store are queried through the store's
+    `async_connector`. Other graphs are queried in a worker thread.
+    """
+    store = graph.store
+    if not isinstance(store, SPARQLStore):
+        return await sync_to_async(graph.query, thread_sensitive=False)(query)
+    query = store._inject_prefixes(query, dict(graph.namespaces()))
+    query_graph = _query_graph(graph)
+    default_graph = query_graph if store._is_contextual(query_graph) else None
+    return await async_connector(store).query(query, default_graph)
+
+
+async def update_graph(graph, update):
+    """ Coroutine version of `graph.update(update)`, see `query_graph`. """
+    store = graph.store
+    if not isinstance(store, SPARQLUpdateStore):
+        return await sync_to_async(graph.update, thread_sensitive=False)(update)
+    update = store._inject_prefixes(update, dict(graph.namespaces()))
+    query_graph = _query_graph(graph)
+    if store._is_contextual(query_graph):
+        update = store._insert_named_graph(update, query_graph)
+    await async_connector(store).update(update)
+
+
+async def fetch_graph(graph):
+    """
+    Copy a graph backed by a SPARQL store into memory, asynchronously.
+
+    Other graphs are returned as they are.
+    """
+    if not isinstance(graph.store, SPARQLStore):
+        return graph
+    results = await query_graph(graph, 'CONSTRUCT WHERE { ?s ?p ?o }')
+    for prefix, namespace in graph.namespaces():
+        results.graph.bind(prefix, namespace)
+    return results.graph
@@ -0,0 +1,191 @@
+import asyncio
+import socket
+from time import monotonic, sleep
+from urllib.error import HTTPError
+
+import pytest
+from rdflib import Graph, Literal, URIRef
+
+from .connection import (AsyncSPARQLConnector, ConnectError,
+                         PooledSPARQLStore, PooledSPARQLUpdateStore,
+                         QueryTimeout, fetch_graph, query_graph,
+                         query_timeout, update_graph)
+
+GRAPH = URIRef('http://example.com/g')
+ASK_QUERY = 'ASK { ?s ?p ?o }'
+INSERT_UPDATE = 'INSERT DATA { <http://example.com/s> <http://example.com/p> "é" }'
+TRIPLE = (URIRef('http://example.com/s'), URIRef('http://example.com/p'), Literal('é'))
+
+
+def test_pooled_query(local_endpoint):
+    local_endpoint.dataset.get_context(GRAPH).add(TRIPLE)
+    store = PooledSPARQLStore(local_endpoint.url, backoff=0)
+    graph = Graph(store, identifier=GRAPH)
+    for _ in range(3):
+        assert graph.query(ASK_QUERY).askAnswer
+    assert len(local_endpoint.log) == 3
+    assert len(local_endpoint.clients) == 1
+    assert store._queries == 3
+    method, path, headers, body = local_endpoint.log[0]
+    assert method == 'GET'
+    assert 'default-graph-uri=http%3A%2F%2Fexample.com%2Fg' in path
+    store.close_connections()
+
+
+def test_pooled_update(local_endpoint):
+    store = PooledSPARQLUpdateStore(
+        local_endpoint.url, local_endpoint.url, backoff=0
+    )
+    graph = Graph(store, identifier=GRAPH)
+    graph.update(INSERT_UPDATE)
+    graph.update(INSERT_UPDATE)
+    assert store._updates == 2
+    assert len(local_endpoint.clients) == 1
+    method, path, headers, body = local_endpoint.log[0]
+    assert method == 'POST'
+    assert headers['Content-Type'] == 'application/sparql-update; charset=utf-8'
+    assert list(local_endpoint.dataset.get_context(GRAPH)) == [TRIPLE]
+
+
+def test_retry(local_endpoint):
+    store = PooledSPARQLStore(local_endpoint.url, retries=2, backoff=0)
+    local_endpoint.statuses = [503, 503]
+    assert not store.query(ASK_QUERY).askAnswer
+    assert len(local_endpoint.log) == 3
+    local_endpoint.statuses = [503, 503, 503]
+    with pytest.raises(HTTPError) as error:
+        store.query(ASK_QUERY)
+    assert error.value.code == 503
+
+
+def test_no_retry(local_endpoint):
+    store = PooledSPARQLUpdateStore(
+        local_endpoint.url, local_endpoint.url, retries=2, backoff=0,
+        timeout=0.2,
+    )
+    local_endpoint.statuses = [503]
+    with pytest.raises(HTTPError):
+        store.update(INSERT_UPDATE)
+    assert len(local_endpoint.log) == 1
+    local_endpoint.delay = 0.5
+    with pytest.raises(socket.timeout):
+        store.query(ASK_QUERY)
+    assert len(local_endpoint.log) == 2
+    local_endpoint.delay = 0
+    closed = PooledSPARQLStore('http://127.0.0.1:1/sparql', backoff=0)
+    with pytest.raises(ConnectError):
+        closed.query(ASK_QUERY)
+
+
+def test_client_error(local_endpoint):
+    store = PooledSPARQLStore(local_endpoint.url, backoff=0)
+    with pytest.raises(HTTPError) as error:
+        store.query('this is no SPARQL query!')
+    assert error.value.code == 400
+    assert len(local_endpoint.log) == 1
+
+
+def test_stale_connection(local_endpoint):
+    store = PooledSPARQLUpdateStore(
+        local_endpoint.url, local_endpoint.url, retries=0
+    )
+    local_endpoint.drop = True
+    store.query(ASK_QUERY)
+    local_endpoint.drop = False
+    store.query(ASK_QUERY)
+    assert len(local_endpoint.clients) == 2
+    # An update is not sent over a connection that the server closed.
+    local_endpoint.drop = True
+    store.update(INSERT_UPDATE)
+    local_endpoint.drop = False
+    sleep(0.1)
+    store.update(INSERT_UPDATE)
+    assert len(local_endpoint.clients) == 3
+    assert len(local_endpoint.log) == 4
+
+
+def test_query_timeout(local_endpoint):
+    store = PooledSPARQLStore(
+        local_endpoint.url, timeout_parameter='maxQueryTimeMillis',
+        timeout_scale=1000, retries=2,
+    )
+    with query_timeout(5):
+        assert not store.query(ASK_QUERY).askAnswer
+    method, path, headers, body = local_endpoint.log[0]
+    assert 'maxQueryTimeMillis=' in path
+    local_endpoint.delay = 0.5
+    started = monotonic()
+    with pytest.raises(QueryTimeout):
+        with query_timeout(0.2):
+            store.query(ASK_QUERY)
+    # The request is not retried after the deadline.
+    assert monotonic() - started < 0.5
+    assert len(local_endpoint.log) == 2
+    local_endpoint.delay = 0
+    assert not store.query(ASK_QUERY).askAnswer
+
+    connector = AsyncSPARQLConnector.from_store(store)
+    local_endpoint.delay = 0.5
+
+    async def run():
+        with query_timeout(0.2):
+            await connector.query(ASK_QUERY)
+
+    with pytest.raises(QueryTimeout):
+        asyncio.run(run())
+
+
+def test_async_connector(local_endpoint):
+    connector = AsyncSPARQLConnector(local_endpoint.url, local_endpoint.url)
+
+    async def run():
+        await connector.update(INSERT_UPDATE)
+        results = await asyncio.gather(*(
+            connector.query(ASK_QUERY) for _ in range(5)
+        ))
+        assert all(result.askAnswer for result in results)
+        # Sequential requests reuse the connections of the concurrent ones.
+        await connector.query(ASK_QUERY)
+        local_endpoint.drop = True
+        await connector.query(ASK_QUERY)
+        local_endpoint.drop = False
+        assert (await connector.query(ASK_QUERY)).askAnswer
+        connector.close_connections()
+
+    asyncio.run(run())
+    assert len(local_endpoint.log) == 9
+    host = '127.0.0.1:{}'.format(local_endpoint.server.server_port)
+    assert local_endpoint.log[0][2]['Host'] == host
+    assert len(local_endpoint.clients) <= 7
+
+
+def test_async_cancel(local_endpoint):
+    connector = AsyncSPARQLConnector(local_endpoint.url)
+    local_endpoint.delay = 0.5
+
+    async def run():
+        task = asyncio.ensure_future(connector.query(ASK_QUERY))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert connector.pool(local_endpoint.url).idle == []
+
+    asyncio.run(run())
+
+
+def test_async_graph(local_endpoint):
+    store = PooledSPARQLUpdateStore(local_endpoint.url, local_endpoint.url)
+    graph = Graph(store, identifier=GRAPH)
+    graph.bind('ex', 'http://example.com/')
+
+    async def run():
+        await update_graph(graph, 'INSERT DATA { ex:s ex:p "é" }')
+        result = await query_graph(graph, 'SELECT ?o WHERE { ex:s ex:p ?o }')
+        assert [row.o for row in result] == [TRIPLE[2]]
+        return await fetch_graph(graph)
+
+    fetched = asyncio.run(run())
+    assert list(fetched) == [TRIPLE]
+    assert list(local_endpoint.dataset.get_context(GRAPH)) == [TRIPLE]
+    assert store._queries == store._updates == 0
@@ -0,0 +1,180 @@
+"""
+Difference between two graphs that may not fit in memory.
+
+`graph_diff` writes the triples of both graphs as N-Triples lines to
+temporary files, distributing them over buckets by a hash of the line.
+Equal triples always land in the same bucket, so the buckets can be
+compared one at a time. Only one bucket of each graph is held in memory
+at once. The additions and deletions are spilled to disk as well and
+read back lazily, so they can be passed straight to `append_triples`
+and `prune_triples`, which send them to the store in batches.
+
+Triples of a graph that is backed by a SPARQL store are fetched in
+pages of RDF_BATCH_SIZE triples (see `rdf.utils.triple_pages`).
+"""
+
+import os
+from hashlib import sha256
+from itertools import chain
+from tempfile import TemporaryDirectory
+from zlib import crc32
+
+from rdflib import BNode
+from rdflib.compare import to_canonical_graph
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from rdflib.plugins.serializers.nt import _nt_row
+
+from .utils import get_batch_size, is_sparql_graph, triple_pages
+
+DEFAULT_BUCKETS = 64
+
+
+def iter_triples(graph):
+    """ All triples in `graph`, fetched page by page from SPARQL stores. """
+    if is_sparql_graph(graph):
+        return chain.from_iterable(triple_pages(graph, get_batch_size()))
+    return iter(graph)
+
+
+class BNodeLabels(dict):
+    """ Blank node context that keeps the labels from N-Triples input. """
+
+    def get(self, label, default=None):
+        return label
+
+
+class TripleCollector:
+    """ Sink for W3CNTriplesParser. """
+
+    def __init__(self):
+        self.triples = []
+
+    def triple(self, subject, predicate, object):
+        self.triples.append((subject, predicate, object))
+
+
+def read_triples(path, batch_size=1000):
+    """ Generate the triples in the N-Triples file at `path`. """
+    collector = TripleCollector()
+    parser = W3CNTriplesParser(sink=collector)
+    labels = BNodeLabels()
+    with open(path, encoding='utf-8') as lines:
+        for line in lines:
+            parser.line = line.rstrip('\n')
+            parser.parseline(bnode_context=labels)
+            if len(collector.triples) >= batch_size:
+                yield from collector.triples
+                collector.triples = []
+    yield from collector.triples
+
+
+class GraphDiff:
+    """
+    Additions and deletions that turn `actual` into `desired`.
+
+    Use as a context manager, so the temporary files are removed
+    afterwards. `additions()` and `deletions()` generate the triples;
+    `addition_count` and `deletion_count` are their numbers, while
+    `actual_count` and `desired_count` are the sizes of the graphs.
+    `actual_predicates` is the set of predicates present in `actual`.
+    """
+
+    def __init__(self, actual, desired, buckets=DEFAULT_BUCKETS, dir=None):
+        self.buckets = buckets
+        self.directory = TemporaryDirectory(prefix='rdf-diff-', dir=dir)
+        self.actual_predicates = set()
+        self.actual_count = 0
+        self.desired_count = 0
+        self.addition_count = 0
+        self.deletion_count = 0
+        try:
+            self.compute(actual, desired)
+        except BaseException:
+            self.close()
+            raise
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def spill(self, name, triples, predicates=None):
+        """
+        Distribute N-Triples lines of `triples` over bucket files.
+
+        Returns the number of triples.
+        """
+        count = 0
+        files = [
+            open(self.path('{}-{}.nt'.format(name, index)), 'w', encoding='utf-8')
+            for index in range(self.buckets)
+        ]
+        try:
+            for triple in triples:
+                count += 1
+                if predicates is not None:
+                    predicates.add(triple[1])
+                line = _nt_row(triple)
+                files[crc32(line.encode('utf-8')) % self.buckets].write(line)
+        finally:
+            for file in files:
+                file.close()
+        return count
+
+    def read_bucket(self, name, index):
+        with open(self.path('{}-{}.nt'.format(name, index)), encoding='utf-8') as file:
+            lines = set(file)
+        os.remove(file.name)
+        return lines
+
+    def compute(self, actual, desired):
+        self.actual_count = self.spill(
+            'actual', iter_triples(actual), self.actual_predicates
+        )
+        self.desired_count = self.spill('desired', iter_triples(desired))
+        with open(self.path('additions.nt'), 'w', encoding='utf-8') as additions, \
+                open(self.path('deletions.nt'), 'w', encoding='utf-8') as deletions:
+            for index in range(self.buckets):
+                actual_lines = self.read_bucket('actual', index)
+                desired_lines = self.read_bucket('desired', index)
+                added = desired_lines - actual_lines
+                deleted = actual_lines - desired_lines
+                additions.writelines(added)
+                deletions.writelines(deleted)
+                self.addition_count += len(added)
+                self.deletion_count += len(deleted)
+
+    def additions(self):
+        return read_triples(self.path('additions.nt'))
+
+    def deletions(self):
+        return read_triples(self.path('deletions.nt'))
+
+    def close(self):
+        self.directory.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def graph_digest(graph):
+    """
+    Hexadecimal SHA-256 based digest of the triples in `graph`.
+
+    The digest does not depend on the order of the triples, nor on the
+    labels of blank nodes: graphs with blank nodes are canonicalized
+    with `rdflib.compare` first. The hashes of the N-Triples lines are
+    summed, so graphs without blank nodes are hashed in one pass.
+    """
+    if any(isinstance(term, BNode) for triple in graph for term in triple):
+        graph = to_canonical_graph(graph)
+    total = 0
+    for triple in graph:
+        total += int(sha256(_nt_row(triple).encode('utf-8')).hexdigest(), 16)
+    return '{:064x}'.format(total % 2 ** 256)
+
+
+def graph_diff(actual, desired, buckets=DEFAULT_BUCKETS, dir=None):
+    """ Compute a `GraphDiff`; `dir` is where temporary files go. """
+    return GraphDiff(actual, desired, buckets, dir)
@@ -0,0 +1,64 @@
+import os
+
+from rdflib import BNode, Graph, Literal, URIRef
+
+from .diff import graph_diff, graph_digest
+
+EX = 'http://example.com/'
+S, P, Q = URIRef(EX + 's'), URIRef(EX + 'p'), URIRef(EX + 'q')
+NODE = BNode('b0')
+
+SHARED = [
+    (S, P, Literal('shared')),
+    (S, Q, NODE),
+]
+ACTUAL_ONLY = [
+    (S, P, Literal('line\nbreak', lang='en')),
+    (NODE, Q, Literal(1)),
+]
+DESIRED_ONLY = [
+    (S, P, Literal('ünïcode "quoted"')),
+    (NODE, P, S),
+]
+
+
+def graph_of(triples):
+    graph = Graph()
+    for triple in triples:
+        graph.add(triple)
+    return graph
+
+
+def test_graph_diff():
+    actual = graph_of(SHARED + ACTUAL_ONLY)
+    desired = graph_of(SHARED + DESIRED_ONLY)
+    for buckets in (1, 3, 64):
+        with graph_diff(actual, desired, buckets) as diff:
+            assert diff.addition_count == 2
+            assert diff.deletion_count == 2
+            assert set(diff.additions()) == set(DESIRED_ONLY)
+            assert set(diff.deletions()) == set(ACTUAL_ONLY)
+            assert diff.actual_predicates == {P, Q}
+            directory = diff.directory.name
+    assert not os.path.exists(directory)
+
+
+def test_graph_diff_sparql(local_store):
+    actual = Graph(local_store, identifier=URIRef(EX + 'g'))
+    for triple in SHARED[:1] + ACTUAL_ONLY[:1]:
+        actual.add(triple)
+    desired = graph_of(SHARED[:1] + DESIRED_ONLY[:1])
+    with graph_diff(actual, desired) as diff:
+        assert list(diff.additions()) == DESIRED_ONLY[:1]
+        assert list(diff.deletions()) == ACTUAL_ONLY[:1]
+
+
+def test_graph_digest():
+    graph = graph_of(SHARED + ACTUAL_ONLY)
+    relabeled = graph_of(
+        tuple(BNode('other') if term == NODE else term for term in triple)
+        for triple in reversed(SHARED + ACTUAL_ONLY)
+    )
+    assert graph_digest(graph) == graph_digest(relabeled)
+    assert graph_digest(graph) != graph_digest(graph_of(SHARED + DESIRED_ONLY))
+    assert graph_digest(graph_of(SHARED[:1])) != graph_digest(Graph())
@@ -0,0 +1,13 @@
+from rest_framework.exceptions import APIException
+
+
+class RequestTooLarge(APIException):
+    status_code = 413
+    default_detail = 'Request body too large.'
+    default_code = 'request_too_large'
+
+
+class TooManyTriples(APIException):
+    status_code = 413
+    default_detail = 'Request contains too many triples.'
+    default_code = 'too_many_triples'
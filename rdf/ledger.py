@@ -0,0 +1,317 @@
+"""
+Checkpoint ledger for resumable RDF migrations.
+
+When the RDF_MIGRATION_LEDGER setting names a graph, `rdfmigrate`
+records every migration in that graph before applying it. The
+additions and deletions are stored in two named graphs of their own,
+next to a record of the current step, the number of triples applied
+so far, the handlers to run in their order and the handlers that have
+run. Progress is written after every
+batch, so when a migration fails halfway, the next run resumes from
+the last committed batch instead of computing a new difference. A
+batch that was sent just before the failure may be sent again, which
+is harmless because adding or removing a triple twice has no further
+effect. Handlers are marked as done one by one; a handler that failed
+runs again, so handlers should be idempotent.
+
+After a migration has been applied completely, the ledger keeps a
+digest of the desired graph (see `rdf.diff.graph_digest`). When the
+desired graph has the same digest on the next run, the migration is
+skipped without comparing it to the actual graph.
+
+The ledger also allows a migration to be rolled back: the applied
+additions are removed and the applied deletions are added again. The
+effects of handlers are not undone. Blank nodes cannot be matched
+across requests to a SPARQL store, so triples with blank nodes are not
+reliably rolled back either.
+"""
+
+from collections import defaultdict
+from itertools import islice
+from urllib.parse import quote
+
+from django.conf import settings
+from rdflib import Graph, Literal, Namespace, URIRef
+
+from .utils import (append_triples, chunked, get_batch_size, prune_triples,
+                    triple_pages)
+
+LEDGER = Namespace('https://github.com/UUDigitalHumanitieslab/restframework-rdf/ledger#')
+
+# Steps of applying a migration, in order.
+STEPS = (
+    'additions',
+    'add handlers',
+    'remove handlers',
+    'deletions',
+    'presence handlers',
+)
+DONE = 'done'
+CHANGE_STEPS = ('additions', 'deletions')
+HANDLER_STEPS = ('add handlers', 'remove handlers', 'presence handlers')
+
+COUNT_PREDICATES = {
+    'additions': LEDGER.additions,
+    'deletions': LEDGER.deletions,
+}
+APPLIED_PREDICATES = {
+    'additions': LEDGER.appliedAdditions,
+    'deletions': LEDGER.appliedDeletions,
+}
+HANDLER_PREDICATES = {
+    'add handlers': LEDGER.addHandler,
+    'remove handlers': LEDGER.removeHandler,
+    'presence handlers': LEDGER.presenceHandler,
+}
+DONE_PREDICATES = {
+    'add handlers': LEDGER.doneAddHandler,
+    'remove handlers': LEDGER.doneRemoveHandler,
+    'presence handlers': LEDGER.donePresenceHandler,
+}
+
+# The record of a migration, with the name and position of every handler.
+RECORD_QUERY = '''
+SELECT ?p ?o ?name ?position WHERE {{
+    {node} ?p ?o .
+    OPTIONAL {{ ?o {name} ?name ; {position} ?position }}
+}}
+'''
+
+
+def get_ledger(store=None):
+    """
+    The MigrationLedger from the settings, or None if not configured.
+
+    The ledger is kept in `store`, by default settings.RDFLIB_STORE.
+    """
+    identifier = getattr(settings, 'RDF_MIGRATION_LEDGER', None)
+    if identifier is None:
+        return None
+    return MigrationLedger(identifier, store or settings.RDFLIB_STORE)
+
+
+def migration_key(migration):
+    """ Name under which the progress of `migration` is recorded. """
+    cls = type(migration)
+    return '{}.{}'.format(cls.__module__, cls.__name__)
+
+
+class Checkpoint:
+    """
+    Progress of a migration that is applied without a ledger.
+
+    `diff` is a `rdf.diff.GraphDiff` and `handlers` maps each of
+    HANDLER_STEPS to a list of handler names.
+    """
+
+    def __init__(self, diff, handlers):
+        self.diff = diff
+        self.handlers = handlers
+        self.step = STEPS[0]
+        self.counts = {
+            'additions': diff.addition_count,
+            'deletions': diff.deletion_count,
+        }
+        self.applied = dict.fromkeys(CHANGE_STEPS, 0)
+        self.handlers_done = defaultdict(set)
+        self.batch_size = get_batch_size()
+
+    @property
+    def done(self):
+        return self.step == DONE
+
+    def completed(self, step):
+        """ Whether `step` was finished by an earlier run. """
+        order = STEPS + (DONE,)
+        return order.index(step) < order.index(self.step)
+
+    def advance(self, step):
+        self.step = step
+
+    def batches(self, kind):
+        """ Lists of the triples of `kind` that have not been applied yet. """
+        return chunked(getattr(self.diff, kind)(), self.batch_size)
+
+    def commit(self, kind, count):
+        """ Record that `count` more triples of `kind` have been applied. """
+        self.applied[kind] += count
+
+    def pending_handlers(self, step):
+        return [
+            name for name in self.handlers[step]
+            if name not in self.handlers_done[step]
+        ]
+
+    def handler_done(self, step, name):
+        self.handlers_done[step].add(name)
+
+
+class LedgerCheckpoint(Checkpoint):
+    """ Progress of a migration, stored in a MigrationLedger. """
+
+    def __init__(self, ledger, key, values):
+        self.ledger = ledger
+        self.key = key
+        self.node = ledger.record_node(key)
+        first = lambda predicate: values[predicate][0].toPython()
+        self.step = first(LEDGER.step)
+        self.batch_size = first(LEDGER.batchSize)
+        self.counts = {
+            kind: first(predicate)
+            for kind, predicate in COUNT_PREDICATES.items()
+        }
+        self.applied = {
+            kind: first(predicate)
+            for kind, predicate in APPLIED_PREDICATES.items()
+        }
+        self.handlers = {
+            step: list(map(str, values[predicate]))
+            for step, predicate in HANDLER_PREDICATES.items()
+        }
+        self.handlers_done = {
+            step: set(map(str, values[predicate]))
+            for step, predicate in DONE_PREDICATES.items()
+        }
+
+    def advance(self, step):
+        if step != self.step:
+            self.step = step
+            self.ledger.graph.set((self.node, LEDGER.step, Literal(step)))
+
+    def batches(self, kind):
+        return triple_pages(
+            self.ledger.changes_graph(self.key, kind),
+            self.batch_size,
+            self.applied[kind],
+        )
+
+    def applied_batches(self, kind):
+        """ Lists of the triples of `kind` that have been applied. """
+        pages = triple_pages(
+            self.ledger.changes_graph(self.key, kind), self.batch_size
+        )
+        return chunked(
+            islice((t for page in pages for t in page), self.applied[kind]),
+            self.batch_size,
+        )
+
+    def commit(self, kind, count):
+        self.applied[kind] += count
+        self.ledger.graph.set((
+            self.node, APPLIED_PREDICATES[kind], Literal(self.applied[kind])
+        ))
+
+    def handler_done(self, step, name):
+        self.handlers_done[step].add(name)
+        self.ledger.graph.add((self.node, DONE_PREDICATES[step], Literal(name)))
+
+
+class MigrationLedger:
+    """
+    Named graph `identifier` in `store` that records migration progress.
+
+    Migrations are recorded under a key (see `migration_key`). The
+    changes of the migration with key K are kept in the named graphs
+    <identifier/K/additions> and <identifier/K/deletions>.
+    """
+
+    def __init__(self, identifier, store):
+        self.identifier = URIRef(identifier)
+        self.store = store
+        self.graph = Graph(store, identifier=self.identifier)
+
+    def record_node(self, key):
+        return URIRef('{}/{}'.format(self.identifier, quote(key)))
+
+    def handler_node(self, key, step, position):
+        return URIRef('{}/{}/{}'.format(
+            self.record_node(key), quote(step), position
+        ))
+
+    def changes_graph(self, key, kind):
+        return Graph(self.store, identifier=URIRef(
+            '{}/{}'.format(self.record_node(key), kind)
+        ))
+
+    def checkpoint(self, key):
+        """ The LedgerCheckpoint of `key`, or None if none was recorded. """
+        values = defaultdict(list)
+        handlers = defaultdict(list)
+        for row in self.graph.query(RECORD_QUERY.format(
+            node=self.record_node(key).n3(), name=LEDGER.name.n3(),
+            position=LEDGER.position.n3(),
+        )):
+            if row.name is None:
+                values[row.p].append(row.o)
+            else:
+                handlers[row.p].append((row.position.toPython(), row.name))
+        if LEDGER.step not in values:
+            return None
+        for predicate, names in handlers.items():
+            values[predicate] = [name for position, name in sorted(names)]
+        return LedgerCheckpoint(self, key, values)
+
+    def digest(self, key):
+        """ Digest of the desired graph that `key` was last migrated to. """
+        value = self.graph.value(self.record_node(key), LEDGER.digest)
+        return None if value is None else str(value)
+
+    def set_digest(self, key, digest):
+        self.graph.set((self.record_node(key), LEDGER.digest, Literal(digest)))
+
+    def start(self, key, diff, handlers):
+        """
+        Record a new migration with the changes in GraphDiff `diff`.
+
+        Any earlier record of `key` is discarded. `handlers` maps each
+        of HANDLER_STEPS to the names of the handlers to run.
+        """
+        self.discard(key)
+        append_triples(self.changes_graph(key, 'additions'), diff.additions())
+        append_triples(self.changes_graph(key, 'deletions'), diff.deletions())
+        node = self.record_node(key)
+        record = [
+            (node, LEDGER.step, Literal(STEPS[0])),
+            (node, LEDGER.batchSize, Literal(get_batch_size())),
+            (node, LEDGER.additions, Literal(diff.addition_count)),
+            (node, LEDGER.deletions, Literal(diff.deletion_count)),
+            (node, LEDGER.appliedAdditions, Literal(0)),
+            (node, LEDGER.appliedDeletions, Literal(0)),
+        ]
+        # The handlers run in the order in which they are recorded.
+        for step, predicate in HANDLER_PREDICATES.items():
+            for position, name in enumerate(handlers[step]):
+                handler = self.handler_node(key, step, position)
+                record.extend([
+                    (node, predicate, handler),
+                    (handler, LEDGER.name, Literal(name)),
+                    (handler, LEDGER.position, Literal(position)),
+                ])
+        append_triples(self.graph, record)
+        return self.checkpoint(key)
+
+    def discard(self, key):
+        """ Remove everything that was recorded for `key`. """
+        for kind in CHANGE_STEPS:
+            self.changes_graph(key, kind).remove((None, None, None))
+        node = self.record_node(key)
+        for predicate in HANDLER_PREDICATES.values():
+            for handler in list(self.graph.objects(node, predicate)):
+                self.graph.remove((handler, None, None))
+        self.graph.remove((node, None, None))
+
+    def rollback(self, key, actual):
+        """
+        Undo the changes recorded for `key` in graph `actual`.
+
+        Returns False if nothing was recorded for `key`.
+        """
+        checkpoint = self.checkpoint(key)
+        if checkpoint is None:
+            return False
+        for batch in checkpoint.applied_batches('additions'):
+            prune_triples(actual, batch)
+        for batch in checkpoint.applied_batches('deletions'):
+            append_triples(actual, batch)
+        self.discard(key)
+        return True
@@ -0,0 +1,162 @@
+import pytest
+from rdflib import Graph, Literal, URIRef
+
+from .diff import graph_diff
+from .ledger import DONE, get_ledger, migration_key
+from .migrations import RDFMigration, on_add
+from .management.commands.rdfmigrate import Command, handled_subjects
+
+EX = 'http://example.com/'
+ACTUAL = URIRef(EX + 'actual')
+LEDGER_GRAPH = EX + 'ledger'
+S = URIRef(EX + 's')
+ORIGINAL = [(S, URIRef(EX + 'old'), Literal(n)) for n in range(3)]
+DESIRED = [(S, URIRef(EX + 'new'), Literal(n)) for n in range(5)]
+
+
+class Failure(Exception):
+    pass
+
+
+@pytest.fixture
+def ledger_settings(settings, local_store):
+    settings.RDFLIB_STORE = local_store
+    settings.RDF_MIGRATION_LEDGER = LEDGER_GRAPH
+    settings.RDF_BATCH_SIZE = 2
+    return settings
+
+
+@pytest.fixture
+def migration(local_store):
+    actual = Graph(local_store, identifier=ACTUAL)
+    for triple in ORIGINAL:
+        actual.add(triple)
+    local_store.reset_log()
+    desired = Graph()
+    for triple in DESIRED:
+        desired.add(triple)
+
+    class LedgerMigration(RDFMigration):
+        failures = 1
+        runs = 0
+
+        def actual(self):
+            return actual
+
+        def desired(self):
+            return desired
+
+        @on_add(S)
+        def check(self, actual, conjunctive):
+            self.runs += 1
+            if self.failures:
+                self.failures -= 1
+                raise Failure()
+
+    return LedgerMigration()
+
+
+def inserts(local_store):
+    return [
+        update for update in local_store.update_log
+        if 'INSERT DATA' in update and str(ACTUAL) in update
+    ]
+
+
+def test_resume_handler(ledger_settings, local_store, migration):
+    command = Command()
+    with pytest.raises(Failure):
+        command.migrate_graph(migration)
+    checkpoint = get_ledger().checkpoint(migration_key(migration))
+    assert checkpoint.step == 'add handlers'
+    assert checkpoint.applied == {'additions': 5, 'deletions': 0}
+    assert len(inserts(local_store)) == 3
+    command.migrate_graph(migration)
+    assert migration.runs == 2
+    assert len(inserts(local_store)) == 3
+    assert set(migration.actual()) == set(DESIRED)
+    assert get_ledger().checkpoint(migration_key(migration)).step == DONE
+
+
+def test_resume_batch(ledger_settings, local_store, migration, monkeypatch):
+    migration.failures = 0
+    update = local_store._update
+    calls = []
+
+    def flaky_update(query):
+        if 'INSERT DATA' in query and str(ACTUAL) in query:
+            calls.append(query)
+            if len(calls) == 2:
+                raise Failure()
+        update(query)
+
+    monkeypatch.setattr(local_store, '_update', flaky_update)
+    command = Command()
+    with pytest.raises(Failure):
+        command.migrate_graph(migration)
+    checkpoint = get_ledger().checkpoint(migration_key(migration))
+    assert checkpoint.step == 'additions'
+    assert checkpoint.applied['additions'] == 2
+    command.migrate_graph(migration)
+    # The first batch is not sent again.
+    assert len(calls) == 4
+    assert set(migration.actual()) == set(DESIRED)
+
+
+def test_rollback(ledger_settings, migration):
+    migration.failures = 0
+    Command().migrate_graph(migration)
+    assert set(migration.actual()) == set(DESIRED)
+    Command().rollback_migration('app', migration)
+    assert set(migration.actual()) == set(ORIGINAL)
+    assert get_ledger().checkpoint(migration_key(migration)) is None
+    assert len(get_ledger().graph) == 0
+
+
+def test_unchanged_digest(ledger_settings, local_store, migration):
+    migration.failures = 0
+    Command().migrate_graph(migration)
+    local_store.reset_log()
+    Command().migrate_graph(migration)
+    # Only the ledger record and the digest were read.
+    assert local_store.round_trips == 2
+    assert migration.runs == 1
+    Command().migrate_graph(migration, force=True)
+    assert local_store.round_trips > 2
+    migration.desired().add((S, URIRef(EX + 'new'), Literal(5)))
+    Command().migrate_graph(migration)
+    assert (S, URIRef(EX + 'new'), Literal(5)) in migration.actual()
+    assert migration.runs == 2
+
+
+def test_handler_order(ledger_settings, local_store):
+    first, second = URIRef(EX + 'first'), URIRef(EX + 'second')
+    desired = Graph()
+    for subject in (first, second):
+        desired.add((subject, URIRef(EX + 'p'), Literal(1)))
+    with graph_diff(Graph(), desired) as diff:
+        order = handled_subjects(diff.additions(), {first: 1, second: 1})
+    # The names sort against the order in which the subjects are handled.
+    names = dict(zip(order, ('zulu', 'alpha')))
+    calls = []
+
+    def handler(name, subject):
+        @on_add(subject)
+        def handle(self, actual, conjunctive):
+            calls.append(name)
+        return handle
+
+    def run(actual):
+        attributes = {
+            name: handler(name, subject) for subject, name in names.items()
+        }
+        attributes['actual'] = lambda self: actual
+        attributes['desired'] = lambda self: desired
+        Command().migrate_graph(type('OrderMigration', (RDFMigration,), attributes)())
+        return list(calls)
+
+    ledger_settings.RDF_MIGRATION_LEDGER = None
+    assert run(Graph()) == ['zulu', 'alpha']
+    calls.clear()
+    ledger_settings.RDF_MIGRATION_LEDGER = LEDGER_GRAPH
+    assert run(Graph(local_store, identifier=ACTUAL)) == ['zulu', 'alpha']
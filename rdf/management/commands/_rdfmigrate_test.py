@@ -14,9 +14,11 @@ of comparison when blank nodes are involved!
 import pytest
 
 from importlib import import_module
+from io import StringIO
+from threading import Barrier, current_thread
 from sys import stdout
 
-from rdflib import Graph
+from rdflib import Graph, URIRef
 
 from rdf.utils import graph_from_triples
 from rdf.ns import RDF, RDFS
@@ -57,3 +59,139 @@ def test_migrate_graph(empty_graph, filled_graph):
     assert len(backup - empty_graph) == 0
     assert len(empty_graph - backup) == 1
     assert extra in empty_graph
+
+
+@pytest.mark.django_db
+def test_migrate_graph_plan_profile(empty_graph, filled_graph):
+    output = StringIO()
+    command = Command(stdout=output)
+
+    class TestMigration(RDFMigration):
+        def actual(self):
+            return empty_graph
+        def desired(self):
+            return filled_graph
+        @on_add(RDF.type)
+        def insert_extra(self, actual, conjunctive):
+            actual.add((RDFS.label, RDFS.domain, RDFS.Resource))
+
+    command.migrate_graph(TestMigration(), plan=True, profile=True)
+    assert len(empty_graph) == 0
+    lines = output.getvalue().splitlines()
+    assert lines[0] == '{} additions, 0 deletions.'.format(len(filled_graph))
+    assert lines[1] == 'Would apply addition handler "insert_extra".'
+    assert lines[3].split()[0] == 'diff'
+    assert lines[3].split()[-1] == str(len(filled_graph))
+    assert lines[4].split() == ['additions', 'skipped']
+
+    output.truncate(0)
+    output.seek(0)
+    command.migrate_graph(TestMigration(), profile=True)
+    assert len(empty_graph) == len(filled_graph) + 1
+    rows = {line[:20].strip(): line[20:].split() for line in output.getvalue().splitlines()}
+    assert rows['additions'][-1] == str(len(filled_graph))
+    assert rows['add handlers'][-1] == '1'
+    assert rows['deletions'][-1] == '0'
+
+
+class GraphsMigration(RDFMigration):
+    def __init__(self, *graphs, run=lambda: None):
+        self.graphs = graphs
+        self.run = run
+
+
+def test_migration_lanes():
+    migrations = [
+        ('a', GraphsMigration('http://example.com/1')),
+        ('b', GraphsMigration('http://example.com/2')),
+        ('c', GraphsMigration('http://example.com/3')),
+        ('d', GraphsMigration('http://example.com/1', 'http://example.com/3')),
+    ]
+    lanes = migration_lanes(migrations)
+    assert sorted([app for app, m in lane] for lane in lanes) == [
+        ['a', 'c', 'd'], ['b'],
+    ]
+
+
+def test_handle_jobs(monkeypatch):
+    module = import_module(Command.__module__)
+    barrier = Barrier(2, timeout=5)
+
+    def fail():
+        raise ValueError('broken')
+
+    migrations = {
+        # auth and sessions only finish if they run at the same time.
+        'django.contrib.auth': GraphsMigration('http://example.com/1', run=barrier.wait),
+        'django.contrib.sessions': GraphsMigration('http://example.com/2', run=barrier.wait),
+        'django.contrib.contenttypes': GraphsMigration('http://example.com/2', run=fail),
+    }
+    monkeypatch.setattr(module, 'load_migration', migrations.get)
+    monkeypatch.setattr(Command, 'migrate_graph', lambda self, migration, *options: migration.run())
+    output = StringIO()
+    command = Command(stdout=output)
+    with pytest.raises(CommandError) as error:
+        command.handle(
+            app_label=list(migrations), plan=False, profile=False, jobs=2,
+            rollback=False, force=False,
+        )
+    assert 'django.contrib.contenttypes' in str(error.value)
+    summary = output.getvalue().split('Summary:\n')[1].splitlines()
+    assert summary[0].startswith('  django.contrib.auth: ok')
+    assert summary[1].startswith('  django.contrib.sessions: ok')
+    assert summary[2].startswith('  django.contrib.contenttypes: failed')
+
+
+def test_handle_inline(monkeypatch):
+    module = import_module(Command.__module__)
+    threads = []
+    migrations = {
+        'django.contrib.auth': GraphsMigration('http://example.com/1'),
+        'django.contrib.sessions': GraphsMigration('http://example.com/2'),
+    }
+    monkeypatch.setattr(module, 'load_migration', migrations.get)
+    monkeypatch.setattr(
+        Command, 'migrate_graph',
+        lambda self, migration, *options: threads.append(current_thread()),
+    )
+    Command(stdout=StringIO()).handle(
+        app_label=list(migrations), plan=False, profile=False, jobs=1,
+        rollback=False, force=False,
+    )
+    # A single job runs in the caller's thread, database connection and
+    # transaction.
+    assert threads == [current_thread()] * 2
+
+
+@pytest.mark.django_db
+def test_migrate_lane_own_store(settings, local_store, triples):
+    settings.RDFLIB_STORE = local_store
+    stores = []
+
+    class StoreMigration(RDFMigration):
+        def __init__(self, identifier):
+            self.identifier = identifier
+        def actual(self):
+            return Graph(settings.RDFLIB_STORE, identifier=self.identifier)
+        def desired(self):
+            return graph_from_triples(triples)
+        @on_add(RDF.type)
+        def record_store(self, actual, conjunctive):
+            stores.append((actual.store, conjunctive.store))
+
+    command = Command(stdout=StringIO())
+    lanes = [
+        [('a', StoreMigration(URIRef('http://example.com/1')))],
+        [('b', StoreMigration(URIRef('http://example.com/2')))],
+    ]
+    for lane in lanes:
+        results = command.migrate_lane(lane, False, False, own_store=True)
+        assert results[0][1][1] is None
+        identifier = lane[0][1].identifier
+        stored = local_store.dataset.get_context(identifier)
+        assert set(stored) == set(triples)
+    # Every lane wrote through its own copy of the configured store.
+    assert stores[0][0] is not stores[1][0]
+    assert all(actual is conjunctive for actual, conjunctive in stores)
+    assert local_store not in {actual for actual, conjunctive in stores}
+    assert local_store._updates == 0
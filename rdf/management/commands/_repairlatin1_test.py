@@ -0,0 +1,96 @@
+"""
+Unittests for the repairlatin1 command.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+from django.core.management.base import CommandError
+from rdflib import Literal
+from rdflib.plugins.sparql.parser import parseUpdate
+
+from rdf.conftest import ITEM
+from rdf.ns import DCTERMS, OA, RDFS, XSD
+from rdf.utils import RECODE_LATIN1_UPDATE
+from .repairlatin1 import *
+
+SOURCE_GRAPH = ITEM['sources']
+
+
+@pytest.fixture
+def latin1_store(local_store, settings):
+    settings.RDFLIB_STORE = local_store
+    graph = local_store.dataset.get_context(ITEM['graph'])
+    for n in range(7):
+        subject = ITEM[str(n)]
+        graph.add((subject, DCTERMS.created, Literal(datetime.now(timezone.utc))))
+        graph.add((subject, RDFS.label, Literal('cafÃ©', datatype=XSD.string)))
+    # pyparsing is not thread-safe the first time a grammar is used, so
+    # parse an update like the ones that the workers send beforehand.
+    parseUpdate(RECODE_LATIN1_UPDATE.format(
+        graph=ITEM['graph'].n3(), rows='({} {} "a" "b")'.format(
+            ITEM['0'].n3(), RDFS.label.n3())))
+    local_store.reset_log()
+    return local_store
+
+
+def labels(store):
+    graph = store.dataset.get_context(ITEM['graph'])
+    return set(map(str, graph.objects(None, RDFS.label)))
+
+
+def test_repair(latin1_store, caplog):
+    caplog.set_level('INFO', 'rdf')
+    Command().handle(
+        graph=str(ITEM['graph']), source_graph=None, since=LATIN1_SINCE,
+        after='', batch_size=3, workers=2, dry_run=False,
+    )
+    assert labels(latin1_store) == {'café'}
+    # Pages of 3, 3 and 1 subjects, with an update per page that the
+    # workers sent through their own copies of the store.
+    assert latin1_store._queries == 3
+    assert latin1_store._updates == 0
+    assert len([
+        update for update in latin1_store.update_log if 'DELETE' in update
+    ]) == 3
+    assert 'Replaced 7 of 7 candidate triples' in caplog.text
+    assert 'done up to and including {}'.format(ITEM['6']) in caplog.text
+
+
+def test_repair_dry_run_after(latin1_store, caplog):
+    caplog.set_level('INFO', 'rdf')
+    Command().handle(
+        graph=str(ITEM['graph']), source_graph=None, since=LATIN1_SINCE,
+        after=str(ITEM['4']), batch_size=None, workers=1, dry_run=True,
+    )
+    assert labels(latin1_store) == {'cafÃ©'}
+    assert latin1_store._updates == 0
+    assert 'Would replace 2 of 2 candidate triples' in caplog.text
+
+
+def test_repair_preannos(latin1_store):
+    graph = latin1_store.dataset.get_context(ITEM['graph'])
+    sources = latin1_store.dataset.get_context(SOURCE_GRAPH)
+    graph.add((ITEM['anno'], OA.hasTarget, ITEM['target']))
+    graph.add((ITEM['target'], OA.hasSource, ITEM['source']))
+    graph.add((ITEM['target'], OA.hasSelector, ITEM['selector']))
+    graph.add((ITEM['selector'], OA.exact, Literal('Ã©', datatype=XSD.string)))
+    sources.add((ITEM['source'], DCTERMS.created, Literal(datetime.now(timezone.utc))))
+    Command().handle(
+        graph=str(ITEM['graph']), source_graph=str(SOURCE_GRAPH),
+        since=LATIN1_SINCE, after='', batch_size=10, workers=1, dry_run=False,
+    )
+    assert str(graph.value(ITEM['selector'], OA.exact)) == 'é'
+    # Only the selector was a candidate.
+    assert labels(latin1_store) == {'cafÃ©'}
+
+
+def test_repair_failure(latin1_store, monkeypatch):
+    def fail(update):
+        raise ConnectionError()
+    monkeypatch.setattr(latin1_store, '_update', fail)
+    with pytest.raises(CommandError):
+        Command().handle(
+            graph=str(ITEM['graph']), source_graph=None, since=LATIN1_SINCE,
+            after='', batch_size=3, workers=1, dry_run=False,
+        )
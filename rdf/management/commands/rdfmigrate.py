@@ -7,20 +7,123 @@ derives from rdf.migrations.RDFMigration.
 """
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from importlib import import_module
+from time import perf_counter
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from rdf.utils import append_triples, get_conjunctive_graph, prune_triples
+from django.db import connections
+from rdf.diff import graph_diff, graph_digest
+from rdf.ledger import (CHANGE_STEPS, DONE, STEPS, Checkpoint, get_ledger,
+                        migration_key)
+from rdf.utils import (append_triples, get_conjunctive_graph, prune_triples,
+                       rebind_graph, thread_store)
 
 logger = logging.getLogger('rdf')
 
 
+PHASES = ('diff',) + STEPS
+
+HANDLER_KINDS = {
+    'add handlers': 'addition',
+    'remove handlers': 'deletion',
+    'presence handlers': 'presence',
+}
+
+
+def round_trips(stores):
+    """ Number of requests that `stores` sent so far, if they count them. """
+    return sum(
+        getattr(store, '_queries', 0) + getattr(store, '_updates', 0)
+        for store in stores
+    )
+
+
+class MigrationProfile:
+    """
+    Wall time, store round trips and triple counts per migration phase.
+
+    For the diff, the triple count is the number of triples read from
+    both graphs; for additions and deletions, the number of triples
+    written. For the handler phases, it is the net change in the size
+    of the actual graph, which is measured outside of the phase.
+    """
+
+    def __init__(self, actual, conjunctive):
+        self.actual = actual
+        self.stores = [actual.store]
+        if conjunctive.store is not actual.store:
+            self.stores.append(conjunctive.store)
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name, count_triples=False):
+        """ Measure the body as phase `name`; it may set 'triples'. """
+        size = len(self.actual) if count_triples else None
+        record = {'seconds': 0.0, 'round_trips': 0, 'triples': 0}
+        trips = round_trips(self.stores)
+        start = perf_counter()
+        yield record
+        record['seconds'] = perf_counter() - start
+        record['round_trips'] = round_trips(self.stores) - trips
+        if count_triples:
+            record['triples'] = len(self.actual) - size
+        self.phases[name] = record
+
+    def report(self):
+        """ Lines of a table with one row per phase. """
+        yield '{:<20}{:>12}{:>13}{:>10}'.format(
+            'phase', 'seconds', 'round trips', 'triples')
+        for name in PHASES:
+            record = self.phases.get(name)
+            if record is None:
+                yield '{:<20}{:>12}'.format(name, 'skipped')
+            else:
+                yield '{:<20}{:>12.3f}{:>13}{:>10}'.format(
+                    name, record['seconds'], record['round_trips'],
+                    record['triples'])
+
+
+class NoProfile:
+    """ Stand-in for MigrationProfile that measures nothing. """
+
+    @contextmanager
+    def phase(self, name, count_triples=False):
+        yield {}
+
+
 class Command(BaseCommand):
     help = 'Performs RDF migrations for the specified app(s).'
 
     def add_arguments(self, parser):
         parser.add_argument('app_label', nargs='*')
+        parser.add_argument(
+            '--plan', action='store_true',
+            help='Compute the changes and the handlers that would run, '
+                 'without writing anything.',
+        )
+        parser.add_argument(
+            '--profile', action='store_true',
+            help='Report wall time, store round trips and triple counts '
+                 'for each phase of every migration.',
+        )
+        parser.add_argument(
+            '--jobs', type=int, default=1,
+            help='Number of migrations to run concurrently. Migrations '
+                 'that touch the same graphs still run one at a time.',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Apply migrations even if the ledger shows that their '
+                 'desired graph has not changed.',
+        )
+        parser.add_argument(
+            '--rollback', action='store_true',
+            help='Undo the changes of the last recorded migrations. '
+                 'Requires the RDF_MIGRATION_LEDGER setting.',
+        )
 
     def handle(self, *args, **options):
         app_labels = options['app_label']
@@ -30,53 +133,287 @@ class Command(BaseCommand):
             for app in app_labels:
                 if app not in settings.INSTALLED_APPS:
                     raise CommandError('{} is not an installed app'.format(app))
+        if options['rollback'] and get_ledger() is None:
+            raise CommandError(
+                'Rolling back requires the RDF_MIGRATION_LEDGER setting.')
+        migrations = []
         for app in app_labels:
-            self.migrate_package(app)
+            migration = load_migration(app)
+            if migration is not None:
+                migrations.append((app, migration))
+        lanes = migration_lanes(migrations)
+        arguments = (
+            options['plan'], options['profile'], options['rollback'],
+            options['force'],
+        )
+        if options['jobs'] > 1:
+            with ThreadPoolExecutor(options['jobs']) as executor:
+                futures = [
+                    executor.submit(self.migrate_lane, lane, *arguments, True)
+                    for lane in lanes
+                ]
+                results = dict(
+                    result for future in futures for result in future.result()
+                )
+        else:
+            # In the calling thread, so within its database connection.
+            results = dict(
+                result for lane in lanes
+                for result in self.migrate_lane(lane, *arguments)
+            )
+        self.write_summary(migrations, results)
 
-    def migrate_package(self, pkg_name):
-        """ Determine whether `pkg` has RDF migrations. If so, apply them. """
+    def migrate_lane(self, lane, plan, profile, rollback=False, force=False,
+                     own_store=False):
+        """
+        Apply the migrations in `lane` one after another.
+
+        Returns a list of (app, (seconds, error)) pairs, where `error` is
+        None if the migration succeeded. After a failure, the remaining
+        migrations in the lane are skipped, since they touch some of the
+        same graphs. With `own_store`, the lane writes through its own
+        `rdf.utils.thread_store` copy of the configured store, so that
+        concurrent lanes do not lose each other's edits.
+        """
+        store = thread_store(settings.RDFLIB_STORE) if own_store else None
+        results = []
         try:
-            migrations = import_module('.rdf_migrations', pkg_name)
-            if migrations:
-                logger.info(
-                    'Applying RDF migrations for {}...'.format(pkg_name))
-            self.migrate_graph(migrations.Migration())
+            for app, migration in lane:
+                start = perf_counter()
+                try:
+                    if rollback:
+                        self.rollback_migration(app, migration, store)
+                    else:
+                        self.apply_migration(
+                            app, migration, plan, profile, force, store)
+                except Exception as error:
+                    logger.exception(
+                        'RDF migrations for {} failed.'.format(app))
+                    results.append((app, (perf_counter() - start, error)))
+                    break
+                results.append((app, (perf_counter() - start, None)))
+        finally:
+            # Lanes run in worker threads, which own their connections.
+            connections.close_all()
+        return results
+
+    def write_summary(self, migrations, results):
+        """ Report per app; raise CommandError if anything failed. """
+        failed = []
+        if migrations:
+            self.stdout.write('Summary:')
+        for app, migration in migrations:
+            if app not in results:
+                self.stdout.write('  {}: skipped'.format(app))
+                failed.append(app)
+                continue
+            seconds, error = results[app]
+            if error is None:
+                self.stdout.write('  {}: ok ({:.3f}s)'.format(app, seconds))
+            else:
+                self.stdout.write('  {}: failed ({:.3f}s): {!r}'.format(
+                    app, seconds, error))
+                failed.append(app)
+        if failed:
+            raise CommandError(
+                'RDF migrations failed for {}.'.format(', '.join(failed)))
+
+    def migrate_package(self, pkg_name, plan=False, profile=False,
+                        force=False):
+        """ Determine whether `pkg` has RDF migrations. If so, apply them. """
+        migration = load_migration(pkg_name)
+        if migration is not None:
+            self.apply_migration(pkg_name, migration, plan, profile, force)
+
+    def apply_migration(self, pkg_name, migration, plan=False, profile=False,
+                        force=False, store=None):
+        logger.info('Applying RDF migrations for {}...'.format(pkg_name))
+        self.migrate_graph(migration, plan, profile, force, store)
+        if plan:
+            applied_msg = 'Planned RDF migrations for {}.'.format(pkg_name)
+        else:
             applied_msg = 'Applied RDF migrations for {}.'.format(pkg_name)
-            self.stdout.write(applied_msg)
-            logger.info(applied_msg)
-        except ImportError:
-            # Nothing to do, this package has no RDF migrations.
-            pass
-        except AttributeError:
-            # Likewise.
-            pass
-
-    def migrate_graph(self, migration):
-        """ Update the `actual` graph to match `desired`. """
+        self.stdout.write(applied_msg)
+        logger.info(applied_msg)
+
+    def rollback_migration(self, pkg_name, migration, store=None):
+        """ Undo the changes that the ledger recorded for `migration`. """
+        ledger = get_ledger(store)
+        actual = migration.actual()
+        if store is not None:
+            actual = rebind_graph(actual, store)
+        if ledger.rollback(migration_key(migration), actual):
+            message = 'Rolled back RDF migrations for {}.'.format(pkg_name)
+        else:
+            message = 'No recorded RDF migrations for {}.'.format(pkg_name)
+        self.stdout.write(message)
+        logger.info(message)
+
+    def migrate_graph(self, migration, plan=False, profile=False,
+                      force=False, store=None):
+        """
+        Update the `actual` graph to match `desired`.
+
+        The difference is computed with `rdf.diff.graph_diff`, which
+        spills both graphs to disk, so neither the graphs nor the
+        difference need to fit in memory. With `plan`, only report the
+        changes and the handlers that would be applied. With `profile`,
+        report the cost of each phase afterwards.
+
+        If a ledger is configured and the desired graph has the same
+        digest as when the migration was last applied, the actual graph
+        is not touched at all, unless `force` is set. If `store` is given,
+        the graphs on the configured store, including the ledger, are
+        accessed through it instead.
+        """
         actual = migration.actual()
-        desired = migration.desired()
-        additions = desired - actual
-        deletions = actual - desired
-        logger.info('{} additions, {} deletions.'.format(
-            len(additions), len(deletions)))
-        predicates_present = set(actual.predicates())
-        subjects_added = set(additions.subjects())
-        subjects_deleted = set(deletions.subjects())
         conjunctive = get_conjunctive_graph()
-        # Do the additions first in case we need to update referencing triples.
-        append_triples(actual, additions)
-        adders = (migration.add_handlers.get(s) for s in subjects_added)
-        for handler_name in filter(None, adders):
-            getattr(migration, handler_name)(actual, conjunctive)
-            logger.info('Applied addition handler "{}".'.format(handler_name))
-        deleters = (migration.remove_handlers.get(s) for s in subjects_deleted)
-        for handler_name in filter(None, deleters):
-            getattr(migration, handler_name)(actual, conjunctive)
-            logger.info('Applied deletion handler "{}".'.format(handler_name))
-        prune_triples(actual, deletions)
-        # Handle predicate presence
-        presence_handlers = (migration.presence_handlers.get(s)
-                             for s in predicates_present)
-        for handler_name in filter(None, presence_handlers):
-            getattr(migration, handler_name)(actual, conjunctive)
-            logger.info('Applied presence handler "{}".'.format(handler_name))
+        if store is not None:
+            actual = rebind_graph(actual, store)
+            conjunctive = rebind_graph(conjunctive, store)
+        profiler = MigrationProfile(actual, conjunctive) if profile else NoProfile()
+        ledger = get_ledger(store)
+        key = migration_key(migration)
+        checkpoint = ledger and ledger.checkpoint(key)
+        if checkpoint is not None and not checkpoint.done:
+            if plan:
+                self.stdout.write(
+                    'Would resume at {}.'.format(checkpoint.step))
+            else:
+                logger.info('Resuming at {}.'.format(checkpoint.step))
+                self.apply_checkpoint(
+                    migration, actual, conjunctive, checkpoint, profiler)
+        else:
+            self.apply_diff(
+                migration, actual, conjunctive, ledger, plan, profiler, force)
+        if profile:
+            for line in profiler.report():
+                self.stdout.write(line)
+
+    def apply_diff(self, migration, actual, conjunctive, ledger, plan,
+                   profiler, force=False):
+        """ Compute the difference with the desired graph and apply it. """
+        desired = migration.desired()
+        key = migration_key(migration)
+        digest = None
+        if ledger is not None:
+            digest = graph_digest(desired)
+            if not force and ledger.digest(key) == digest:
+                message = 'Desired graph unchanged, skipping.'
+                if plan:
+                    self.stdout.write(message)
+                logger.info(message)
+                return
+        with profiler.phase('diff') as record:
+            diff = graph_diff(actual, desired)
+            record['triples'] = diff.actual_count + diff.desired_count
+        with diff:
+            logger.info('{} additions, {} deletions.'.format(
+                diff.addition_count, diff.deletion_count))
+            subjects_added = handled_subjects(
+                diff.additions(), migration.add_handlers)
+            subjects_deleted = handled_subjects(
+                diff.deletions(), migration.remove_handlers)
+            handlers = {
+                'add handlers': handler_names(
+                    migration.add_handlers, subjects_added),
+                'remove handlers': handler_names(
+                    migration.remove_handlers, subjects_deleted),
+                'presence handlers': handler_names(
+                    migration.presence_handlers, diff.actual_predicates),
+            }
+            if plan:
+                self.write_plan(diff, handlers)
+                return
+            if ledger is not None and (diff.addition_count or diff.deletion_count):
+                checkpoint = ledger.start(key, diff, handlers)
+            else:
+                checkpoint = Checkpoint(diff, handlers)
+            self.apply_checkpoint(
+                migration, actual, conjunctive, checkpoint, profiler)
+        if digest is not None:
+            ledger.set_digest(key, digest)
+
+    def apply_checkpoint(self, migration, actual, conjunctive, checkpoint,
+                         profiler):
+        """ Apply the steps of `checkpoint` that have not been completed. """
+        # The additions come first in case we need to update referencing
+        # triples.
+        for step in STEPS:
+            if checkpoint.completed(step):
+                continue
+            checkpoint.advance(step)
+            if step in CHANGE_STEPS:
+                apply = append_triples if step == 'additions' else prune_triples
+                with profiler.phase(step) as record:
+                    record['triples'] = 0
+                    for batch in checkpoint.batches(step):
+                        apply(actual, batch)
+                        checkpoint.commit(step, len(batch))
+                        record['triples'] += len(batch)
+                continue
+            with profiler.phase(step, True):
+                for handler_name in checkpoint.pending_handlers(step):
+                    getattr(migration, handler_name)(actual, conjunctive)
+                    checkpoint.handler_done(step, handler_name)
+                    logger.info('Applied {} handler "{}".'.format(
+                        HANDLER_KINDS[step], handler_name))
+        checkpoint.advance(DONE)
+
+    def write_plan(self, diff, handlers):
+        """ Report what `apply_checkpoint` would do. """
+        self.stdout.write('{} additions, {} deletions.'.format(
+            diff.addition_count, diff.deletion_count))
+        for step, kind in HANDLER_KINDS.items():
+            for handler_name in handlers[step]:
+                self.stdout.write(
+                    'Would apply {} handler "{}".'.format(kind, handler_name))
+
+
+def load_migration(pkg_name):
+    """ Instance of the RDF migration of `pkg_name`, or None if it has none. """
+    try:
+        migrations = import_module('.rdf_migrations', pkg_name)
+        return migrations.Migration()
+    except ImportError:
+        # Nothing to do, this package has no RDF migrations.
+        return None
+    except AttributeError:
+        # Likewise.
+        return None
+
+
+def migration_lanes(migrations):
+    """
+    Group (app, migration) pairs that touch overlapping sets of graphs.
+
+    Returns a list of lanes. Each lane is a list of pairs in their
+    original order, and no two lanes touch the same graph, so lanes
+    can run concurrently.
+    """
+    lanes = []
+    for pair in migrations:
+        graphs = set(pair[1].touched_graphs())
+        lane = [pair]
+        for other in [l for l in lanes if l[0] & graphs]:
+            lanes.remove(other)
+            graphs |= other[0]
+            lane = other[1] + lane
+        lanes.append((graphs, lane))
+    return [
+        sorted(lane, key=migrations.index) for graphs, lane in lanes
+    ]
+
+
+def handled_subjects(triples, handlers):
+    """ The subjects of `triples` that have an entry in `handlers`. """
+    subjects = []
+    for s, p, o in triples:
+        if s in handlers and s not in subjects:
+            subjects.append(s)
+    return subjects
+
+
+def handler_names(handlers, keys):
+    """ The names of the handlers in `handlers` for `keys`, in order. """
+    return list(filter(None, (handlers.get(key) for key in keys)))
@@ -0,0 +1,137 @@
+"""
+manage.py command for repairing latin-1 encoded strings in the triplestore.
+
+Strings that were decoded as latin-1 while they were UTF-8 (for example
+'Ã©' instead of 'é') are recoded with `rdf.utils.latin1_to_utf8`. The
+candidates are fetched page by page and every page is repaired with a
+single update, so the command scales to large graphs. Progress is
+logged to the 'rdf' logger, including the subject after which an
+interrupted run can be resumed with `--after`.
+"""
+
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import local
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from rdflib import Graph, URIRef
+from rdf.utils import (LATIN1_SINCE, get_batch_size, get_conjunctive_graph,
+                       latin1_pages, recode_latin1_batch, thread_store)
+
+logger = logging.getLogger('rdf')
+
+
+class Command(BaseCommand):
+    help = 'Repairs latin-1 encoded string literals in a named graph.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('graph', help='IRI of the named graph to repair.')
+        parser.add_argument(
+            '--source-graph',
+            help='Repair the selectors of the annotations in the graph '
+                 'whose source in this graph was created after --since, '
+                 'instead of the subjects of the graph itself.',
+        )
+        parser.add_argument(
+            '--since', default=LATIN1_SINCE,
+            help='Only repair subjects (or sources) created after this '
+                 'xsd:dateTime.',
+        )
+        parser.add_argument(
+            '--after', default='',
+            help='Skip the subjects up to and including this IRI, in order '
+                 'to resume an interrupted run.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Number of subjects per query and per update. Defaults to '
+                 'the RDF_BATCH_SIZE setting.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of updates to send concurrently.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Log the replacements without writing them.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = get_batch_size(options['batch_size'])
+        if batch_size < 1 or options['workers'] < 1:
+            raise CommandError(
+                'The batch size and the number of workers must be positive.')
+        store = get_conjunctive_graph().store
+        graph = Graph(store, identifier=URIRef(options['graph']))
+        source_graph = None
+        if options['source_graph']:
+            source_graph = Graph(
+                store, identifier=URIRef(options['source_graph']))
+        pages = latin1_pages(
+            graph, batch_size, options['after'], source_graph,
+            options['since'],
+        )
+        self.repair(graph, pages, options['workers'], options['dry_run'])
+
+    def repair(self, graph, pages, workers=1, dry_run=False):
+        """
+        Recode the triples in `pages` (see `rdf.utils.latin1_pages`).
+
+        Pages are fetched one after another, because every query starts
+        after the last subject of the previous page, while up to
+        `workers` updates run concurrently. Every worker sends its
+        updates through its own `rdf.utils.thread_store` copy of the
+        store, since concurrent updates through one SPARQLUpdateStore
+        can be lost. Whenever the oldest pending page is done, the
+        progress is logged together with the subject after which all
+        pages are done. Returns the numbers of candidate and of
+        replaced triples.
+        """
+        totals = {'candidates': 0, 'replaced': 0, 'subject': None}
+        start = perf_counter()
+        worker = local()
+
+        def recode(triples):
+            if not hasattr(worker, 'graph'):
+                worker.graph = Graph(
+                    thread_store(graph.store), identifier=graph.identifier)
+            return recode_latin1_batch(worker.graph, triples, not dry_run)
+
+        def finish(page):
+            subject, count, future = page
+            try:
+                replaced = future.result()
+            except Exception as error:
+                message = 'Repairing graph {} failed.'.format(graph.identifier)
+                if totals['subject'] is not None:
+                    message += ' Resume with --after {}.'.format(
+                        totals['subject'])
+                raise CommandError(message) from error
+            totals['candidates'] += count
+            totals['replaced'] += replaced
+            totals['subject'] = subject
+            logger.info(
+                '{} {} of {} candidate triples ({:.0f} triples/s), '
+                'done up to and including {}.'.format(
+                    'Would replace' if dry_run else 'Replaced',
+                    totals['replaced'], totals['candidates'],
+                    totals['candidates'] / (perf_counter() - start), subject,
+                ))
+
+        pending = deque()
+        with ThreadPoolExecutor(workers) as executor:
+            for subject, triples in pages:
+                pending.append(
+                    (subject, len(triples), executor.submit(recode, triples)))
+                # Keep one extra page queued while the next is fetched.
+                while pending and (
+                        len(pending) > workers or pending[0][2].done()):
+                    finish(pending.popleft())
+            while pending:
+                finish(pending.popleft())
+        logger.info('{} graph {} in {:.3f}s.'.format(
+            'Checked' if dry_run else 'Repaired', graph.identifier,
+            perf_counter() - start))
+        return totals['candidates'], totals['replaced']
@@ -116,7 +116,20 @@ class RDFMigration(metaclass=MetaRDFMigration):
     If you define an __init__ method, give it a (self, *args, **kwargs)
     signature in order to make it forward-compatible. Currently, no
     arguments are passed, but this might change in the future.
+
+    `rdfmigrate --jobs` runs migrations concurrently if they touch
+    different graphs. By default, a migration is assumed to touch only
+    the graph returned by .actual(). If the handlers modify other
+    graphs through `conjunctive`, list the identifiers of all touched
+    graphs in the `graphs` attribute.
     """
+    graphs = None
+
+    def touched_graphs(self):
+        """ Set of identifiers of the graphs that this migration modifies. """
+        if self.graphs is None:
+            return {self.actual().identifier}
+        return set(map(URIRef, self.graphs))
 
     def actual(self):
         raise NotImplementedError(MIGRATION_OVERRIDE_MESSAGE)
@@ -29,3 +29,16 @@ def test_RDFMigration():
     assert tester.remove_handlers == {
         URIRef('http://other-example.com/'): 'process_deletion',
     }
+
+
+def test_touched_graphs():
+    class GraphMigration(TestMigration):
+        def actual(self):
+            return Graph(identifier=URIRef('http://example.com/actual'))
+
+    tester = GraphMigration()
+    assert tester.touched_graphs() == {URIRef('http://example.com/actual')}
+    tester.graphs = ['http://example.com/a', 'http://example.com/b']
+    assert tester.touched_graphs() == {
+        URIRef('http://example.com/a'), URIRef('http://example.com/b'),
+    }
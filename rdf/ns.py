@@ -13,6 +13,7 @@ SCHEMA  = Namespace('http://schema.org/')
 HTTP    = Namespace('http://www.w3.org/2011/http#')
 HTTPSC  = Namespace('https://www.w3.org/2011/http-statusCodes#')
 HTTPM   = Namespace('https://www.w3.org/2011/http-methods#')
+HYDRA   = Namespace('http://www.w3.org/ns/hydra/core#')
 ISO6391 = Namespace('http://id.loc.gov/vocabulary/iso639-1/')
 OWL     = Namespace('http://www.w3.org/2002/07/owl#')
 
@@ -0,0 +1,141 @@
+"""
+Pagination of graphs and query results.
+
+Set `pagination_class = GraphPagination` (or a subclass) on an
+`RDFView` or a `SPARQLQueryAPIView` to serve large graphs in pages.
+Graphs are paged by subject: every page holds all triples of at most
+`page_size` subjects, in order of the subjects. Only IRI subjects are
+paged, because blank nodes cannot be looked up in a SPARQL store. A page also describes
+itself with Hydra terms and links to the first, previous and next
+pages, which are repeated in a Link header.
+"""
+
+from django.conf import settings
+from rdflib import Graph, URIRef
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .ns import HYDRA, RDF
+from .utils import (CONSTRUCT_SUBJECTS_QUERY, append_triples,
+                    construct_batched, is_sparql_graph)
+
+SUBJECT_PAGE_QUERY = '''
+SELECT DISTINCT ?s WHERE {{
+    ?s ?p ?o .
+    FILTER(isIRI(?s))
+}}
+ORDER BY ?s LIMIT {} OFFSET {}
+'''
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_MAX_PAGE_SIZE = 1000
+
+
+class GraphPagination:
+    """
+    Page number pagination for graphs and SELECT query results.
+
+    Clients choose a page with the `page` query parameter and may ask
+    for a smaller or larger page with `page_size`, up to
+    `max_page_size`. The defaults come from the RDF_PAGE_SIZE and
+    RDF_MAX_PAGE_SIZE settings.
+    """
+    page_size = None
+    max_page_size = None
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        default = self.page_size or getattr(
+            settings, 'RDF_PAGE_SIZE', DEFAULT_PAGE_SIZE
+        )
+        maximum = self.max_page_size or getattr(
+            settings, 'RDF_MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE
+        )
+        requested = request.query_params.get(self.page_size_query_param)
+        if requested and requested.isdigit() and int(requested) > 0:
+            return min(int(requested), maximum)
+        return min(default, maximum)
+
+    def get_page_number(self, request):
+        value = request.query_params.get(self.page_query_param, '1')
+        if not value.isdigit() or int(value) < 1:
+            raise NotFound('Invalid page.')
+        return int(value)
+
+    def get_bounds(self, request):
+        """
+        Return the limit and offset of the requested page.
+
+        The request is remembered for building the links.
+        """
+        self.request = request
+        self.page_number = self.get_page_number(request)
+        self.limit = self.get_page_size(request)
+        self.has_next = False
+        return self.limit, (self.page_number - 1) * self.limit
+
+    def paginate_graph(self, graph, request):
+        """ Return a Graph with the triples of the requested page. """
+        limit, offset = self.get_bounds(request)
+        subjects = self.page_subjects(graph, limit + 1, offset)
+        self.has_next = len(subjects) > limit
+        subjects = subjects[:limit]
+        if self.page_number > 1 and not subjects:
+            raise NotFound('Invalid page.')
+        if is_sparql_graph(graph):
+            page = construct_batched(graph, CONSTRUCT_SUBJECTS_QUERY, subjects)
+        else:
+            page = Graph()
+            for subject in subjects:
+                append_triples(page, graph.triples((subject, None, None)))
+        for prefix, namespace in graph.namespaces():
+            page.bind(prefix, namespace, override=False)
+        append_triples(page, self.page_triples())
+        return page
+
+    def page_subjects(self, graph, limit, offset):
+        """ At most `limit` IRI subjects of `graph` from `offset`, in order. """
+        if is_sparql_graph(graph):
+            return [row.s for row in graph.query(
+                SUBJECT_PAGE_QUERY.format(limit, offset)
+            )]
+        subjects = set(s for s in graph.subjects() if isinstance(s, URIRef))
+        return sorted(subjects)[offset:offset + limit]
+
+    def get_links(self):
+        """ Map link relations to the URLs of the neighbouring pages. """
+        url = self.request.build_absolute_uri()
+        links = {'first': remove_query_param(url, self.page_query_param)}
+        if self.page_number > 1:
+            links['prev'] = replace_query_param(
+                url, self.page_query_param, self.page_number - 1
+            )
+        if self.has_next:
+            links['next'] = replace_query_param(
+                url, self.page_query_param, self.page_number + 1
+            )
+        return links
+
+    def page_triples(self):
+        """ Hydra description of the current page. """
+        url = self.request.build_absolute_uri()
+        page = URIRef(url)
+        collection = URIRef(remove_query_param(url, self.page_query_param))
+        predicates = {
+            'first': HYDRA.first,
+            'prev': HYDRA.previous,
+            'next': HYDRA.next,
+        }
+        yield (collection, HYDRA.view, page)
+        yield (page, RDF.type, HYDRA.PartialCollectionView)
+        for rel, link in self.get_links().items():
+            yield (page, predicates[rel], URIRef(link))
+
+    def get_paginated_response(self, data):
+        links = ', '.join(
+            '<{}>; rel="{}"'.format(link, rel)
+            for rel, link in self.get_links().items()
+        )
+        return Response(data, headers={'Link': links})
@@ -1,6 +1,156 @@
+import codecs
+import re
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
 from rest_framework.parsers import BaseParser
 
-from rdflib import Graph
+from rdflib import ConjunctiveGraph, Graph
+from rdflib.plugins.parsers.notation3 import RDFSink, SinkParser
+from rdflib.plugins.parsers.nquads import NQuadsParser as RDFLibNQuadsParser
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from rdflib.plugins.stores.memory import Memory
+
+from .exceptions import RequestTooLarge, TooManyTriples
+from .utils import get_batch_size
+
+CHUNK_SIZE = 64 * 1024
+
+# Tokens that matter for finding the end of a Turtle statement. An
+# incomplete string, IRI or comment at the end of the input does not
+# match, nor does the start of a long string without its end.
+TURTLE_TOKEN = re.compile(
+    r'"""(?:[^"\\]|\\.|"(?!""))*"""'
+    r"|'''(?:[^'\\]|\\.|'(?!''))*'''"
+    r'|(?P<long>"""|\'\'\')'
+    r'|"(?:[^"\\\n\r]|\\.)*"'
+    r"|'(?:[^'\\\n\r]|\\.)*'"
+    r'|<[^<>"{}|^`\\\s]*>'
+    r'|#[^\n\r]*[\n\r]'
+    r'|(?P<open>[\[(])'
+    r'|(?P<close>[\])])'
+    r'|(?P<end>\.(?=[\s#]))'
+    r'|[^"\'<#\[\]().]+'
+    r'|\.'
+)
+
+
+def get_limit(value, setting):
+    """ Return `value`, or the setting by that name if None. """
+    if value is None:
+        return getattr(settings, setting, None)
+    return value
+
+
+def turtle_statements_end(text):
+    """ Index after the last complete top-level statement in `text`. """
+    depth = 0
+    end = 0
+    position = 0
+    while position < len(text):
+        match = TURTLE_TOKEN.match(text, position)
+        if match is None or match.group('long'):
+            break
+        if match.group('open'):
+            depth += 1
+        elif match.group('close'):
+            depth -= 1
+        elif match.group('end') and depth == 0:
+            end = match.end()
+        position = match.end()
+    return end
+
+
+class LimitedStream:
+    """ File-like wrapper that raises RequestTooLarge after `limit` bytes. """
+
+    def __init__(self, stream, limit=None):
+        self.stream = stream
+        self.limit = limit
+        self.consumed = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(CHUNK_SIZE), b''))
+        data = self.stream.read(size)
+        self.consumed += len(data)
+        if self.limit is not None and self.consumed > self.limit:
+            raise RequestTooLarge()
+        return data
+
+
+class LimitedMemory(Memory):
+    """ Memory store that raises TooManyTriples after `max_triples` adds. """
+
+    def __init__(self, max_triples=None):
+        super().__init__()
+        self.max_triples = max_triples
+        self.added = 0
+
+    def add(self, triple, context, quoted=False):
+        self.added += 1
+        if self.max_triples is not None and self.added > self.max_triples:
+            raise TooManyTriples()
+        super().add(triple, context, quoted)
+
+
+class StatementBatcher:
+    """
+    Collect parsed statements and pass them on in batches.
+
+    `emit` is called with lists of at most `batch_size` statements.
+    Raises TooManyTriples as soon as more than `max_triples` statements
+    have been added.
+    """
+
+    def __init__(self, emit, batch_size, max_triples=None):
+        self.emit = emit
+        self.batch_size = batch_size
+        self.max_triples = max_triples
+        self.count = 0
+        self.batch = []
+
+    def add(self, statement):
+        self.count += 1
+        if self.max_triples is not None and self.count > self.max_triples:
+            raise TooManyTriples()
+        self.batch.append(statement)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.emit(self.batch)
+            self.batch = []
+
+    # Interface of the sink of W3CNTriplesParser.
+    def triple(self, subject, predicate, object):
+        self.add((subject, predicate, object))
+
+
+class QuadContext:
+    """ Stand-in for a context of the sink of the N-Quads parser. """
+
+    def __init__(self, batcher, identifier):
+        self.batcher = batcher
+        self.identifier = identifier
+
+    def add(self, triple):
+        self.batcher.add(triple + (self.identifier,))
+
+
+class QuadSink:
+    """ Stand-in for the ConjunctiveGraph sink of the N-Quads parser. """
+    identifier = None
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.contexts = {}
+
+    def get_context(self, identifier):
+        if identifier not in self.contexts:
+            self.contexts[identifier] = QuadContext(self.batcher, identifier)
+        return self.contexts[identifier]
 
 
 class RDFLibParser(BaseParser):
@@ -18,15 +168,176 @@ class RDFLibParser(BaseParser):
     and which should list all named arguments to Graph.parse. At the
     very least, this should include the `format` parameter, which
     determines the serialization format.
+
+    Requests with a body of more than `max_body_size` bytes, or with
+    more than `max_triples` statements, are rejected with status 413.
+    The limits default to the RDF_MAX_BODY_SIZE and RDF_MAX_TRIPLES
+    settings; None means no limit.
     """
+    max_body_size = None
+    max_triples = None
+
     def parse(self, stream, media_type=None, parser_context=None):
-        graph = Graph()
+        stream = self.limited_stream(stream, parser_context or {})
+        store = LimitedMemory(self.get_max_triples())
+        graph = Graph(store)
         graph.parse(data=stream.read(), **self.rdflib_args)
+        # Only limit the parser, not what the view does with the graph.
+        store.max_triples = None
+        return graph
+
+    def get_max_body_size(self):
+        return get_limit(self.max_body_size, 'RDF_MAX_BODY_SIZE')
+
+    def get_max_triples(self):
+        return get_limit(self.max_triples, 'RDF_MAX_TRIPLES')
+
+    def limited_stream(self, stream, parser_context):
+        """ Wrap `stream` so that it cannot be read beyond the size limit. """
+        limit = self.get_max_body_size()
+        request = parser_context.get('request')
+        if limit is not None and request is not None:
+            # Fail early if the client announces a body that is too large.
+            length = request.META.get('CONTENT_LENGTH')
+            if length and length.isdigit() and int(length) > limit:
+                raise RequestTooLarge()
+        return LimitedStream(stream, limit)
+
+
+class StreamingRDFParser(RDFLibParser):
+    """
+    Base class for parsers that do not hold the request body in memory.
+
+    By default, the statements are collected in a Graph (a
+    ConjunctiveGraph for formats with named graphs), which becomes
+    `request.data`. A view can instead pass a callable `sink` in the
+    parser context, for example in order to insert the statements in
+    a store directly:
+
+        def get_parser_context(self, http_request):
+            context = super().get_parser_context(http_request)
+            context['sink'] = lambda triples: append_triples(self.graph(), triples)
+            return context
+
+    The sink is called with lists of at most `batch_size` statements
+    (default: the RDF_BATCH_SIZE setting, or 1000) while the body is
+    being parsed. `request.data` is then the number of statements.
+    Subclasses implement `parse_statements`.
+    """
+    batch_size = None
+    graph_class = Graph
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        stream = self.limited_stream(stream, parser_context)
+        sink = parser_context.get('sink')
+        if sink is None:
+            graph = self.graph_class()
+            sink = lambda statements: self.collect(graph, statements)
+        else:
+            graph = None
+        batcher = StatementBatcher(
+            sink, get_batch_size(self.batch_size), self.get_max_triples()
+        )
+        base = self.get_base_uri(parser_context)
+        try:
+            namespaces = self.parse_statements(stream, batcher, base)
+        except (RequestTooLarge, TooManyTriples):
+            raise
+        except Exception as error:
+            raise ParseError('Parse error: {}'.format(error))
+        batcher.flush()
+        if graph is None:
+            return batcher.count
+        for prefix, namespace in namespaces.items():
+            graph.bind(prefix, namespace)
         return graph
 
+    def collect(self, graph, statements):
+        for statement in statements:
+            graph.add(statement)
+
+    def get_base_uri(self, parser_context):
+        """
+        Base IRI of the body: the request URI, or RDF_NAMESPACE_ROOT.
+        """
+        request = parser_context.get('request')
+        if request is not None:
+            return request.build_absolute_uri()
+        return getattr(settings, 'RDF_NAMESPACE_ROOT', None)
+
+    def parse_statements(self, stream, batcher, base=None):
+        """
+        Read statements from the binary `stream` into `batcher`.
+
+        Relative IRIs are resolved against `base`. Returns a dictionary
+        with the namespace prefixes of the input.
+        """
+        raise NotImplementedError
+
 
 class JSONLDParser(RDFLibParser):
     media_type = 'application/ld+json'
     rdflib_args = {
         'format': 'json-ld',
     }
+
+
+class NTriplesParser(StreamingRDFParser):
+    media_type = 'application/n-triples'
+
+    def parse_statements(self, stream, batcher, base=None):
+        W3CNTriplesParser(sink=batcher).parse(stream)
+        return {}
+
+
+class NQuadsParser(StreamingRDFParser):
+    """ Parse N-Quads; the statements are quads (s, p, o, graph). """
+    media_type = 'application/n-quads'
+    graph_class = ConjunctiveGraph
+
+    def collect(self, graph, statements):
+        default = graph.default_context.identifier
+        for subject, predicate, object, context in statements:
+            if context is None:
+                context = default
+            graph.get_context(context).add((subject, predicate, object))
+
+    def parse_statements(self, stream, batcher, base=None):
+        parser = RDFLibNQuadsParser()
+        parser.sink = QuadSink(batcher)
+        parser.file = codecs.getreader('utf-8')(stream)
+        parser.buffer = ''
+        while True:
+            parser.line = parser.readline()
+            if parser.line is None:
+                return {}
+            parser.parseline()
+
+
+class TurtleParser(StreamingRDFParser):
+    """
+    Parse Turtle, feeding complete statements to rdflib's parser.
+
+    The body is read in chunks. Each time, the text up to the last
+    complete top-level statement is parsed, and the rest is kept until
+    the next chunk has been read.
+    """
+    media_type = 'text/turtle'
+
+    def parse_statements(self, stream, batcher, base=None):
+        parser = SinkParser(RDFSink(batcher), baseURI=base, turtle=True)
+        parser.startDoc()
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        text = ''
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            text += decoder.decode(chunk, final=not chunk)
+            end = turtle_statements_end(text) if chunk else len(text)
+            if end:
+                parser.feed(text[:end])
+                text = text[end:]
+            if not chunk:
+                break
+        parser.endDoc()
+        return parser._bindings
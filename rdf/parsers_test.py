@@ -1,9 +1,17 @@
 from io import BytesIO
+from itertools import chain
 
-from rdflib import Graph
+import pytest
+from rdflib import Graph, URIRef
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIRequestFactory
 
-from .parsers import JSONLDParser
+from . import parsers
+from .exceptions import RequestTooLarge, TooManyTriples
+from .parsers import (JSONLDParser, NQuadsParser, NTriplesParser,
+                      TurtleParser, turtle_statements_end)
 from .ns import *
+from .utils import graph_from_triples
 
 
 def test_rdflibparser(filled_graph):
@@ -11,3 +19,99 @@ def test_rdflibparser(filled_graph):
     serialized = filled_graph.serialize(format='json-ld').encode()
     parsed = parser.parse(BytesIO(serialized))
     assert len(parsed ^ filled_graph) == 0
+
+
+def parse_with(parser, data, **parser_context):
+    return parser.parse(BytesIO(data), parser_context=parser_context)
+
+
+@pytest.mark.parametrize('parser,format', [
+    (NTriplesParser, 'nt'),
+    (TurtleParser, 'turtle'),
+])
+def test_streaming_parsers(filled_graph, parser, format, monkeypatch):
+    serialized = filled_graph.serialize(format=format, encoding='utf-8')
+    # Make chunks end in the middle of statements, strings and IRIs.
+    monkeypatch.setattr(parsers, 'CHUNK_SIZE', 7)
+    parsed = parse_with(parser(), serialized)
+    assert len(parsed ^ filled_graph) == 0
+    batches = []
+    instance = parser()
+    instance.batch_size = 2
+    count = parse_with(instance, serialized, sink=batches.append)
+    assert count == len(filled_graph)
+    assert all(len(batch) <= 2 for batch in batches)
+    assert len(graph_from_triples(chain(*batches)) ^ filled_graph) == 0
+
+
+def test_nquads_parser():
+    quads = (
+        '<http://x/s> <http://x/p> "a" <http://x/g> .\n'
+        '<http://x/s> <http://x/p> "b" .\n'
+    ).encode()
+    parsed = parse_with(NQuadsParser(), quads)
+    assert len(parsed.get_context(URIRef('http://x/g'))) == 1
+    assert len(parsed.default_context) == 1
+    assert len(list(parsed.contexts())) == 2
+    assert len(parsed) == 2
+    batches = []
+    parse_with(NQuadsParser(), quads, sink=batches.append)
+    assert [quad[3] for quad in batches[0]] == [URIRef('http://x/g'), None]
+
+
+def test_turtle_statements_end():
+    text = '''@prefix ex: <http://x/> .
+ex:a ex:p "dot. inside", 1.5 ; ex:q [ ex:r ex:b. ] .
+ex:c ex:p """long .
+string""" .  # comment .
+ex:d ex:p "unterminated .'''
+    end = turtle_statements_end(text)
+    assert text[:end].endswith('string""" .')
+    assert turtle_statements_end('ex:a ex:p 1.') == 0
+    assert turtle_statements_end('ex:a ex:p <http://x/a. b') == 0
+
+
+def test_limits(filled_graph):
+    serialized = filled_graph.serialize(format='nt', encoding='utf-8')
+    parser = NTriplesParser()
+    parser.max_triples = len(filled_graph) - 1
+    with pytest.raises(TooManyTriples):
+        parse_with(parser, serialized)
+    parser = NTriplesParser()
+    parser.max_body_size = len(serialized) - 1
+    with pytest.raises(RequestTooLarge):
+        parse_with(parser, serialized)
+    parser.max_body_size = len(serialized)
+    assert len(parse_with(parser, serialized)) == len(filled_graph)
+
+    jsonld = filled_graph.serialize(format='json-ld').encode()
+    parser = JSONLDParser()
+    parser.max_triples = len(filled_graph) - 1
+    with pytest.raises(TooManyTriples):
+        parse_with(parser, jsonld)
+    parser = JSONLDParser()
+    parser.max_body_size = len(jsonld) - 1
+    with pytest.raises(RequestTooLarge):
+        parse_with(parser, jsonld)
+
+
+def test_limit_settings(settings):
+    settings.RDF_MAX_BODY_SIZE = 10
+    with pytest.raises(RequestTooLarge):
+        parse_with(TurtleParser(), b'<http://x/s> <http://x/p> <http://x/o> .')
+
+
+def test_parse_error():
+    with pytest.raises(ParseError):
+        parse_with(TurtleParser(), b'<http://x/s> <http://x/p> .')
+
+
+def test_turtle_base():
+    turtle = b'@base <http://x/a/> .\n<s> <p> <../o> .\n'
+    parsed = parse_with(TurtleParser(), turtle)
+    assert set(parsed) == {
+        (URIRef('http://x/a/s'), URIRef('http://x/a/p'), URIRef('http://x/o')),
+    }
+    request = APIRequestFactory().post('/items/')
+    parsed = parse_with(TurtleParser(), b'<s> <p> <o> .', request=request)
+    assert URIRef('http://testserver/items/s') in set(parsed.subjects())
@@ -1,4 +1,23 @@
+from itertools import groupby
+from xml.sax.saxutils import escape, quoteattr
+
 from rest_framework.renderers import BaseRenderer
+from rdflib import BNode, ConjunctiveGraph, Literal, URIRef
+from rdflib.namespace import split_uri
+from rdflib.plugins.serializers.nquads import _nq_row
+from rdflib.plugins.serializers.nt import _nt_row
+from rdflib.query import Result
+
+from .ns import RDF
+from .utils import triple_pages
+from .xml import XMLSanitizer
+
+
+def as_graph(data):
+    """ Return the graph of a CONSTRUCT/DESCRIBE query result, or `data` itself. """
+    if isinstance(data, Result):
+        return data.graph
+    return data
 
 
 class RDFLibRenderer(BaseRenderer):
@@ -19,11 +38,25 @@ class RDFLibRenderer(BaseRenderer):
     be a dictionary and which should list all named arguments to
     Graph.serialize. At the very least, this should include the
     `format` parameter, which determines the serialization format.
+
+    Views that enable streaming (see `rdf.views.StreamingMixin`) call
+    `render_stream` instead of `render`. By default, this yields the
+    complete serialization as a single chunk; subclasses for formats
+    that can be written incrementally override it in order to yield
+    chunks of at most `chunk_size` triples.
     """
+    chunk_size = 1000
 
     def render(self, graph, media_type=None, renderer_context=None):
         return graph.serialize(**self.rdflib_args)
 
+    def render_stream(self, graph, media_type=None, renderer_context=None):
+        """ Generate the serialization of `graph` as a sequence of bytes. """
+        output = self.render(graph, media_type, renderer_context)
+        if isinstance(output, str):
+            output = output.encode(self.charset or 'utf-8')
+        yield output
+
 
 class TurtleRenderer(RDFLibRenderer):
     media_type = 'text/turtle'
@@ -32,6 +65,53 @@ class TurtleRenderer(RDFLibRenderer):
         'format': 'turtle',
     }
 
+    def render_stream(self, graph, media_type=None, renderer_context=None):
+        """
+        Write Turtle one page of subjects at a time.
+
+        All prefixes bound in the graph are declared up front. Each
+        subject is written as a single statement with predicate and
+        object lists. Nested blank nodes and collections are not
+        inlined, so the output is less compact than that of `render`.
+        """
+        graph = as_graph(graph)
+        nsm = graph.namespace_manager
+        yield ''.join(
+            '@prefix {}: <{}> .\n'.format(prefix, namespace)
+            for prefix, namespace in graph.namespaces()
+        ).encode() + b'\n'
+        for page in triple_pages(graph, self.chunk_size):
+            statements = []
+            for subject, triples in groupby(page, lambda t: t[0]):
+                statements.append(turtle_statement(subject, triples, nsm))
+            yield ''.join(statements).encode()
+
+
+def turtle_term(term, nsm):
+    """ Turtle notation of `term`, abbreviated with the prefixes in `nsm`. """
+    if isinstance(term, URIRef):
+        qname = nsm.normalizeUri(term)
+        # A prefixed name must not end with a dot.
+        return term.n3() if qname.endswith('.') else qname
+    if isinstance(term, Literal):
+        return term.n3(nsm)
+    return term.n3()
+
+
+def turtle_statement(subject, triples, nsm):
+    """ Turtle statement for a sequence of `triples` that share `subject`. """
+    predicates = []
+    for predicate, pairs in groupby(triples, lambda t: t[1]):
+        objects = ' , '.join(turtle_term(t[2], nsm) for t in pairs)
+        if predicate == RDF.type:
+            verb = 'a'
+        else:
+            verb = turtle_term(predicate, nsm)
+        predicates.append('{} {}'.format(verb, objects))
+    return '{} {} .\n'.format(
+        turtle_term(subject, nsm), ' ;\n    '.join(predicates)
+    )
+
 
 class RdfXMLRenderer(RDFLibRenderer):
     media_type = 'application/rdf+xml'
@@ -40,6 +120,79 @@ class RdfXMLRenderer(RDFLibRenderer):
         'format': 'xml',
     }
 
+    def render(self, graph, media_type=None, renderer_context=None):
+        return b''.join(self.render_stream(graph, media_type, renderer_context))
+
+    def render_stream(self, graph, media_type=None, renderer_context=None):
+        """
+        Write RDF/XML one page of subjects at a time.
+
+        The prefixes bound in the graph are declared on the root
+        element; a predicate in another namespace declares it on its
+        own element. Characters that XML does not allow are replaced
+        by spaces in string literals (see `rdf.xml.XMLSanitizer`).
+        """
+        graph = as_graph(graph)
+        prefixes = {
+            str(namespace): prefix for prefix, namespace in graph.namespaces()
+            if prefix and prefix not in ('rdf', 'xml')
+        }
+        prefixes[str(RDF)] = 'rdf'
+        yield '<?xml version="1.0" encoding="utf-8"?>\n<rdf:RDF{}>\n'.format(
+            ''.join(
+                '\n   xmlns:{}={}'.format(prefix, quoteattr(namespace))
+                for namespace, prefix in prefixes.items()
+            )
+        ).encode()
+        sanitizer = XMLSanitizer()
+        for page in triple_pages(graph, self.chunk_size):
+            yield ''.join(
+                rdfxml_description(subject, triples, prefixes, sanitizer)
+                for subject, triples in groupby(page, lambda t: t[0])
+            ).encode()
+        yield b'</rdf:RDF>\n'
+
+
+def rdfxml_node(attribute, term):
+    """ RDF/XML attribute that refers to resource `term`. """
+    if isinstance(term, BNode):
+        return ' rdf:nodeID={}'.format(quoteattr(term))
+    return ' rdf:{}={}'.format(attribute, quoteattr(term))
+
+
+def rdfxml_property(predicate, object, prefixes, sanitizer):
+    """ RDF/XML property element for `predicate` and `object`. """
+    namespace, name = split_uri(predicate)
+    prefix = prefixes.get(namespace)
+    if prefix is None:
+        tag = 'ns:{}'.format(name)
+        attributes = ' xmlns:ns={}'.format(quoteattr(namespace))
+    else:
+        tag = '{}:{}'.format(prefix, name)
+        attributes = ''
+    if not isinstance(object, Literal):
+        return '    <{}{}{}/>\n'.format(
+            tag, attributes, rdfxml_node('resource', object)
+        )
+    if object.language:
+        attributes += ' xml:lang={}'.format(quoteattr(object.language))
+    elif object.datatype:
+        attributes += ' rdf:datatype={}'.format(quoteattr(object.datatype))
+    return '    <{0}{1}>{2}</{0}>\n'.format(
+        tag, attributes, escape(sanitizer.clean_literal(object))
+    )
+
+
+def rdfxml_description(subject, triples, prefixes, sanitizer):
+    """ RDF/XML description of `subject` with the given `triples`. """
+    return '  <rdf:Description{}>\n{}  </rdf:Description>\n'.format(
+        rdfxml_node('about', subject),
+        ''.join(
+            rdfxml_property(predicate, object, prefixes, sanitizer)
+            for _, predicate, object in triples
+        ),
+    )
+
 
 class JsonLdRenderer(RDFLibRenderer):
     media_type = 'application/ld+json'
@@ -56,3 +209,37 @@ class NTriplesRenderer(RDFLibRenderer):
         'format': 'nt',
         'encoding': 'ascii'  # N-triples are always ascii encoded
     }
+
+    def render_stream(self, graph, media_type=None, renderer_context=None):
+        graph = as_graph(graph)
+        for page in triple_pages(graph, self.chunk_size):
+            yield ''.join(map(_nt_row, page)).encode()
+
+
+class NQuadsRenderer(RDFLibRenderer):
+    media_type = 'application/n-quads'
+    format = 'nq'
+    rdflib_args = {
+        'format': 'nquads',
+    }
+
+    def render(self, graph, media_type=None, renderer_context=None):
+        return b''.join(self.render_stream(graph, media_type, renderer_context))
+
+    def render_stream(self, graph, media_type=None, renderer_context=None):
+        """
+        Write N-Quads one page of one named graph at a time.
+
+        Triples of a graph that is not context-aware are written with
+        the identifier of that graph as their context.
+        """
+        graph = as_graph(graph)
+        if isinstance(graph, ConjunctiveGraph):
+            contexts = graph.contexts()
+        else:
+            contexts = (graph,)
+        for context in contexts:
+            for page in triple_pages(context, self.chunk_size):
+                yield ''.join(
+                    _nq_row(triple, context.identifier) for triple in page
+                ).encode()
@@ -1,6 +1,9 @@
-from rdflib import Graph
+from rdflib import BNode, ConjunctiveGraph, Graph, Literal, URIRef
 
-from .renderers import TurtleRenderer
+from .renderers import (NQuadsRenderer, NTriplesRenderer, RdfXMLRenderer,
+                        TurtleRenderer)
+from .conftest import ITEM
+from .utils import append_triples
 from .ns import *
 
 
@@ -10,3 +13,85 @@ def test_rdflibrenderer(filled_graph):
     parsed = Graph()
     parsed.parse(data=serialization, format='turtle')
     assert len(parsed ^ filled_graph) == 0
+
+
+def test_turtle_stream(filled_graph):
+    renderer = TurtleRenderer()
+    renderer.chunk_size = 3
+    chunks = list(renderer.render_stream(filled_graph))
+    assert len(chunks) > 3
+    parsed = Graph().parse(data=b''.join(chunks), format='turtle')
+    assert len(parsed ^ filled_graph) == 0
+
+
+def test_turtle_stream_sparql(local_store, filled_graph):
+    remote_graph = Graph(local_store, identifier=RDFS.Class)
+    append_triples(remote_graph, filled_graph)
+    renderer = TurtleRenderer()
+    renderer.chunk_size = 4
+    serialization = b''.join(renderer.render_stream(remote_graph))
+    parsed = Graph().parse(data=serialization, format='turtle')
+    assert len(parsed ^ filled_graph) == 0
+    # One page query per four triples, plus the final (partial) page
+    # and the page of blank node subjects.
+    assert local_store._queries == len(filled_graph) // 4 + 2
+
+
+def test_ntriples_stream(filled_graph):
+    renderer = NTriplesRenderer()
+    renderer.chunk_size = 4
+    serialization = b''.join(renderer.render_stream(filled_graph))
+    parsed = Graph().parse(data=serialization, format='nt')
+    assert len(parsed ^ filled_graph) == 0
+
+
+def test_nquads_stream(filled_conjunctive_graph):
+    renderer = NQuadsRenderer()
+    serialization = renderer.render(filled_conjunctive_graph)
+    parsed = ConjunctiveGraph()
+    parsed.parse(data=serialization, format='nquads')
+    assert len(parsed) == len(filled_conjunctive_graph)
+    assert set(parsed.quads()) and all(
+        (s, p, o) in filled_conjunctive_graph for s, p, o, c in parsed.quads()
+    )
+
+
+def test_nquads_stream_sparql(local_store, items):
+    remote = Graph(local_store, identifier=ITEM['graph'])
+    append_triples(remote, items)
+    local_store.reset_log()
+    renderer = NQuadsRenderer()
+    renderer.chunk_size = 4
+    chunks = list(renderer.render_stream(ConjunctiveGraph(local_store)))
+    parsed = ConjunctiveGraph()
+    parsed.parse(data=b''.join(chunks), format='nquads')
+    assert set(parsed.get_context(ITEM['graph'])) == set(items)
+    # Every named graph is queried one page at a time.
+    assert len(chunks) == len(items) // 4 + 1
+    pages = [query for query in local_store.query_log if 'LIMIT' in query]
+    assert pages and all('LIMIT 4' in query for query in pages)
+
+
+def test_rdfxml_stream(filled_graph, local_store):
+    renderer = RdfXMLRenderer()
+    renderer.chunk_size = 4
+    graph = Graph()
+    for triple in filled_graph:
+        graph.add(triple)
+    extra = (
+        (RDF.type, URIRef('http://example.com/other#note'), Literal('bell\x07')),
+        (BNode('b1'), RDFS.label, Literal('blank', lang='en')),
+        (BNode('b1'), RDFS.seeAlso, BNode('b2')),
+        (RDF.type, RDFS.comment, Literal('1', datatype=XSD.integer)),
+    )
+    append_triples(graph, extra)
+    chunks = list(renderer.render_stream(graph))
+    assert len(chunks) > 3
+    parsed = Graph().parse(data=b''.join(chunks), format='xml')
+    assert len(parsed) == len(graph)
+    assert (RDF.type, URIRef('http://example.com/other#note'), Literal('bell ')) in parsed
+    assert (RDF.type, RDFS.comment, Literal('1', datatype=XSD.integer)) in parsed
+    remote = Graph(local_store, identifier=RDFS.Class)
+    append_triples(remote, filled_graph)
+    parsed = Graph().parse(data=renderer.render(remote), format='xml')
+    assert len(parsed ^ filled_graph) == 0
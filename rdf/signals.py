@@ -0,0 +1,13 @@
+"""
+Signals sent by the rdf app.
+
+`graph_changed` is sent after triples were written to a graph through
+`rdf.utils` or a SPARQL update view. Its `identifier` argument is the
+identifier of the graph that changed, or None if the write went
+through a conjunctive graph and any graph in the store may have
+changed. Receivers can use it to invalidate caches.
+"""
+
+from django.dispatch import Signal
+
+graph_changed = Signal()
@@ -0,0 +1,144 @@
+"""
+Compact, read-only rdflib store for static graphs.
+
+rdflib's Memory store keeps several dictionaries of sets per triple,
+which costs hundreds of bytes per triple. `FrozenStore` interns every
+term to an integer and keeps the triples in three sorted orders (SPO,
+POS and OSP), each as three `array` columns of term ids. Triple
+patterns are answered with binary search on the columns. Use
+`freeze_graph` to make a frozen copy of a graph, for example an
+ontology that an `RDFView` serves:
+
+    ontology = freeze_graph(load_ontology())
+
+    class OntologyView(RDFView):
+        def graph(self):
+            return ontology
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+from rdflib import Graph
+from rdflib.graph import ModificationException
+from rdflib.store import Store
+
+# For each combination of bound positions in a (s, p, o) pattern, the
+# index whose leading columns are exactly those positions.
+INDEXES = {
+    (): 'spo',
+    (0,): 'spo',
+    (0, 1): 'spo',
+    (0, 1, 2): 'spo',
+    (1,): 'pos',
+    (1, 2): 'pos',
+    (2,): 'osp',
+    (0, 2): 'osp',
+}
+POSITIONS = {'spo': (0, 1, 2), 'pos': (1, 2, 0), 'osp': (2, 0, 1)}
+
+
+def id_array(values, size):
+    """ Array of the integers in `values`, using the smallest fitting type. """
+    return array('I' if size < 2 ** 32 else 'Q', values)
+
+
+class FrozenStore(Store):
+    """
+    Read-only store with the triples of `graph`, indexed by term ids.
+
+    Adding or removing triples raises ModificationException. Namespace
+    bindings can still be changed, since they are not part of the data.
+    """
+
+    def __init__(self, graph):
+        super().__init__()
+        self.terms = []
+        self.ids = {}
+        rows = [tuple(map(self.intern, triple)) for triple in graph]
+        self.size = len(rows)
+        self.indexes = {}
+        for name, positions in POSITIONS.items():
+            rows.sort(key=itemgetter(*positions))
+            self.indexes[name] = tuple(
+                id_array((row[position] for row in rows), len(self.terms))
+                for position in positions
+            )
+        self.__namespace = {}
+        self.__prefix = {}
+        for prefix, namespace in graph.namespaces():
+            self.bind(prefix, namespace)
+
+    def intern(self, term):
+        """ The id of `term`, assigning a new one if it has none yet. """
+        id = self.ids.get(term)
+        if id is None:
+            id = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return id
+
+    def lookup(self, pattern):
+        """ Return the index name and row range matching `pattern`. """
+        bound = tuple(i for i, term in enumerate(pattern) if term is not None)
+        name = INDEXES[bound]
+        columns = self.indexes[name]
+        low, high = 0, self.size
+        for column, position in zip(columns, POSITIONS[name]):
+            if pattern[position] is None:
+                break
+            id = self.ids.get(pattern[position])
+            if id is None:
+                return name, 0, 0
+            low = bisect_left(column, id, low, high)
+            high = bisect_right(column, id, low, high)
+        return name, low, high
+
+    def triples(self, triple_pattern, context=None):
+        name, low, high = self.lookup(triple_pattern)
+        columns = self.indexes[name]
+        order = POSITIONS[name]
+        terms = self.terms
+        for row in range(low, high):
+            triple = [None, None, None]
+            for column, position in zip(columns, order):
+                triple[position] = terms[column[row]]
+            yield tuple(triple), iter(())
+
+    def __len__(self, context=None):
+        return self.size
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def add(self, triple, context, quoted=False):
+        raise ModificationException()
+
+    def addN(self, quads):
+        raise ModificationException()
+
+    def remove(self, triple, context=None):
+        raise ModificationException()
+
+    def bind(self, prefix, namespace, override=True):
+        bound = self.__namespace.get(prefix)
+        if bound is not None and not override:
+            return
+        if bound is not None:
+            del self.__prefix[bound]
+        self.__prefix[namespace] = prefix
+        self.__namespace[prefix] = namespace
+
+    def namespace(self, prefix):
+        return self.__namespace.get(prefix)
+
+    def prefix(self, namespace):
+        return self.__prefix.get(namespace)
+
+    def namespaces(self):
+        yield from self.__namespace.items()
+
+
+def freeze_graph(graph):
+    """ Read-only copy of `graph` in a FrozenStore, with the same identifier. """
+    return Graph(FrozenStore(graph), identifier=graph.identifier)
@@ -0,0 +1,37 @@
+from itertools import product
+
+import pytest
+from rdflib import Graph, Literal, URIRef
+from rdflib.graph import ModificationException
+
+from .ns import RDF, RDFS
+from .store import freeze_graph
+
+
+def test_patterns(filled_graph):
+    frozen = freeze_graph(filled_graph)
+    assert len(frozen) == len(filled_graph)
+    assert frozen.identifier == filled_graph.identifier
+    missing = URIRef('http://example.com/missing')
+    for triple in list(filled_graph)[:5] + [(missing, RDF.type, missing)]:
+        for mask in product((False, True), repeat=3):
+            pattern = tuple(term if keep else None for term, keep in zip(triple, mask))
+            assert set(frozen.triples(pattern)) == set(filled_graph.triples(pattern))
+
+
+def test_read_only(filled_graph):
+    filled_graph.bind('rdfs', RDFS)
+    frozen = freeze_graph(filled_graph)
+    assert frozen.namespace_manager.store.namespace('rdfs') == URIRef(RDFS)
+    with pytest.raises(ModificationException):
+        frozen.add((RDFS.label, RDFS.label, Literal('label')))
+    with pytest.raises(ModificationException):
+        frozen.remove((None, None, None))
+
+
+def test_query(filled_graph):
+    frozen = freeze_graph(filled_graph)
+    query = 'SELECT ?s WHERE { ?s a ?type } ORDER BY ?s'
+    assert list(frozen.query(query)) == list(filled_graph.query(query))
+    parsed = Graph().parse(data=frozen.serialize(format='turtle'), format='turtle')
+    assert parsed.isomorphic(filled_graph)
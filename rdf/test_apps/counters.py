@@ -0,0 +1,16 @@
+"""
+`BaseCounter` subclass for tests, see the `counter_table` fixture.
+
+The model is not part of an installed app, so the fixture creates and
+drops its table around each test.
+"""
+
+from rdf.baseclasses import BaseCounter
+
+
+class ThingCounter(BaseCounter):
+    class Meta:
+        app_label = 'rdf'
+
+    namespace = 'http://example.com/thing/'
+    block_size = 10
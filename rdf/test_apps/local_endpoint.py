@@ -0,0 +1,100 @@
+"""
+In-process SPARQL endpoint served over HTTP.
+
+`LocalSPARQLEndpoint` answers SPARQL 1.1 protocol requests by evaluating
+them with rdflib against an in-memory ConjunctiveGraph. Unlike
+`LocalSPARQLStore`, requests really go over a socket, so it can be used
+to test HTTP clients such as the ones in `rdf.connection`. Every
+request is logged together with the client address. For testing error
+handling, `statuses` holds status codes that the next requests fail
+with, `drop` makes the server close each connection after responding
+and `delay` is slept before each response.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep
+from urllib.parse import parse_qs, urlsplit
+
+from rdflib import ConjunctiveGraph, URIRef
+
+
+class LocalSPARQLHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.respond(b'')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.respond(self.rfile.read(length))
+
+    def respond(self, body):
+        endpoint = self.server.endpoint
+        endpoint.log.append((self.command, self.path, self.headers, body))
+        endpoint.clients.add(self.client_address)
+        drop = endpoint.drop
+        if endpoint.delay:
+            sleep(endpoint.delay)
+        if endpoint.statuses:
+            status, content_type, content = endpoint.statuses.pop(0), 'text/plain', b'error'
+        else:
+            try:
+                status = 200
+                content_type, content = self.evaluate(body)
+            except Exception as error:
+                status, content_type, content = 400, 'text/plain', str(error).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        # Close without announcing it, like a server whose keep-alive
+        # timeout expired.
+        self.close_connection = drop
+
+    def evaluate(self, body):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        content_type = self.headers.get('Content-Type', '').split(';')[0]
+        if content_type == 'application/x-www-form-urlencoded':
+            params.update(parse_qs(body.decode()))
+        dataset = self.server.endpoint.dataset
+        if content_type == 'application/sparql-update':
+            dataset.update(body.decode())
+            return 'text/plain', b''
+        if content_type == 'application/sparql-query':
+            query = body.decode()
+        else:
+            query = params['query'][0]
+        target = dataset
+        if 'default-graph-uri' in params:
+            target = dataset.get_context(URIRef(params['default-graph-uri'][0]))
+        result = target.query(query)
+        if result.type in ('CONSTRUCT', 'DESCRIBE'):
+            return 'application/rdf+xml', result.graph.serialize(format='xml', encoding='utf-8')
+        return 'application/sparql-results+xml', result.serialize(format='xml')
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalSPARQLEndpoint:
+    def __init__(self):
+        self.dataset = ConjunctiveGraph()
+        self.log = []
+        self.clients = set()
+        self.statuses = []
+        self.drop = False
+        self.delay = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), LocalSPARQLHandler)
+        self.server.daemon_threads = True
+        self.server.endpoint = self
+        self.url = 'http://127.0.0.1:{}/sparql'.format(self.server.server_port)
+
+    def start(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,58 @@
+"""
+In-process stand-in for a remote SPARQL endpoint.
+
+`LocalSPARQLStore` behaves like the `SPARQLUpdateStore` that we
+configure as `settings.RDFLIB_STORE`, except that queries and updates
+are evaluated by rdflib against an in-memory ConjunctiveGraph instead
+of being sent over HTTP. Every query and update is counted and logged,
+so tests and benchmarks can assert on the number of store round trips.
+An optional `latency` (in seconds) is slept before each round trip in
+order to approximate a network connection.
+"""
+
+from time import sleep
+
+from rdflib import ConjunctiveGraph, URIRef
+from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
+
+LOCAL_ENDPOINT = 'http://localhost/local-sparql'
+
+
+class LocalSPARQLStore(SPARQLUpdateStore):
+    def __init__(self, latency=0, **kwargs):
+        super().__init__(
+            query_endpoint=LOCAL_ENDPOINT,
+            update_endpoint=LOCAL_ENDPOINT,
+            **kwargs
+        )
+        self.latency = latency
+        self.dataset = ConjunctiveGraph()
+        self.query_log = []
+        self.update_log = []
+
+    @property
+    def round_trips(self):
+        return self._queries + self._updates
+
+    def reset_log(self):
+        self._queries = self._updates = 0
+        self.query_log = []
+        self.update_log = []
+
+    def _query(self, query, default_graph=None, named_graph=None):
+        self._queries += 1
+        self.query_log.append(query)
+        if self.latency:
+            sleep(self.latency)
+        if default_graph is not None:
+            target = self.dataset.get_context(URIRef(default_graph))
+        else:
+            target = self.dataset
+        return target.query(query)
+
+    def _update(self, update):
+        self._updates += 1
+        self.update_log.append(update)
+        if self.latency:
+            sleep(self.latency)
+        self.dataset.update(update)
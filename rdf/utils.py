@@ -1,63 +1,577 @@
+import copy
+import logging
 import random
 import re
+from itertools import islice
+from collections import defaultdict
 from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 
 from django.conf import settings
-from rdflib import ConjunctiveGraph, Graph, Literal, URIRef
-from rdflib.plugins.stores.sparqlstore import SPARQLStore
+from rdflib import BNode, ConjunctiveGraph, Graph, Literal, URIRef
+from rdflib.plugins.stores.sparqlstore import SPARQLStore, SPARQLUpdateStore
 from rdflib.plugins.stores.sparqlconnector import (
     SPARQLConnector, SPARQLConnectorException, _response_mime_types)
 from typing import Optional
 from .ns import OA, XSD, DCTERMS
+from .signals import graph_changed
 
+logger = logging.getLogger('rdf')
 
 PREFIX_PATTERN = re.compile(r'PREFIX\s+(\w+):\s*<\S+>', re.IGNORECASE)
 
+# Number of triples per INSERT DATA / DELETE DATA request, unless
+# overridden with the RDF_BATCH_SIZE setting.
+DEFAULT_BATCH_SIZE = 1000
+
+# Number of terms per VALUES clause in batched lookups, unless
+# overridden with the RDF_VALUES_SIZE setting.
+DEFAULT_VALUES_SIZE = 200
+
+SUBJECT_TRIPLES_QUERY = '''
+SELECT ?s ?p ?o WHERE {{
+    VALUES ?s {{ {} }}
+    ?s ?p ?o .
+}}
+'''
+
+SUBJECT_QUADS_QUERY = '''
+SELECT ?s ?p ?o ?g WHERE {{
+    VALUES ?s {{ {} }}
+    GRAPH ?g {{ ?s ?p ?o }}
+}}
+'''
+
+CONSTRUCT_SUBJECTS_QUERY = '''
+CONSTRUCT {{ ?s ?p ?o }} WHERE {{
+    VALUES ?s {{ {} }}
+    ?s ?p ?o .
+}}
+'''
+
+CONSTRUCT_PARENTS_QUERY = '''
+CONSTRUCT {{ ?parent ?p ?o }} WHERE {{
+    VALUES ?child {{ {} }}
+    ?parent ?link ?child .
+    ?parent ?p ?o .
+}}
+'''
+
+# Formatted twice: first with the links, then by `construct_batched`.
+CONSTRUCT_LINKED_PARENTS_QUERY = '''
+CONSTRUCT {{{{ ?parent ?p ?o }}}} WHERE {{{{
+    VALUES ?child {{{{ {{}} }}}}
+    VALUES ?link {{{{ {} }}}}
+    ?parent ?link ?child .
+    ?parent ?p ?o .
+}}}}
+'''
+
+# Subjects are ordered by a hash of their IRI and a seed, so the store
+# picks the same sample for the same seed.
+SAMPLE_SUBJECTS_QUERY = '''
+SELECT DISTINCT ?s WHERE {{
+    {pattern}
+    FILTER(isIRI(?s))
+}}
+ORDER BY MD5(CONCAT(STR(?s), {seed})) LIMIT {limit}
+'''
+
+# Pages continue from the IRI of the last subject of the previous page,
+# so the offset only skips the triples of that subject on that page.
+TRIPLE_PAGE_QUERY = '''
+SELECT ?s ?p ?o WHERE {{
+    ?s ?p ?o .
+    FILTER(isIRI(?s) && STR(?s) >= {after})
+}}
+ORDER BY STR(?s) ?p ?o LIMIT {limit} OFFSET {offset}
+'''
+
+# Blank nodes have no IRI to continue from.
+BLANK_TRIPLE_PAGE_QUERY = '''
+SELECT ?s ?p ?o WHERE {{
+    ?s ?p ?o .
+    FILTER(isBlank(?s))
+}}
+ORDER BY ?s ?p ?o LIMIT {limit} OFFSET {offset}
+'''
+
+DELETE_SUBJECTS_UPDATE = '''
+DELETE {{ ?s ?p ?o }} WHERE {{
+    VALUES ?s {{ {} }}
+    ?s ?p ?o .
+}}
+'''
+
+DELETE_SUBJECT_QUADS_UPDATE = '''
+DELETE {{ GRAPH ?g {{ ?s ?p ?o }} }} WHERE {{
+    VALUES ?s {{ {} }}
+    GRAPH ?g {{ ?s ?p ?o }}
+}}
+'''
+
+# Only subjects created after this date may contain latin-1 encoded
+# strings, unless another date is passed to `latin1_candidates`.
+LATIN1_SINCE = '2022-05-10T00:00:00.000000+00:00'
+
+LATIN1_NAMESPACES = {'xsd': XSD, 'dcterms': DCTERMS, 'oa': OA}
+
+LATIN1_TRIPLES_PATTERN = r"""
+    GRAPH {graph} {{
+        ?s ?p ?o ;
+            dcterms:created ?date .
+        FILTER(?date > {since})
+        FILTER(datatype(?o)=xsd:string)
+        FILTER(regex(?o, "[\\x80-\\xFF]"))
+    }}
+"""
+
+LATIN1_PREANNOS_PATTERN = r"""
+    GRAPH {graph} {{
+        ?annotation oa:hasTarget ?target .
+        ?target oa:hasSource ?source ;
+            oa:hasSelector ?s .
+        ?s ?p ?o .
+        FILTER(datatype(?o)=xsd:string)
+        FILTER(regex(?o, "[\\x80-\\xFF]"))
+    }}
+    GRAPH {source} {{
+        ?source dcterms:created ?date .
+        FILTER(?date > {since})
+    }}
+"""
+
+# The subquery selects the subjects of the page, in IRI order; the
+# outer pattern only has to fetch their literals again.
+LATIN1_PAGE_QUERY = r"""
+SELECT ?s ?p ?o WHERE {{
+    {{
+        SELECT DISTINCT ?s WHERE {{
+            {candidates}
+            FILTER(isIRI(?s) && STR(?s) > {after})
+        }}
+        ORDER BY STR(?s) LIMIT {limit}
+    }}
+    GRAPH {graph} {{
+        ?s ?p ?o .
+        FILTER(datatype(?o)=xsd:string)
+        FILTER(regex(?o, "[\\x80-\\xFF]"))
+    }}
+}}
+"""
+
+RECODE_LATIN1_UPDATE = """
+DELETE {{ GRAPH {graph} {{ ?s ?p ?old }} }}
+INSERT {{ GRAPH {graph} {{ ?s ?p ?new }} }}
+WHERE {{
+    VALUES (?s ?p ?old ?new) {{ {rows} }}
+    GRAPH {graph} {{ ?s ?p ?old }}
+}}
+"""
+
 
 def get_conjunctive_graph():
     """ Returns the conjunctive graph of our SPARQL store. """
     return ConjunctiveGraph(settings.RDFLIB_STORE)
 
 
-def prune_triples(graph, triples):
-    """Remove all items in iterable `triples` from `graph` (modify in place)."""
-    for triple in triples:
-        graph.remove(triple)
+def thread_store(store):
+    """
+    A copy of SPARQL `store` for use by a single thread.
+
+    SPARQLUpdateStore collects pending edits in one list, which it
+    clears after sending them, so edits that another thread adds in
+    the meantime are lost. The copy sends its requests to the same
+    endpoints, over the same connection pool if any, but has its own
+    pending edits and request counters. Other stores are returned as
+    they are.
+    """
+    if not isinstance(store, SPARQLStore):
+        return store
+    store = copy.copy(store)
+    store._edits = None
+    store._queries = store._updates = 0
+    return store
+
+
+def rebind_graph(graph, store):
+    """
+    `graph` on `store` if it is on the configured store, else `graph`.
+
+    `store` is usually a `thread_store` copy of settings.RDFLIB_STORE.
+    """
+    if graph.store is not settings.RDFLIB_STORE or store is graph.store:
+        return graph
+    if isinstance(graph, ConjunctiveGraph):
+        return ConjunctiveGraph(store)
+    return Graph(store, identifier=graph.identifier)
+
+
+def get_batch_size(batch_size=None):
+    """ Return `batch_size` or, if None, the configured default. """
+    if batch_size is None:
+        batch_size = getattr(settings, 'RDF_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    return batch_size
+
+
+def get_values_size(values_size=None):
+    """ Return `values_size` or, if None, the configured default. """
+    if values_size is None:
+        values_size = getattr(settings, 'RDF_VALUES_SIZE', DEFAULT_VALUES_SIZE)
+    return values_size
+
+
+def chunked(iterable, size):
+    """ Yield lists of at most `size` consecutive items from `iterable`. """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def is_sparql_graph(graph):
+    """ Whether `graph` is backed by a (remote) SPARQL store. """
+    return isinstance(graph.store, SPARQLStore)
+
+
+def sparql_values(graph, terms):
+    """ Format `terms` for use inside a VALUES clause on the store of `graph`. """
+    return ' '.join(map(graph.store.node_to_sparql, terms))
+
+
+def graph_identifier(graph):
+    """ Identifier of `graph`, or None if it spans the whole store. """
+    if isinstance(graph, ConjunctiveGraph):
+        return None
+    return graph.identifier
+
+
+def notify_graph_changed(graph):
+    """
+    Send the `rdf.signals.graph_changed` signal for `graph`.
+
+    Nothing is sent for temporary in-memory graphs, such as those of
+    `graph_from_triples`, which have a blank node identifier.
+    """
+    identifier = graph_identifier(graph)
+    if isinstance(identifier, BNode) and not is_sparql_graph(graph):
+        return
+    graph_changed.send(
+        sender=type(graph), graph=graph, identifier=identifier
+    )
+
+
+def supports_batched_updates(graph):
+    """ Whether `graph` is backed by a SPARQL store that accepts updates. """
+    return isinstance(graph.store, SPARQLUpdateStore)
+
+
+def _triple_context(graph, triple, for_removal):
+    """
+    Determine the graph that a triple or quad is written to.
+
+    This mirrors rdflib's own choice of context in Graph.add/remove and
+    ConjunctiveGraph.add/remove, so that batched updates affect the
+    same named graphs as per-triple calls would. Returns None if no
+    GRAPH block should be used.
+    """
+    if len(triple) == 4 and triple[3] is not None:
+        context = triple[3]
+        if not isinstance(context, Graph):
+            context = Graph(graph.store, identifier=context)
+        return context
+    if isinstance(graph, ConjunctiveGraph):
+        return None if for_removal else graph.default_context
+    return graph
+
+
+def _batched_update(graph, triples, operation, batch_size):
+    """
+    Send `triples` to the store of `graph` in chunks.
+
+    Each chunk becomes a single `operation` (INSERT DATA or DELETE DATA)
+    request, in which the triples are grouped by named graph.
+    """
+    store = graph.store
+    nts = store.node_to_sparql
+    for_removal = operation == 'DELETE DATA'
+    for chunk in chunked(triples, batch_size):
+        blocks = defaultdict(list)
+        for triple in chunk:
+            context = _triple_context(graph, triple, for_removal)
+            if store._is_contextual(context):
+                key = nts(context.identifier)
+            else:
+                key = None
+            blocks[key].append('{} {} {} .'.format(*map(nts, triple[:3])))
+        data = []
+        for key, statements in blocks.items():
+            if key is None:
+                data.append('\n'.join(statements))
+            else:
+                data.append('GRAPH {} {{\n{}\n}}'.format(
+                    key, '\n'.join(statements)
+                ))
+        store.update('{} {{\n{}\n}}'.format(operation, '\n'.join(data)))
+
+
+def prune_triples(graph, triples, batch_size=None):
+    """
+    Remove all items in iterable `triples` from `graph` (modify in place).
+
+    If `graph` is backed by a SPARQL update store, the triples are
+    removed with one DELETE DATA request per `batch_size` triples
+    (default: the RDF_BATCH_SIZE setting, or 1000). Other stores
+    receive one `graph.remove` call per triple. Afterwards, the
+    `rdf.signals.graph_changed` signal is sent.
+    """
+    try:
+        _prune_triples(graph, triples, batch_size)
+    finally:
+        notify_graph_changed(graph)
+
+
+def _prune_triples(graph, triples, batch_size):
+    if not supports_batched_updates(graph):
+        for triple in triples:
+            graph.remove(triple)
+        return
+
+    def concrete_triples():
+        for triple in triples:
+            if any(term is None for term in triple[:3]):
+                # Patterns cannot be expressed in DELETE DATA.
+                graph.remove(triple)
+            else:
+                yield triple
+
+    _batched_update(
+        graph, concrete_triples(), 'DELETE DATA', get_batch_size(batch_size)
+    )
 
 
-def prune_triples_cascade(graph, triples, graphs_applied_to=[], privileged_predicates=[]):
+def prune_triples_cascade(graph, triples, graphs_applied_to=[], privileged_predicates=[], dry_run=False):
     """
     Recursively remove subjects in `triples` and all related resources from `graph`.
     Specify which graphs qualify, i.e. from which triples will be deleted, in `graphs_applied_to`.
     Optionally, skip items related via specific (privileged) predicates.
+    If `dry_run`, nothing is deleted. Returns the number of triples in the cascade.
     """
-    for triple in triples:
-        prune_recursively(
-            graph, triple[0], graphs_applied_to, privileged_predicates
-        )
+    return prune_closure(
+        graph, (triple[0] for triple in triples),
+        graphs_applied_to, privileged_predicates, dry_run,
+    )
 
 
-def prune_recursively(graph, subject, graphs_applied_to=[], privileged_predicates=[]):
+def prune_recursively(graph, subject, graphs_applied_to=[], privileged_predicates=[], dry_run=False):
     """
     Recursively remove subject and all related resources from `graph`.
     Specify which graphs qualify, i.e. from which triples will be deleted, in `graphs_applied_to`.
     Optionally, skip deletion of (i.e. keep) items related via specific (privileged) predicates.
+    If `dry_run`, nothing is deleted. Returns the number of triples in the cascade.
+    """
+    return prune_closure(
+        graph, (subject,), graphs_applied_to, privileged_predicates, dry_run,
+    )
+
+
+def subject_quads(graph, subjects, values_size=None):
+    """
+    Yield all (s, p, o, context) quads in `graph` whose subject is in `subjects`.
+
+    On a SPARQL store, this takes one query per `values_size` subjects
+    (default: the RDF_VALUES_SIZE setting, or 200). Blank nodes cannot
+    be looked up on a SPARQL store and are skipped. Other stores are
+    queried once per subject.
+    """
+    if not is_sparql_graph(graph):
+        for subject in subjects:
+            if isinstance(graph, ConjunctiveGraph):
+                yield from graph.quads((subject, None, None))
+            else:
+                for s, p, o in graph.triples((subject, None, None)):
+                    yield s, p, o, graph
+        return
+    subjects = (s for s in subjects if not isinstance(s, BNode))
+    conjunctive = isinstance(graph, ConjunctiveGraph)
+    query = SUBJECT_QUADS_QUERY if conjunctive else SUBJECT_TRIPLES_QUERY
+    for chunk in chunked(subjects, get_values_size(values_size)):
+        for row in graph.query(query.format(sparql_values(graph, chunk))):
+            if conjunctive:
+                context = Graph(graph.store, identifier=row.g)
+            else:
+                context = graph
+            yield row.s, row.p, row.o, context
+
+
+def cascade_closure(graph, subjects, graphs_applied_to=[], privileged_predicates=[], values_size=None):
+    """
+    Compute the resources that a cascading prune starting at `subjects` removes.
+
+    The closure is explored breadth first, so each level costs a
+    single batched lookup (see `subject_quads`). A related resource is
+    included if it is the URIRef object of a non-privileged predicate
+    in one of the `graphs_applied_to`. Returns a pair with the list of
+    all subjects in the closure and the list of their quads.
+    """
+    applied_to = {getattr(g, 'identifier', g) for g in graphs_applied_to}
+    privileged = set(privileged_predicates)
+    visited = set()
+    fringe = set(subjects)
+    closure, quads = [], []
+    while fringe:
+        visited |= fringe
+        closure.extend(fringe)
+        related = set()
+        for s, p, o, c in subject_quads(graph, fringe, values_size):
+            quads.append((s, p, o, c))
+            if (isinstance(o, URIRef) and o != s and p not in privileged and
+                    getattr(c, 'identifier', c) in applied_to):
+                related.add(o)
+        fringe = related - visited
+    return closure, quads
+
+
+def prune_closure(graph, subjects, graphs_applied_to=[], privileged_predicates=[], dry_run=False):
+    """
+    Remove the cascade closure of `subjects` from `graph`.
+
+    See `cascade_closure` for the selection of related resources. On a
+    SPARQL update store, the closure is deleted with one DELETE WHERE
+    per chunk of subjects; other stores are pruned triple by triple.
+    If `dry_run`, nothing is deleted. Returns the number of triples in
+    the closure.
     """
-    related_by_subject = list(graph.quads((subject, None, None)))
+    closure, quads = cascade_closure(
+        graph, subjects, graphs_applied_to, privileged_predicates
+    )
+    if dry_run or not quads:
+        return len(quads)
+    conjunctive = isinstance(graph, ConjunctiveGraph)
+    if not supports_batched_updates(graph):
+        prune_triples(graph, quads if conjunctive else (q[:3] for q in quads))
+        return len(quads)
+    if conjunctive:
+        update = DELETE_SUBJECT_QUADS_UPDATE
+    else:
+        update = DELETE_SUBJECTS_UPDATE
+    closure = (s for s in closure if not isinstance(s, BNode))
+    try:
+        for chunk in chunked(closure, get_values_size()):
+            graph.update(update.format(sparql_values(graph, chunk)))
+    finally:
+        notify_graph_changed(graph)
+    return len(quads)
+
+
+def triple_pages(graph, page_size, offset=0):
+    """
+    Yield the triples of `graph` as lists of at most `page_size` triples.
+
+    The triples of each subject are contiguous, although a subject
+    may be split over two consecutive pages. If `graph` is backed by
+    a SPARQL store, every page is a separate keyset query, so that
+    only one page at a time needs to be held in memory. The first
+    `offset` triples are skipped.
+    """
+    if is_sparql_graph(graph):
+        triples = _sparql_triples(graph, page_size)
+    else:
+        triples = (
+            (s, p, o)
+            for s in graph.subjects(unique=True)
+            for p, o in graph.predicate_objects(s)
+        )
+    yield from chunked(islice(triples, offset, None), page_size)
+
+
+def _sparql_triples(graph, page_size):
+    """
+    Generate the triples of a SPARQL `graph`, `page_size` per query.
+
+    Each query continues after the subject IRI that the previous page
+    ended with, so the store never has to skip the earlier pages. The
+    triples of blank node subjects follow in pages of their own.
+    """
+    after, skip = '', 0
+    while True:
+        page = [
+            (row.s, row.p, row.o) for row in
+            graph.query(TRIPLE_PAGE_QUERY.format(
+                after=Literal(after).n3(), limit=page_size, offset=skip,
+            ))
+        ]
+        yield from page
+        if len(page) < page_size:
+            break
+        last = str(page[-1][0])
+        if last != after:
+            after, skip = last, 0
+        skip += sum(1 for s, p, o in page if str(s) == last)
+    offset = 0
+    while True:
+        page = [
+            (row.s, row.p, row.o) for row in
+            graph.query(BLANK_TRIPLE_PAGE_QUERY.format(
+                limit=page_size, offset=offset,
+            ))
+        ]
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
 
-    for s, p, o, c in related_by_subject:
-        if isinstance(o, URIRef) and o != s and p not in privileged_predicates and c in graphs_applied_to:
-            prune_recursively(graph, o, graphs_applied_to,
-                              privileged_predicates)
+def append_triples(graph, triples, batch_size=None):
+    """
+    Add all items in iterable `triples` to `graph` (modify in place).
+
+    If `graph` is backed by a SPARQL update store, the triples are
+    added with one INSERT DATA request per `batch_size` triples
+    (default: the RDF_BATCH_SIZE setting, or 1000). Other stores
+    receive one `graph.add` call per triple. Afterwards, the
+    `rdf.signals.graph_changed` signal is sent.
+    """
+    try:
+        if not supports_batched_updates(graph):
+            for triple in triples:
+                graph.add(triple)
+            return
+        _batched_update(
+            graph, triples, 'INSERT DATA', get_batch_size(batch_size)
+        )
+    finally:
+        notify_graph_changed(graph)
 
-    prune_triples(graph, related_by_subject)
 
+def bulk_create(graph, data, counter_class, batch_size=None):
+    """
+    Add the new resources described in graph `data` to `graph`.
 
-def append_triples(graph, triples):
-    """ Add all items in iterable `triples` to `graph` (modify in place). """
-    for triple in triples:
-        graph.add(triple)
+    Every blank node that is the subject of a triple in `data` is given
+    a new subject URI from `counter_class` (a `BaseCounter` subclass),
+    also where it occurs as an object. The URIs are claimed with a
+    single `counter_class.reserve` call and the triples are added with
+    `append_triples`. Returns a dict from the blank nodes to their URIs.
+    """
+    subjects = list(dict.fromkeys(
+        subject for subject in data.subjects() if isinstance(subject, BNode)
+    ))
+    mapping = {}
+    if subjects:
+        counts = counter_class.reserve(len(subjects))
+        mapping = {
+            subject: URIRef(counter_class.subject_uri(count))
+            for subject, count in zip(subjects, counts)
+        }
+    append_triples(graph, (
+        (mapping.get(s, s), p, mapping.get(o, o)) for s, p, o in data
+    ), batch_size)
+    return mapping
 
 
 def graph_from_triples(triples, ctor=Graph):
@@ -67,36 +581,140 @@ def graph_from_triples(triples, ctor=Graph):
     return graph
 
 
+def reservoir_sample(iterable, n, seed=None):
+    """
+    Return at most `n` items of `iterable`, chosen at random in one pass.
+
+    Every item is equally likely to be chosen and only the sample is
+    held in memory. Pass `seed` for a reproducible sample.
+    """
+    rng = random.Random(seed)
+    sample = []
+    for index, item in enumerate(iterable):
+        if index < n:
+            sample.append(item)
+        else:
+            position = rng.randrange(index + 1)
+            if position < n:
+                sample[position] = item
+    return sample
+
+
+def sample_resources(graph, n, predicate=None, object=None, seed=None,
+                     values_size=None):
+    """
+    Return a graph with all triples of `n` random subjects of `graph`.
+
+    Only subjects with the given `predicate` and/or `object` are
+    sampled. If `graph` is backed by a SPARQL store, the store picks
+    the subjects by the MD5 hash of their IRI and `seed`, so only the
+    sample is sent back, and their triples are fetched with
+    `construct_batched`: a single CONSTRUCT query unless `n` exceeds
+    `values_size`. Otherwise, the subjects are picked with
+    `reservoir_sample`. Either way, the same `seed` on the same data
+    gives the same sample. Blank nodes are not sampled.
+    """
+    if seed is None:
+        seed = random.getrandbits(32)
+    if is_sparql_graph(graph):
+        nts = graph.store.node_to_sparql
+        pattern = '?s {} {} .'.format(
+            '?sample_p' if predicate is None else nts(predicate),
+            '?sample_o' if object is None else nts(object),
+        )
+        subjects = [row.s for row in graph.query(SAMPLE_SUBJECTS_QUERY.format(
+            pattern=pattern, seed=Literal(str(seed)).n3(), limit=n,
+        ))]
+        return construct_batched(
+            graph, CONSTRUCT_SUBJECTS_QUERY, subjects, values_size
+        )
+    subjects = (
+        s for s in graph.subjects(predicate, object, unique=True)
+        if not isinstance(s, BNode)
+    )
+    result = Graph()
+    for s in reservoir_sample(subjects, n, seed):
+        append_triples(result, graph.triples((s, None, None)))
+    return result
+
+
 def sample_graph(graph, subjects, request):
-    """ Return a random sample from a graph, optionally filtering with a list containing [predicate, object]. """
+    """
+    Return all triples of a random sample of `subjects` in `graph`.
+
+    The sample size is the `n_results` query parameter of `request`
+    and an optional `seed` parameter makes the sample reproducible.
+    `subjects` may be any iterable; it is traversed once. If it is
+    None, the store picks the sample from all subjects of `graph`
+    instead (see `sample_resources`), so they need not be fetched.
+    On a SPARQL store, the sampled subjects are fetched with
+    `construct_batched`.
+    """
     n_results = int(request.GET.get('n_results'))
-    if len(subjects) > n_results:
-        sampled_subjects = random.sample(list(subjects), n_results)
-    else:
-        sampled_subjects = subjects
+    seed = request.GET.get('seed')
+    if subjects is None:
+        return sample_resources(graph, n_results, seed=seed)
+    sampled_subjects = reservoir_sample(subjects, n_results, seed)
+    if is_sparql_graph(graph):
+        return construct_batched(
+            graph, CONSTRUCT_SUBJECTS_QUERY, sampled_subjects
+        )
     output = Graph()
     for sub in sampled_subjects:
-        suggestions = graph.triples((sub, None, None))
-        [output.add(s) for s in suggestions]
+        append_triples(output, graph.triples((sub, None, None)))
     return output
 
 
-def traverse_forward(full_graph, fringe, plys):
+def construct_batched(graph, query, terms, values_size=None):
+    """
+    Run a CONSTRUCT `query` with a VALUES placeholder once per chunk of `terms`.
+
+    Returns a new Graph with the union of the results. Chunks contain
+    at most `values_size` terms (default: the RDF_VALUES_SIZE setting,
+    or 200). Blank nodes cannot be passed to a SPARQL store and are
+    skipped.
+    """
+    result = Graph()
+    terms = (t for t in terms if not isinstance(t, BNode))
+    for chunk in chunked(terms, get_values_size(values_size)):
+        append_triples(result, graph.query(
+            query.format(sparql_values(graph, chunk))
+        ))
+    return result
+
+
+def linked_objects(graph, predicates=None):
+    """ Objects in `graph`, only via `predicates` if not None. """
+    if predicates is None:
+        return set(graph.objects())
+    return {o for p in predicates for o in graph.objects(None, p)}
+
+
+def traverse_forward(full_graph, fringe, plys, values_size=None, predicates=None):
     """
     Traverse `full_graph` by object `plys` times, starting from `fringe`.
 
     Returns a graph with all triples accumulated during the traversal,
-    excluding `fringe`.
+    excluding `fringe`. If `predicates` is given, only objects of
+    triples with one of those predicates are followed. If `full_graph`
+    is backed by a SPARQL store, each ply is fetched with one CONSTRUCT
+    query per `values_size` objects (see `construct_batched`).
     """
+    batched = is_sparql_graph(full_graph)
     result = Graph()
     visited_objects = set()
     while plys > 0:
-        objects = set(fringe.objects()) - visited_objects
+        objects = linked_objects(fringe, predicates) - visited_objects
         if not len(objects):
             break
-        fringe = Graph()
-        for o in objects:
-            if not isinstance(o, Literal):
+        resources = (o for o in objects if not isinstance(o, Literal))
+        if batched:
+            fringe = construct_batched(
+                full_graph, CONSTRUCT_SUBJECTS_QUERY, resources, values_size
+            )
+        else:
+            fringe = Graph()
+            for o in resources:
                 append_triples(fringe, full_graph.triples((o, None, None)))
         result |= fringe
         visited_objects |= objects
@@ -104,28 +722,45 @@ def traverse_forward(full_graph, fringe, plys):
     return result
 
 
-def traverse_backward(full_graph, fringe, plys):
+def traverse_backward(full_graph, fringe, plys, values_size=None, predicates=None):
     """
     Traverse `full_graph` by subject `plys` times, starting from `fringe`.
 
     Returns a graph with all triples accumulated during the traversal,
     excluding `fringe`. This result always contains complete
     resources, i.e., all triples of each subject in the graph are
-    included.
+    included. If `predicates` is given, only subjects that refer to
+    the fringe with one of those predicates are included. If
+    `full_graph` is backed by a SPARQL store, each ply is fetched with
+    one CONSTRUCT query per `values_size` subjects (see
+    `construct_batched`).
     """
+    batched = is_sparql_graph(full_graph)
     result = Graph()
     subjects = set(fringe.subjects())
     visited_subjects = set()
+    if batched and predicates is not None:
+        query = CONSTRUCT_LINKED_PARENTS_QUERY.format(
+            sparql_values(full_graph, predicates)
+        )
+    else:
+        query = CONSTRUCT_PARENTS_QUERY
     while plys > 0:
         if not len(subjects):
             break
-        fringe = Graph()
-        fringe_subjects = set()
-        for s in subjects:
-            parents = set(full_graph.subjects(None, s))
-            for ss in parents - fringe_subjects:
-                append_triples(fringe, full_graph.triples((ss, None, None)))
-            fringe_subjects |= parents
+        if batched:
+            fringe = construct_batched(full_graph, query, subjects, values_size)
+        else:
+            fringe = Graph()
+            fringe_subjects = set()
+            for s in subjects:
+                parents = {
+                    ss for ss, link in full_graph.subject_predicates(s)
+                    if predicates is None or link in predicates
+                }
+                for ss in parents - fringe_subjects:
+                    append_triples(fringe, full_graph.triples((ss, None, None)))
+                fringe_subjects |= parents
         result |= fringe
         visited_subjects |= subjects
         subjects = set(fringe.subjects()) - visited_subjects
@@ -140,65 +775,126 @@ def latin1_to_utf8(original: str) -> str:
         return original
 
 
+def latin1_candidates(graph: Graph, source_graph: Graph = None,
+                      since: str = LATIN1_SINCE) -> str:
+    """
+    Graph pattern that binds ?s ?p ?o to possibly latin-1 encoded triples.
+
+    These are the xsd:string literals in `graph` with characters in
+    the latin-1 range, on subjects created after `since`. If
+    `source_graph` is given, they are the literals of the selectors of
+    annotations in `graph` whose source in `source_graph` was created
+    after `since` instead.
+    """
+    since = Literal(since, datatype=XSD.dateTime).n3()
+    if source_graph is None:
+        return LATIN1_TRIPLES_PATTERN.format(
+            graph=graph.identifier.n3(), since=since)
+    return LATIN1_PREANNOS_PATTERN.format(
+        graph=graph.identifier.n3(), source=source_graph.identifier.n3(),
+        since=since)
+
+
 def find_latin1_triples(graph: Graph) -> Graph:
-    query = r'''CONSTRUCT {{?s ?p ?o }}
-    WHERE {{
-        GRAPH <{}> {{
-            ?s ?p ?o;
-            dcterms:created ?date .
-            FILTER(?date > "2022-05-10T00:00:00.000000+00:00"^^xsd:dateTime)
-            FILTER(datatype(?o)=xsd:string)
-            FILTER(regex(?o, "[\\x80-\\xFF]"))
-        }}
-    }}
-    '''.format(graph.identifier)
-    res = graph.query(query, initNs={'xsd': XSD, 'dcterms': DCTERMS})
+    query = 'CONSTRUCT {{ ?s ?p ?o }} WHERE {{ {} }}'.format(
+        latin1_candidates(graph))
+    res = graph.query(query, initNs=LATIN1_NAMESPACES)
     g = graph_from_triples(res)
-    print(f'found {len(g)} latin-1 triples in graph {graph.identifier}')
+    logger.info('Found {} latin-1 triples in graph {}.'.format(
+        len(g), graph.identifier))
     return g
 
 
 def find_latin1_preannos(graph: Graph, source_graph: Graph) -> Graph:
-    query = r'''CONSTRUCT {{?selector ?pred ?obj}}
-    WHERE {{
-        GRAPH <{}> {{
-            ?s oa:hasTarget ?target .
-            ?target oa:hasSource ?source ;
-            oa:hasSelector ?selector .
-            ?selector ?pred ?obj
-            FILTER(datatype(?obj)=xsd:string)
-            FILTER(regex(?obj, "[\\x80-\\xFF]"))
-
-        }}
-        GRAPH <{}> {{
-            ?source dcterms:created ?date .
-            FILTER(?date > "2022-05-10T00:00:00.000000+00:00"^^xsd:dateTime)
-        }}
-    }}
-    '''.format(graph.identifier, source_graph.identifier)
-    res = graph.query(query, initNs={'xsd': XSD, 'dcterms': DCTERMS, 'oa': OA})
+    query = 'CONSTRUCT {{ ?s ?p ?o }} WHERE {{ {} }}'.format(
+        latin1_candidates(graph, source_graph))
+    res = graph.query(query, initNs=LATIN1_NAMESPACES)
     g = graph_from_triples(res)
-    print(f'found {len(g)} latin-1 triples in graph {graph.identifier}')
+    logger.info('Found {} latin-1 triples in graph {}.'.format(
+        len(g), graph.identifier))
     return g
 
+
+def latin1_pages(graph: Graph, page_size: int, after: str = '',
+                 source_graph: Graph = None, since: str = LATIN1_SINCE):
+    """
+    Yield the candidates of `latin1_candidates` page by page.
+
+    Every page is a separate keyset query for the candidate triples of
+    the next `page_size` subjects whose IRI sorts after `after`, so a
+    page contains all candidates of its subjects and the store never
+    has to skip the earlier pages. Yields pairs of the last subject of
+    the page and a list of its triples. Blank node subjects are
+    skipped, since they cannot be addressed in an update.
+    """
+    conjunctive = ConjunctiveGraph(graph.store)
+    candidates = latin1_candidates(graph, source_graph, since)
+    while True:
+        rows = conjunctive.query(LATIN1_PAGE_QUERY.format(
+            candidates=candidates, graph=graph.identifier.n3(),
+            after=Literal(str(after)).n3(), limit=page_size,
+        ), initNs=LATIN1_NAMESPACES)
+        triples = [(row.s, row.p, row.o) for row in rows]
+        if not triples:
+            return
+        subjects = {s for s, p, o in triples}
+        after = max(subjects, key=str)
+        yield after, triples
+        if len(subjects) < page_size:
+            return
+
+
+def recode_latin1_batch(graph: Graph, triples, commit=True) -> int:
+    """
+    Replace the latin-1 encoded literals among `triples` in `graph`.
+
+    If `graph` is backed by a SPARQL update store, all replacements are
+    sent as a single DELETE/INSERT request. If not `commit`, the
+    replacements are only logged. Returns the number of replacements.
+    """
+    fixes = []
+    for s, p, o in triples:
+        recoded = latin1_to_utf8(str(o))
+        if recoded != str(o):
+            fixes.append((s, p, o, Literal(
+                recoded, lang=o.language, datatype=o.datatype)))
+    if not commit:
+        for s, p, o, recoded in fixes:
+            # manual sanity check
+            logger.info('{} {}: {} -> {}'.format(s, p, o, recoded))
+        return len(fixes)
+    if not fixes:
+        return 0
+    try:
+        if supports_batched_updates(graph):
+            nts = graph.store.node_to_sparql
+            graph.store.update(RECODE_LATIN1_UPDATE.format(
+                graph=nts(graph.identifier),
+                rows=' '.join(
+                    '({} {} {} {})'.format(*map(nts, fix)) for fix in fixes
+                ),
+            ))
+        else:
+            for s, p, o, recoded in fixes:
+                graph.add((s, p, recoded))
+                graph.remove((s, p, o))
+    finally:
+        notify_graph_changed(graph)
+    return len(fixes)
+
+
 def recode_latin1_triples(g: Graph, latin1_triples: Graph, commit=False) -> None:
     '''Find and recodes latin1-encoded strings to utf-8
-    If commit, also replace them in the triplestore.
+    If commit, also replace them in the triplestore, with one update per
+    `get_batch_size()` triples.
     '''
     cnt = 0
-    for (s, p, o) in latin1_triples:
-        recoded = latin1_to_utf8(o)
-        if o != recoded:
-            if not commit:
-                # manual sanity check
-                print(o)
-                print(recoded)
-                print('---')
-            else:
-                g.add((s, p, Literal(recoded)))
-                g.remove((s, p, o))
-                cnt += 1
-    print(f'updated {cnt} triples')
+    for chunk in chunked(latin1_triples, get_batch_size()):
+        cnt += recode_latin1_batch(g, chunk, commit)
+    if commit:
+        logger.info('Updated {} triples.'.format(cnt))
+    else:
+        logger.info('Would update {} triples.'.format(cnt))
 
 def patched_inject_prefixes(self, query, extra_bindings):
     ''' Monkeypatch for SPARQLStore prefix injection
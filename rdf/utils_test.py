@@ -1,11 +1,13 @@
 import pytest
 
+from django.test import RequestFactory
 from rdflib import Graph
 
 from .ns import *
 from .utils import *
-from .conftest import ITEM
+from .conftest import ITEM, ITEMS
 import re
+from datetime import datetime, timezone
 
 
 @pytest.fixture
@@ -120,3 +122,208 @@ def test_charset_update(sparqlstore):
     # If the triple is properly stored, it can be retrieved
     # otherwise it will be stored as 'FÃ©vrier'
     assert next(sparqlstore.triples(problematic_triple), None)
+
+
+def test_append_triples_batched(local_store, filled_graph):
+    graph = Graph(local_store, identifier=ITEM['graph'])
+    append_triples(graph, filled_graph, batch_size=4)
+    assert local_store._updates == 3
+    assert len(local_store.dataset) == len(filled_graph)
+    context = local_store.dataset.get_context(ITEM['graph'])
+    assert len(context ^ filled_graph) == 0
+
+
+def test_prune_triples_batched(local_store, filled_graph):
+    graph = Graph(local_store, identifier=ITEM['graph'])
+    append_triples(graph, filled_graph)
+    local_store.reset_log()
+    prune_triples(graph, list(filled_graph)[:7], batch_size=5)
+    assert local_store._updates == 2
+    assert len(local_store.dataset) == len(filled_graph) - 7
+
+
+def test_append_quads_batched(local_store, items):
+    conjunctive = ConjunctiveGraph(local_store)
+    quads = [item + (ITEM['graph1'],) for item in items[:10]]
+    quads += [item + (ITEM['graph2'],) for item in items[10:]]
+    append_triples(conjunctive, quads)
+    assert local_store._updates == 1
+    assert 'GRAPH <{}>'.format(ITEM['graph2']) in local_store.update_log[0]
+    assert len(local_store.dataset.get_context(ITEM['graph1'])) == 10
+    assert len(local_store.dataset.get_context(ITEM['graph2'])) == len(items) - 10
+
+
+def test_prune_triples_cascade_dry_run(filled_conjunctive_graph):
+    anno = (ITEM['7'], RDF.type, OA.Annotation)
+    privileged_graph = next(filled_conjunctive_graph.contexts())
+    size = prune_triples_cascade(filled_conjunctive_graph, (anno,), [
+                                 privileged_graph], [OA.hasBody], dry_run=True)
+    assert size == len(filled_conjunctive_graph) - 14
+    assert len(filled_conjunctive_graph) == len(ITEMS)
+
+
+def test_prune_recursively_batched(local_store, items):
+    conjunctive = ConjunctiveGraph(local_store)
+    append_triples(conjunctive, (item + (ITEM['graph'],) for item in items))
+    local_store.reset_log()
+    size = prune_recursively(conjunctive, ITEM['7'], [ITEM['graph']])
+    assert size == len(items)
+    assert len(local_store.dataset) == 0
+    # One lookup per level of the annotation tree, one deletion.
+    assert local_store._queries == 4
+    assert local_store._updates == 1
+
+
+def test_traverse_batched(local_store, filled_graph, other_triples):
+    remote_graph = Graph(local_store, identifier=ITEM['graph'])
+    append_triples(remote_graph, filled_graph)
+    start = graph_from_triples(other_triples)
+    for depth in range(1, 4):
+        local_store.reset_log()
+        forward = traverse_forward(remote_graph, start, depth, values_size=2)
+        assert len(forward ^ traverse_forward(filled_graph, start, depth)) == 0
+        backward = traverse_backward(remote_graph, start, depth)
+        assert len(backward ^ traverse_backward(filled_graph, start, depth)) == 0
+        # At most one query per ply for backward, three for forward.
+        assert local_store._queries <= 4 * depth
+
+
+def test_triple_pages(local_store):
+    remote_graph = Graph(local_store, identifier=ITEM['graph'])
+    triples = [(ITEM['1'], RDFS.label, Literal(str(n))) for n in range(5)]
+    triples += [(ITEM['2'], RDFS.label, Literal('two'))]
+    append_triples(remote_graph, triples)
+    # SPARQLStore refuses to send blank nodes.
+    blank = (BNode(), RDFS.label, Literal('blank'))
+    local_store.dataset.get_context(ITEM['graph']).add(blank)
+    triples.append(blank)
+    local_store.reset_log()
+    pages = list(triple_pages(remote_graph, 2))
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    assert set(t for page in pages for t in page) == set(triples)
+    # Three full pages of IRI subjects, an empty one and the blank nodes.
+    assert local_store._queries == 5
+    # The last IRI page only skips the triple of ITEM['2'] before it.
+    assert 'OFFSET 1' in local_store.query_log[3]
+    resumed = list(triple_pages(remote_graph, 2, 3))
+    assert [t for page in resumed for t in page] == [
+        t for page in pages for t in page
+    ][3:]
+
+
+def test_bulk_create(counter_table, local_store):
+    graph = Graph(local_store, identifier=ITEM['graph'])
+    first, second = BNode(), BNode()
+    data = graph_from_triples((
+        (first, RDF.type, OA.Annotation),
+        (first, OA.hasTarget, second),
+        (second, RDF.type, OA.SpecificResource),
+        (second, OA.hasSource, ITEM['1']),
+    ))
+    local_store.reset_log()
+    mapping = bulk_create(graph, data, counter_table)
+    assert set(mapping) == {first, second}
+    assert set(mapping.values()) == {
+        URIRef('http://example.com/thing/2'), URIRef('http://example.com/thing/3'),
+    }
+    assert (mapping[first], OA.hasTarget, mapping[second]) in graph
+    assert len(graph) == 4
+    assert local_store._updates == 1
+    assert bulk_create(graph, Graph(), counter_table) == {}
+
+
+@pytest.fixture
+def latin1_graph(local_store):
+    graph = Graph(local_store, identifier=ITEM['graph'])
+    for n in range(5):
+        subject = ITEM[str(n)]
+        local_store.dataset.get_context(graph.identifier).add(
+            (subject, DCTERMS.created, Literal(datetime.now(timezone.utc))))
+        for label in ('cafÃ©', 'naïve', 'plain'):
+            local_store.dataset.get_context(graph.identifier).add(
+                (subject, RDFS.label, Literal(label, datatype=XSD.string)))
+    local_store.reset_log()
+    return graph
+
+
+def test_latin1_pages(latin1_graph):
+    pages = list(latin1_pages(latin1_graph, 2))
+    assert [subject for subject, triples in pages] == [
+        ITEM['1'], ITEM['3'], ITEM['4']
+    ]
+    # Both non-ASCII labels of every subject are candidates.
+    assert [len(triples) for subject, triples in pages] == [4, 4, 2]
+    assert latin1_graph.store._queries == 3
+    resumed = list(latin1_pages(latin1_graph, 2, after=ITEM['3']))
+    assert [subject for subject, triples in resumed] == [ITEM['4']]
+
+
+def test_recode_latin1_batch(latin1_graph):
+    triples = [t for subject, page in latin1_pages(latin1_graph, 10) for t in page]
+    latin1_graph.store.reset_log()
+    assert recode_latin1_batch(latin1_graph, triples, commit=False) == 5
+    assert latin1_graph.store._updates == 0
+    assert recode_latin1_batch(latin1_graph, triples) == 5
+    assert latin1_graph.store._updates == 1
+    stored = latin1_graph.store.dataset.get_context(
+        latin1_graph.identifier)
+    labels = set(stored.objects(ITEM['0'], RDFS.label))
+    assert labels == {
+        Literal(label, datatype=XSD.string)
+        for label in ('café', 'naïve', 'plain')
+    }
+
+
+def test_reservoir_sample():
+    sample = reservoir_sample(iter(range(100)), 10, seed=1)
+    assert len(set(sample)) == 10
+    assert reservoir_sample(iter(range(100)), 10, seed=1) == sample
+    assert reservoir_sample(range(5), 10) == [0, 1, 2, 3, 4]
+
+
+def test_sample_resources(items, local_store):
+    remote = Graph(local_store, identifier=ITEM['graph'])
+    local = Graph()
+    append_triples(local_store.dataset.get_context(remote.identifier), items)
+    append_triples(local, items)
+    for graph in (local, remote):
+        local_store.reset_log()
+        sample = sample_resources(graph, 2, seed='a')
+        subjects = set(sample.subjects())
+        assert len(subjects) == 2
+        for s in subjects:
+            assert set(sample.predicate_objects(s)) == set(
+                local.predicate_objects(s))
+        assert set(sample_resources(graph, 2, seed='a')) == set(sample)
+        filtered = sample_resources(graph, 5, RDF.type, OA.Annotation)
+        assert set(filtered.subjects()) == {ITEM['7']}
+    # The store picked the samples; each was fetched in one CONSTRUCT.
+    assert local_store._queries == 3 * 2
+
+
+def test_sample_graph(local_store, items):
+    remote = Graph(local_store, identifier=ITEM['graph'])
+    append_triples(local_store.dataset.get_context(remote.identifier), items)
+    request = RequestFactory().get('/', {'n_results': 2, 'seed': 'b'})
+    local_store.reset_log()
+    sample = sample_graph(remote, iter([ITEM['1'], ITEM['4'], ITEM['5']]), request)
+    assert len(set(sample.subjects())) == 2
+    assert local_store._queries == 1
+    sample = sample_graph(remote, None, request)
+    assert len(set(sample.subjects())) == 2
+    assert local_store._queries == 1 + 2
+
+
+def test_thread_store(local_store, settings):
+    settings.RDFLIB_STORE = local_store
+    copy = thread_store(local_store)
+    assert copy is not local_store
+    Graph(copy, identifier=ITEM['graph']).add(ITEMS[0])
+    assert local_store._edits is None and local_store._updates == 0
+    assert copy._updates == 1
+    # The copy writes to the same endpoint.
+    assert ITEMS[0] in local_store.dataset.get_context(ITEM['graph'])
+    graph = get_conjunctive_graph()
+    assert rebind_graph(graph, copy).store is copy
+    assert rebind_graph(Graph(), copy).store is not copy
+    assert thread_store(Graph().store) is not copy
@@ -0,0 +1,92 @@
+"""
+Per-graph change counters for HTTP validators.
+
+`graph_versions` counts the `rdf.signals.graph_changed` signals per
+graph and remembers when each graph last changed. The counters live in
+one of the backends from the CACHES setting (the RDF_VERSION_CACHE
+setting, default 'default'), so all processes that share that backend
+see the same versions; the local-memory backend only works for a single
+process. A random epoch is part of every version, so that versions are
+not reused after the backend has been cleared.
+
+As with `sparql.cache`, changes that do not go through `rdf.utils` or
+a SPARQL update view are not noticed.
+"""
+
+from hashlib import sha1
+from time import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .signals import graph_changed
+
+# Counted for every change, and for changes where any graph may have
+# changed (writes through a conjunctive graph), respectively.
+ANY = '*any'
+WILDCARD = '*wildcard'
+
+
+class GraphVersions:
+    """ Change counters and modification times of graphs. """
+
+    def __init__(self, key_prefix='rdf-version'):
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'RDF_VERSION_CACHE', 'default')]
+
+    def key(self, kind, name):
+        digest = sha1(str(name).encode()).hexdigest()
+        return '{}:{}:{}'.format(self.key_prefix, kind, digest)
+
+    def epoch(self):
+        """ Return the random token and start time of the counters. """
+        key = '{}:epoch'.format(self.key_prefix)
+        self.cache.add(key, (uuid4().hex, time()), None)
+        return self.cache.get(key)
+
+    def counted(self, identifier):
+        """ The counters that a change of `identifier` increments. """
+        return [ANY, WILDCARD if identifier is None else str(identifier)]
+
+    def changed(self, identifier=None):
+        """ Record a change of graph `identifier`, or of any if None. """
+        cache = self.cache
+        now = time()
+        for name in self.counted(identifier):
+            key = self.key('count', name)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, 0, None)
+                cache.incr(key)
+            cache.set(self.key('modified', name), now, None)
+
+    def version(self, identifier=None):
+        """
+        Return a version token and last modification time of a graph.
+
+        If `identifier` is None, the version covers all graphs.
+        """
+        token, start = self.epoch()
+        if identifier is None:
+            names = [ANY]
+        else:
+            names = [WILDCARD, str(identifier)]
+        keys = [self.key(kind, name)
+                for kind in ('count', 'modified') for name in names]
+        values = self.cache.get_many(keys)
+        counts = [values.get(key, 0) for key in keys[:len(names)]]
+        modified = [values.get(key, start) for key in keys[len(names):]]
+        version = '.'.join(map(str, [token] + counts))
+        return version, max(modified)
+
+    def on_graph_changed(self, sender, identifier=None, **kwargs):
+        self.changed(identifier)
+
+
+graph_versions = GraphVersions()
+graph_changed.connect(graph_versions.on_graph_changed)
@@ -0,0 +1,19 @@
+from rdflib import ConjunctiveGraph, Graph, URIRef
+
+from .utils import notify_graph_changed
+from .versions import graph_versions
+
+G = URIRef('http://example.com/g')
+H = URIRef('http://example.com/h')
+
+
+def test_versions():
+    g, h, everything = (graph_versions.version(i) for i in (G, H, None))
+    notify_graph_changed(Graph(identifier=G))
+    assert graph_versions.version(G)[0] != g[0]
+    assert graph_versions.version(G)[1] >= g[1]
+    assert graph_versions.version(H) == h
+    assert graph_versions.version(None)[0] != everything[0]
+    h = graph_versions.version(H)
+    notify_graph_changed(ConjunctiveGraph())
+    assert graph_versions.version(H)[0] != h[0]
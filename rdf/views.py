@@ -1,14 +1,29 @@
+from functools import update_wrapper
+from hashlib import sha1
+from inspect import isawaitable
+from time import time
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.http import StreamingHttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
 from rest_framework.views import APIView, exception_handler
 from rest_framework.response import Response
 from rest_framework.status import *
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ParseError
 
 from rdflib import Graph, URIRef, BNode, Literal
 
 from rdf.ns import *
 from rdf.renderers import TurtleRenderer
-from rdf.parsers import JSONLDParser
-from rdf.utils import append_triples, graph_from_triples
+from rdf.parsers import JSONLDParser, NQuadsParser, NTriplesParser, TurtleParser
+from rdf.utils import (append_triples, bulk_create, graph_from_triples,
+                       graph_identifier, is_sparql_graph, traverse_backward,
+                       traverse_forward)
+from rdf.versions import graph_versions
+from rdf.connection import query_graph
 
 HTTPSC_MAP = {
     # Both Django REST framework and HTTPSC are incomplete.
@@ -44,6 +59,9 @@ HTTPSC_MAP = {
 }
 
 
+RESOURCE_QUERY = 'CONSTRUCT {{ {0} ?p ?o }} WHERE {{ {0} ?p ?o }}'
+
+
 def graph_from_request(request):
     """ Safely obtain a graph, from the request if present, empty otherwise. """
     data = request.data
@@ -83,20 +101,272 @@ def custom_exception_handler(error, context):
     return response
 
 
-class RDFView(APIView):
+class StreamingMixin:
+    """
+    Serve successful responses as a StreamingHttpResponse.
+
+    Set `streaming = True` on a view to enable this. The response body
+    is then generated by the `render_stream` method of the accepted
+    renderer (see `rdf.renderers.RDFLibRenderer`), so the serialization
+    is never held in memory in its entirety. Renderers without a
+    `render_stream` method are used as usual.
+    """
+    streaming = False
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        renderer = getattr(request, 'accepted_renderer', None)
+        if (self.streaming and isinstance(response, Response) and
+                not response.exception and
+                hasattr(renderer, 'render_stream')):
+            return streaming_response(response, renderer)
+        return response
+
+
+def renderer_content_type(renderer):
+    """ Content-Type header for output of `renderer`, as DRF would set it. """
+    if renderer.charset:
+        return '{}; charset={}'.format(renderer.media_type, renderer.charset)
+    return renderer.media_type
+
+
+def streaming_response(response, renderer):
+    """ Convert a finalized DRF `response` to a StreamingHttpResponse. """
+    content_type = response.content_type or renderer_content_type(renderer)
+    context = response.renderer_context
+    context['response'] = response
+    streaming = StreamingHttpResponse(
+        renderer.render_stream(
+            response.data, response.accepted_media_type, context
+        ),
+        status=response.status_code,
+        content_type=content_type,
+    )
+    for header, value in response.items():
+        if header.lower() != 'content-type':
+            streaming[header] = value
+    return streaming
+
+
+class PaginationMixin:
+    """
+    Serve a view's graph in pages.
+
+    Set `pagination_class` to `rdf.pagination.GraphPagination` or a
+    subclass to enable this.
+    """
+    pagination_class = None
+
+    @property
+    def paginator(self):
+        """ The paginator instance of this view, or None. """
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.pagination_class
+            self._paginator = pagination_class and pagination_class()
+        return self._paginator
+
+
+class NotModified(Exception):
+    """ Raised to skip the handler of a conditional request. """
+
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GET requests without touching the store.
+
+    Set `conditional = True` on a view to enable this. Responses to GET
+    and HEAD requests then carry an ETag and a Last-Modified header,
+    derived from the version of the view's graph in
+    `rdf.versions.graph_versions`, the request path and query string
+    and the Accept header. A request with a matching If-None-Match or
+    If-Modified-Since header is answered with 304 Not Modified before
+    the handler runs. Last-Modified has a resolution of one second, so
+    it is left out while the graph may still change within the second
+    of its last change. The version is that of `self.graph()`, or of
+    all graphs if the view only defines `get_graph`; override
+    `version_identifier` to narrow it down. Set `cache_control` to a
+    dictionary of keyword arguments for
+    `django.utils.cache.patch_cache_control`, such as `{'max_age': 60}`,
+    to add a Cache-Control header as well.
+    """
+    conditional = False
+    cache_control = None
+
+    def version_identifier(self, request):
+        """ Identifier of the graph whose version the validators follow. """
+        graph = getattr(self, 'graph', None)
+        if graph is None:
+            return None
+        return graph_identifier(graph())
+
+    def get_validators(self, request):
+        """
+        Return the ETag and last modification time of the response.
+
+        The time is None if the graph changed during the current second.
+        """
+        version, modified = graph_versions.version(
+            self.version_identifier(request)
+        )
+        digest = sha1('\n'.join((
+            version, request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+        )).encode()).hexdigest()
+        modified = int(modified)
+        if modified >= int(time()):
+            modified = None
+        return 'W/"{}"'.format(digest), modified
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.conditional and request.method in ('GET', 'HEAD'):
+            self.validators = self.get_validators(request)
+            etag, modified = self.validators
+            response = get_conditional_response(
+                request, etag=etag, last_modified=modified
+            )
+            if response is not None:
+                raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD') or \
+                response.status_code not in (200, 304):
+            return response
+        validators = getattr(self, 'validators', None)
+        if validators is not None:
+            etag, modified = validators
+            response['ETag'] = etag
+            if modified is not None:
+                response['Last-Modified'] = http_date(modified)
+            patch_vary_headers(response, ('Accept',))
+        if self.cache_control:
+            patch_cache_control(response, **self.cache_control)
+        return response
+
+
+class AsyncViewMixin:
+    """
+    Run an APIView as an asynchronous view under ASGI.
+
+    Handler methods such as `get` and `post` may be coroutines. While
+    they await a remote triplestore, the worker is free to serve other
+    requests. Authentication, permission and throttling checks run in a
+    thread, because they may access the database.
+
+    Django 3.2 does not stop a view when the client disconnects. Wrap
+    the ASGI application in `rdf.asgi.CancelOnDisconnect` in order to
+    cancel the view, and with it any pending triplestore request.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        # Django recognizes asynchronous views by their coroutine function.
+        return update_wrapper(async_view, view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        """ Asynchronous version of APIView.dispatch. """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(),
+                                  self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if isawaitable(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class BulkCreateMixin:
+    """
+    Create resources from the graph in the body of a POST request.
+
+    Combine with `RDFView` and set `counter_class` to a `BaseCounter`
+    subclass. The blank-node subjects of the posted graph (JSON-LD or
+    any other format of the view's parsers) are given new subject URIs
+    and the graph is added to `self.graph()` with
+    `rdf.utils.bulk_create`. The response holds the created triples.
+    """
+    counter_class = None
+
+    def post(self, request, format=None, **kwargs):
+        if self.counter_class is None:
+            raise ImproperlyConfigured(
+                '{} requires a counter_class.'.format(type(self).__name__)
+            )
+        data = graph_from_request(request)
+        if len(data) == 0:
+            raise ParseError('No triples to create.')
+        mapping = bulk_create(self.graph(), data, self.counter_class)
+        return self.created_response(data, mapping)
+
+    def created_response(self, data, mapping):
+        """ Respond to the creation of `data`, given the new URIs in `mapping`. """
+        created = graph_from_triples(
+            (mapping.get(s, s), p, mapping.get(o, o)) for s, p, o in data
+        )
+        for prefix, namespace in data.namespaces():
+            created.bind(prefix, namespace, override=False)
+        headers = {}
+        if len(mapping) == 1:
+            headers['Location'] = str(next(iter(mapping.values())))
+        return Response(created, status=HTTP_201_CREATED, headers=headers)
+
+
+class RDFView(ConditionalGetMixin, PaginationMixin, StreamingMixin, APIView):
     """
     Expose a given graph as an RDF-encoded API endpoint.
 
     Either set a static `graph` member function or override
     `get_graph` to compute the graph from the request.
 
-    For now, only Turtle output and JSON-LD input is supported.
+    For now, only Turtle output is supported. Input may be JSON-LD,
+    Turtle, N-Triples or N-Quads.
+    Set `streaming = True` to stream large graphs (see `StreamingMixin`).
+    Static graphs can be served from a compact, read-only copy made
+    with `rdf.store.freeze_graph`. Set `conditional = True` to support
+    conditional requests (see `ConditionalGetMixin`) and set
+    `pagination_class` to serve the graph in pages (see
+    `PaginationMixin`).
     """
     renderer_classes = (TurtleRenderer,)
-    parser_classes = (JSONLDParser,)
+    parser_classes = (JSONLDParser, TurtleParser, NTriplesParser, NQuadsParser)
 
     def get(self, request, format=None, **kwargs):
-        return Response(self.get_graph(request, **kwargs))
+        graph = self.get_graph(request, **kwargs)
+        paginator = self.paginator
+        if paginator is None:
+            return Response(graph)
+        page = paginator.paginate_graph(graph, request)
+        return paginator.get_paginated_response(page)
 
     def get_graph(self, request, **kwargs):
         return self.graph()
@@ -106,7 +376,22 @@ class RDFView(APIView):
 
 
 class RDFResourceView(RDFView):
-    """ API endpoint for fetching individual subjects. """
+    """
+    API endpoint for fetching individual subjects.
+
+    By default, only the triples of the subject itself are included.
+    Set `expand_depth` to also include related nodes up to that many
+    links away: the objects of the subject (if `expand_forward`) and
+    the subjects that refer to it (if `expand_backward`), with the
+    semantics of `traverse_forward` and `traverse_backward`. Set
+    `expand_predicates` to a list of predicates in order to follow
+    only those links. If the graph is backed by a SPARQL store, every
+    level is fetched with a single batched query.
+    """
+    expand_depth = 0
+    expand_predicates = None
+    expand_forward = True
+    expand_backward = False
 
     def get(self, request, format=None, **kwargs):
         data = self.get_graph(request, **kwargs)
@@ -117,9 +402,77 @@ class RDFResourceView(RDFView):
     def get_graph(self, request, **kwargs):
         identifier = URIRef(self.get_resource_uri(request, **kwargs))
         pattern = (identifier, None, None)
-        result = graph_from_triples(self.graph().triples(pattern))
-        # TODO: also include related nodes
+        full_graph = self.graph()
+        result = graph_from_triples(full_graph.triples(pattern))
+        if self.expand_depth:
+            result |= self.expand(full_graph, result)
         return result
 
+    def expand(self, full_graph, resource):
+        """ Return the nodes related to the `resource` graph. """
+        related = Graph()
+        predicates = self.expand_predicates
+        if predicates is not None:
+            predicates = list(map(URIRef, predicates))
+        if self.expand_forward:
+            related |= traverse_forward(
+                full_graph, resource, self.expand_depth, predicates=predicates
+            )
+        if self.expand_backward:
+            related |= traverse_backward(
+                full_graph, resource, self.expand_depth, predicates=predicates
+            )
+        return related
+
     def get_resource_uri(self, request, **kwargs):
         return request.build_absolute_uri(request.path)
+
+
+class AsyncRDFView(AsyncViewMixin, RDFView):
+    """
+    Asynchronous version of `RDFView`.
+
+    Override `aget_graph` rather than `get_graph` to compute the graph
+    with coroutines. By default, the graph of `get_graph` is returned
+    as it is, so a graph backed by a SPARQL store is not copied into
+    memory but queried while the response is rendered, in a thread.
+    """
+
+    async def get(self, request, format=None, **kwargs):
+        paginator = self.paginator
+        if paginator is None:
+            return Response(await self.aget_graph(request, **kwargs))
+        page = await sync_to_async(
+            paginator.paginate_graph, thread_sensitive=False
+        )(self.get_graph(request, **kwargs), request)
+        return paginator.get_paginated_response(page)
+
+    async def aget_graph(self, request, **kwargs):
+        return self.get_graph(request, **kwargs)
+
+
+class AsyncRDFResourceView(AsyncViewMixin, RDFResourceView):
+    """ Asynchronous version of `RDFResourceView`. """
+
+    async def get(self, request, format=None, **kwargs):
+        data = await self.aget_graph(request, **kwargs)
+        if len(data) == 0:
+            raise NotFound()
+        return Response(data)
+
+    async def aget_graph(self, request, **kwargs):
+        identifier = URIRef(self.get_resource_uri(request, **kwargs))
+        graph = self.graph()
+        if not is_sparql_graph(graph):
+            return await sync_to_async(
+                self.get_graph, thread_sensitive=False
+            )(request, **kwargs)
+        results = await query_graph(graph, RESOURCE_QUERY.format(
+            graph.store.node_to_sparql(identifier)
+        ))
+        result = results.graph
+        if self.expand_depth:
+            result |= await sync_to_async(
+                self.expand, thread_sensitive=False
+            )(graph, result)
+        return result
@@ -0,0 +1,257 @@
+import asyncio
+import json
+from time import time
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.exceptions import ImproperlyConfigured
+from rdflib import BNode, Graph, Literal, URIRef
+from rest_framework.test import APIRequestFactory
+
+from . import views
+from .asgi import CancelOnDisconnect
+from .connection import PooledSPARQLStore
+from .ns import HYDRA, OA, RDF, RDFS, SCHEMA
+from .renderers import NTriplesRenderer, TurtleRenderer
+from .conftest import ITEM
+from .pagination import GraphPagination
+from .utils import append_triples, graph_from_triples
+from .views import (AsyncRDFResourceView, AsyncRDFView, BulkCreateMixin,
+                    RDFResourceView, RDFView)
+
+
+def make_view(graph, *bases, **attributes):
+    """ A view of `bases` (default `RDFView`) over `graph`, unless None. """
+    if graph is not None:
+        attributes['graph'] = staticmethod(lambda: graph)
+    return type('TestView', bases or (RDFView,), attributes).as_view()
+
+
+def test_streaming(filled_graph):
+    view = make_view(
+        filled_graph, streaming=True,
+        renderer_classes=(TurtleRenderer, NTriplesRenderer),
+    )
+    request = APIRequestFactory().get('/', HTTP_ACCEPT='application/n-triples')
+    response = view(request)
+    assert response.streaming
+    assert response['Content-Type'] == 'application/n-triples; charset=utf-8'
+    content = b''.join(response.streaming_content)
+    parsed = Graph().parse(data=content, format='nt')
+    assert len(parsed ^ filled_graph) == 0
+
+
+def test_not_streaming(filled_graph):
+    view = make_view(filled_graph)
+    response = view(APIRequestFactory().get('/')).render()
+    assert not response.streaming
+    parsed = Graph().parse(data=response.content, format='turtle')
+    assert len(parsed ^ filled_graph) == 0
+
+
+def test_resource_expansion(items, local_store):
+    local = graph_from_triples(items)
+    remote = Graph(local_store, identifier=ITEM['graph'])
+    append_triples(remote, items)
+    factory = APIRequestFactory()
+
+    def resource_graph(graph, **attributes):
+        view = make_view(
+            graph, RDFResourceView,
+            get_resource_uri=lambda self, request, **kwargs: ITEM['5'],
+            **attributes
+        )
+        response = view(factory.get('/')).render()
+        return Graph().parse(data=response.content, format='turtle')
+
+    for graph in (local, remote):
+        local_store.reset_log()
+        assert len(resource_graph(graph)) == 6
+        selectors = resource_graph(
+            graph, expand_depth=1, expand_predicates=[str(OA.hasSelector)],
+        )
+        assert set(selectors.subjects()) == {ITEM['5'], ITEM['1'], ITEM['4']}
+        assert len(selectors) == 17
+        both = resource_graph(graph, expand_depth=2, expand_backward=True)
+        # Item 6 is only linked from item 7, which is found backward.
+        assert set(both.subjects()) == {
+            ITEM['1'], ITEM['4'], ITEM['5'], ITEM['7'],
+        }
+    # One query per resource lookup, then one per level and direction.
+    assert local_store._queries == 3 + 1 + 2 + 2
+
+
+def test_conditional_get(items, local_store, monkeypatch):
+    graph = Graph(local_store, identifier=ITEM['graph'])
+    append_triples(graph, items)
+    view = make_view(graph, conditional=True, cache_control={'max_age': 60})
+    factory = APIRequestFactory()
+    response = view(factory.get('/')).render()
+    assert response.status_code == 200
+    assert response['Cache-Control'] == 'max-age=60'
+    assert 'Accept' in response['Vary']
+    etag = response['ETag']
+    local_store.reset_log()
+    response = view(factory.get('/', HTTP_IF_NONE_MATCH=etag))
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+    assert local_store.round_trips == 0
+    # The graph may still change within the second of its last change.
+    assert 'Last-Modified' not in response
+    now = time()
+    monkeypatch.setattr(views, 'time', lambda: now + 1)
+    response = view(factory.get('/', HTTP_IF_NONE_MATCH=etag))
+    response = view(factory.get('/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']))
+    assert response.status_code == 304
+    other = view(factory.get('/', HTTP_ACCEPT='text/turtle')).render()
+    assert other['ETag'] != etag
+    append_triples(graph, [(ITEM['8'], RDF.type, OA.Annotation)])
+    response = view(factory.get('/', HTTP_IF_NONE_MATCH=etag)).render()
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+
+def test_conditional_get_graph(items):
+    graph = graph_from_triples(items)
+    view = make_view(
+        None, get_graph=lambda self, request, **kwargs: graph, conditional=True,
+    )
+    factory = APIRequestFactory()
+    response = view(factory.get('/')).render()
+    assert response.status_code == 200
+    etag = response['ETag']
+    assert view(factory.get('/', HTTP_IF_NONE_MATCH=etag)).status_code == 304
+    # Without a `graph`, any change of any graph changes the version.
+    other = Graph(identifier=ITEM['other'])
+    append_triples(other, [(ITEM['8'], RDF.type, OA.Annotation)])
+    assert view(factory.get('/', HTTP_IF_NONE_MATCH=etag)).status_code == 200
+
+
+def test_pagination(items, local_store):
+    local = graph_from_triples(items)
+    remote = Graph(local_store, identifier=ITEM['graph'])
+    append_triples(remote, items)
+    subjects = sorted(set(local.subjects()))
+    # Blank node subjects are not paged.
+    blank = (BNode(), RDFS.label, Literal('blank'))
+    local.add(blank)
+    local_store.dataset.get_context(ITEM['graph']).add(blank)
+    factory = APIRequestFactory()
+    for graph in (local, remote):
+        view = make_view(graph, pagination_class=GraphPagination)
+        served = set()
+        for number in range(1, len(subjects) // 3 + 2):
+            response = view(factory.get('/', {'page_size': 3, 'page': number}))
+            page = Graph().parse(data=response.render().content, format='turtle')
+            served |= set(page.subjects()) & set(subjects)
+            assert Literal('blank') not in set(page.objects())
+        assert served == set(subjects)
+        response = view(factory.get('/', {'page_size': 3})).render()
+        assert response.status_code == 200
+        assert 'rel="next"' in response['Link']
+        assert 'rel="prev"' not in response['Link']
+        page = Graph().parse(data=response.content, format='turtle')
+        view_node = URIRef('http://testserver/?page_size=3')
+        assert (view_node, RDF.type, HYDRA.PartialCollectionView) in page
+        assert page.value(view_node, HYDRA.next) == URIRef(
+            'http://testserver/?page=2&page_size=3'
+        )
+        collection = page.value(predicate=HYDRA.view, object=view_node)
+        assert set(page.subjects()) - {view_node, collection} == set(subjects[:3])
+        last = len(subjects) // 3 + 1
+        response = view(factory.get('/', {'page_size': 3, 'page': last})).render()
+        assert 'rel="next"' not in response['Link']
+        assert 'rel="prev"' in response['Link']
+        page = Graph().parse(data=response.content, format='turtle')
+        assert set(page.subjects(RDF.type, OA.Annotation)) <= set(subjects[3 * (last - 1):])
+        assert view(factory.get('/', {'page': last + 1})).status_code == 404
+        assert view(factory.get('/', {'page': 'x'})).status_code == 404
+
+
+def test_bulk_create(counter_table):
+    graph = Graph()
+    view = make_view(
+        graph, BulkCreateMixin, RDFView, counter_class=counter_table,
+    )
+    body = json.dumps({
+        '@context': {'oa': str(OA)},
+        '@id': '_:annotation',
+        '@type': 'oa:Annotation',
+        'oa:hasTarget': {'@id': str(ITEM['1'])},
+    })
+    factory = APIRequestFactory()
+    request = factory.post('/', body, content_type='application/ld+json')
+    response = view(request).render()
+    assert response.status_code == 201
+    created = URIRef('http://example.com/thing/2')
+    assert response['Location'] == str(created)
+    assert set(graph) == {
+        (created, RDF.type, OA.Annotation),
+        (created, OA.hasTarget, ITEM['1']),
+    }
+    parsed = Graph().parse(data=response.content, format='turtle')
+    assert len(parsed ^ graph) == 0
+    empty = factory.post('/', '{}', content_type='application/ld+json')
+    assert view(empty).status_code == 400
+    unconfigured = make_view(graph, BulkCreateMixin, RDFView)
+    request = factory.post('/', body, content_type='application/ld+json')
+    with pytest.raises(ImproperlyConfigured):
+        unconfigured(request)
+
+
+def test_async_views(local_endpoint):
+    identifier = URIRef('http://testserver/item')
+    graph_id = URIRef('http://example.com/g')
+    local_endpoint.dataset.get_context(graph_id).add(
+        (identifier, RDF.type, SCHEMA.Thing)
+    )
+    local_endpoint.dataset.get_context(graph_id).add(
+        (SCHEMA.Thing, RDF.type, RDFS.Class)
+    )
+    store = PooledSPARQLStore(local_endpoint.url)
+    graph = Graph(store, identifier=graph_id)
+    factory = APIRequestFactory()
+
+    view = make_view(graph, AsyncRDFView)
+    assert asyncio.iscoroutinefunction(view)
+    response = async_to_sync(view)(factory.get('/')).render()
+    assert len(Graph().parse(data=response.content, format='turtle')) == 2
+    # The whole graph is not copied, but rendered through the store.
+    queries = store._queries
+    assert queries > 0
+
+    resource_view = make_view(graph, AsyncRDFResourceView)
+    response = async_to_sync(resource_view)(factory.get('/item')).render()
+    parsed = Graph().parse(data=response.content, format='turtle')
+    assert list(parsed) == [(identifier, RDF.type, SCHEMA.Thing)]
+    response = async_to_sync(resource_view)(factory.get('/other')).render()
+    assert response.status_code == 404
+    assert store._queries == queries
+
+
+def test_cancel_on_disconnect():
+    cancelled = []
+
+    async def app(scope, receive, send):
+        await receive()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    messages = [
+        {'type': 'http.request', 'body': b'', 'more_body': False},
+        {'type': 'http.disconnect'},
+    ]
+
+    async def receive():
+        if len(messages) == 1:
+            await asyncio.sleep(0.05)
+        return messages.pop(0)
+
+    async def send(message):
+        pass
+
+    asyncio.run(CancelOnDisconnect(app)({'type': 'http'}, receive, send))
+    assert cancelled == [True]
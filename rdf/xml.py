@@ -0,0 +1,102 @@
+"""
+Removal of characters that XML 1.0 does not allow.
+
+Literals in a triplestore may contain control characters and other
+code points that cannot occur in an XML document, which would make
+RDF/XML and SPARQL XML results unparseable. `XMLSanitizer` replaces
+them by spaces while the output is written, so no cleaned copy of the
+graph or the results is needed.
+"""
+
+import re
+import sys
+
+from rdflib import Literal
+
+from .ns import XSD
+
+# via http://stackoverflow.com/questions/1707890/fast-way-to-filter-illegal-xml-unicode-chars-in-python
+ILLEGAL_UNICHRS = [
+    (0x00, 0x08), (0x0B, 0x1F), (0x7F, 0x84), (0x86, 0x9F),
+    (0xD800, 0xDFFF), (0xFDD0, 0xFDDF), (0xFFFE, 0xFFFF),
+    (0x1FFFE, 0x1FFFF), (0x2FFFE, 0x2FFFF), (0x3FFFE, 0x3FFFF),
+    (0x4FFFE, 0x4FFFF), (0x5FFFE, 0x5FFFF), (0x6FFFE, 0x6FFFF),
+    (0x7FFFE, 0x7FFFF), (0x8FFFE, 0x8FFFF), (0x9FFFE, 0x9FFFF),
+    (0xAFFFE, 0xAFFFF), (0xBFFFE, 0xBFFFF), (0xCFFFE, 0xCFFFF),
+    (0xDFFFE, 0xDFFFF), (0xEFFFE, 0xEFFFF), (0xFFFFE, 0xFFFFF),
+    (0x10FFFE, 0x10FFFF)
+]
+ILLEGAL_RANGES = ["%s-%s" % (chr(low), chr(high))
+                  for (low, high) in ILLEGAL_UNICHRS if low < sys.maxunicode]
+
+ILLEGAL_XML_RE = re.compile(u'[%s]' % u''.join(ILLEGAL_RANGES))
+# The part of ILLEGAL_XML_RE that can match ASCII text.
+ILLEGAL_ASCII_RE = re.compile('[\x00-\x08\x0b-\x1f\x7f]')
+
+CLEANABLE_DATATYPES = (None, XSD.string, XSD.normalizedString)
+
+# Number of distinct unclean strings that an XMLSanitizer remembers.
+DEFAULT_MEMO_SIZE = 10000
+
+
+def clean_xml_text(text):
+    """ `text` with the characters that XML does not allow replaced by spaces. """
+    # Printable strings contain no control, surrogate or unassigned
+    # characters, so they are clean.
+    if text.isprintable():
+        return text
+    pattern = ILLEGAL_ASCII_RE if text.isascii() else ILLEGAL_XML_RE
+    return pattern.sub(' ', text)
+
+
+def is_cleanable(term):
+    return isinstance(term, Literal) and term.datatype in CLEANABLE_DATATYPES
+
+
+class XMLSanitizer:
+    """
+    Clean strings and literals for XML output.
+
+    Strings that need cleaning are remembered, up to `memo_size` of
+    them, so repeated values are cleaned once. Only string literals
+    (plain, xsd:string and xsd:normalizedString) are cleaned.
+    """
+
+    def __init__(self, memo_size=DEFAULT_MEMO_SIZE):
+        self.memo = {}
+        self.memo_size = memo_size
+
+    def clean_text(self, text):
+        if text.isprintable():
+            return text
+        key = str(text)
+        cleaned = self.memo.get(key)
+        if cleaned is None:
+            cleaned = clean_xml_text(key)
+            # Clean text, such as text with line breaks, is not remembered.
+            if cleaned == key:
+                return text
+            if len(self.memo) >= self.memo_size:
+                self.memo.clear()
+            self.memo[key] = cleaned
+        return cleaned
+
+    def clean_literal(self, literal):
+        """ `literal`, or a copy of it without characters that XML does not allow. """
+        if literal.datatype not in CLEANABLE_DATATYPES:
+            return literal
+        text = self.clean_text(literal)
+        if text is literal or text == str(literal):
+            return literal
+        return Literal(text, lang=literal.language, datatype=literal.datatype)
+
+    def triples(self, triples):
+        """ Generate `triples` with their literal objects cleaned. """
+        clean = self.clean_literal
+        for triple in triples:
+            object = triple[2]
+            if isinstance(object, Literal):
+                cleaned = clean(object)
+                if cleaned is not object:
+                    triple = (triple[0], triple[1], cleaned)
+            yield triple
@@ -0,0 +1,48 @@
+from rdflib import Literal, URIRef
+
+from .ns import XSD
+from .xml import XMLSanitizer, clean_xml_text
+
+SUBJECT = URIRef('http://example.com/s')
+PREDICATE = URIRef('http://example.com/p')
+
+
+def test_clean_xml_text():
+    clean = 'plain ascii\twith tabs\nand newlines'
+    assert clean_xml_text(clean) == clean
+    assert clean_xml_text('bell\x07 and escape\x1b') == 'bell  and escape '
+    assert clean_xml_text('ünï\x85cödé￾') == 'ünï\x85cödé '
+    assert clean_xml_text('carriage\rreturn') == 'carriage return'
+
+
+def test_sanitizer_literals():
+    sanitizer = XMLSanitizer(memo_size=2)
+    printable = Literal('nothing to clean', lang='en')
+    assert sanitizer.clean_literal(printable) is printable
+    dirty = Literal('a\x00b', lang='en')
+    cleaned = sanitizer.clean_literal(dirty)
+    assert cleaned == Literal('a b', lang='en')
+    assert 'a\x00b' in sanitizer.memo
+    typed = Literal('a\x00b', datatype=XSD.string)
+    assert sanitizer.clean_literal(typed) == Literal('a b', datatype=XSD.string)
+    other = Literal('1\x00', datatype=XSD.hexBinary)
+    assert sanitizer.clean_literal(other) is other
+    sanitizer.clean_text('c\x01')
+    sanitizer.clean_text('d\x02')
+    assert len(sanitizer.memo) <= 2
+    sanitizer.memo.clear()
+    lines = Literal('first line\nsecond line', lang='en')
+    assert sanitizer.clean_literal(lines) is lines
+    assert sanitizer.memo == {}
+
+
+def test_sanitizer_triples():
+    triples = [
+        (SUBJECT, PREDICATE, Literal('clean')),
+        (SUBJECT, PREDICATE, Literal('dirty\x0b')),
+        (SUBJECT, PREDICATE, URIRef('http://example.com/o')),
+    ]
+    cleaned = list(XMLSanitizer().triples(triples))
+    assert cleaned[0] is triples[0]
+    assert cleaned[1] == (SUBJECT, PREDICATE, Literal('dirty '))
+    assert cleaned[2] is triples[2]
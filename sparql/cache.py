@@ -0,0 +1,179 @@
+"""
+Caches for rendered SPARQL query results.
+
+A cache is enabled by setting the `query_cache` attribute of a
+`SPARQLQueryAPIView` subclass to an instance of one of the classes
+below. Entries are keyed on the normalized query text, the identifier
+of the view's graph (see `rdf.utils.graph_identifier`; None for views
+over all graphs) and the negotiated media type. Caches listen to the
+`rdf.signals.graph_changed` signal, so they drop the entries of a graph
+as soon as it is changed through `rdf.utils` or a SPARQL update view.
+As in `rdf.versions`, a change of any graph drops the entries of views
+over all graphs, and a change through a conjunctive graph drops all
+entries.
+Changes that bypass these code paths are not noticed; set a `timeout`
+to bound the staleness of such entries.
+"""
+
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+from time import monotonic
+
+from django.core.cache import caches
+from rdf.signals import graph_changed
+from rdf.versions import ANY, WILDCARD
+
+from .constants import WHITESPACE_PATTERN
+
+
+def graph_name(identifier):
+    ''' Name of graph `identifier` in cache keys; ANY for all graphs. '''
+    return ANY if identifier is None else str(identifier)
+
+
+def normalize_query(query):
+    ''' Collapse whitespace and drop comments outside literals and IRIs. '''
+    return WHITESPACE_PATTERN.sub(
+        lambda match: match.group(1) or ' ', query
+    ).strip()
+
+
+class QueryCache:
+    '''
+    Base class for query result caches.
+
+    Subclasses implement `get`, `set` and `invalidate`. Cached values
+    are opaque to the cache; `SPARQLQueryAPIView` stores the query
+    type together with the rendered response body.
+    '''
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        graph_changed.connect(self.on_graph_changed)
+
+    def make_key(self, query, identifier, media_type):
+        return (normalize_query(query), graph_name(identifier), media_type)
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def invalidate(self, identifier=None):
+        '''
+        Drop the entries of graph `identifier` and those of views over
+        all graphs. If `identifier` is None, drop all entries.
+        '''
+        raise NotImplementedError
+
+    def on_graph_changed(self, sender, identifier=None, **kwargs):
+        self.invalidate(identifier)
+
+
+class LocalQueryCache(QueryCache):
+    '''
+    In-process cache with least-recently-used eviction.
+
+    At most `max_entries` results are kept, each for at most `timeout`
+    seconds (forever if None). Every process has its own copy.
+    '''
+
+    def __init__(self, max_entries=256, timeout=None):
+        super().__init__(timeout)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = None
+        if self.timeout is not None:
+            expires = monotonic() + self.timeout
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, identifier=None):
+        with self._lock:
+            if identifier is None:
+                self._entries.clear()
+                return
+            names = (graph_name(identifier), ANY)
+            for key in [k for k in self._entries if k[1] in names]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoQueryCache(QueryCache):
+    '''
+    Cache in one of the backends from the CACHES setting.
+
+    This allows sharing cached results between processes. Rather than
+    deleting entries, invalidation increments a generation counter that
+    is part of every key; the backend's own eviction removes the stale
+    entries. Eviction and size limits are configured on the backend.
+    '''
+
+    def __init__(self, alias='default', timeout=None, key_prefix='sparql-query'):
+        super().__init__(timeout)
+        self.alias = alias
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def generation_key(self, name):
+        return '{}:generation:{}'.format(
+            self.key_prefix, sha1(name.encode()).hexdigest()
+        )
+
+    def generations(self, identifier):
+        # Like the counters of rdf.versions.GraphVersions.
+        if identifier is None:
+            names = [ANY]
+        else:
+            names = [WILDCARD, str(identifier)]
+        keys = [self.generation_key(name) for name in names]
+        values = self.cache.get_many(keys)
+        return '.'.join(str(values.get(key, 0)) for key in keys)
+
+    def make_key(self, query, identifier, media_type):
+        digest = sha1('\n'.join(
+            super().make_key(query, identifier, media_type)
+        ).encode()).hexdigest()
+        return '{}:{}:{}'.format(
+            self.key_prefix, self.generations(identifier), digest
+        )
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def invalidate(self, identifier=None):
+        for name in (ANY, WILDCARD if identifier is None else str(identifier)):
+            key = self.generation_key(name)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, 0, None)
+                self.cache.incr(key)
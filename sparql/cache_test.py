@@ -0,0 +1,160 @@
+import json
+
+import pytest
+from rdf.ns import RDF, SCHEMA
+from rdf.utils import append_triples, graph_from_triples, prune_triples
+from rdf.versions import graph_versions
+from rdflib import ConjunctiveGraph, Graph, Literal, URIRef
+from rest_framework.test import APIRequestFactory
+
+from .cache import DjangoQueryCache, LocalQueryCache, normalize_query
+from .views import SPARQLQueryAPIView
+
+ITEM = URIRef('http://example.com/item')
+SELECT_QUERY = 'SELECT ?s WHERE { ?s ?p ?o }'
+
+
+@pytest.fixture(params=[LocalQueryCache, DjangoQueryCache])
+def query_cache(request):
+    cache = request.param()
+    cache.invalidate()
+    return cache
+
+
+def test_normalize_query():
+    query = '''
+        SELECT ?s  # subjects
+        WHERE { ?s <http://x/a#b>   "a  # b" ; ?p \'\'\'multi
+            line\'\'\' }
+    '''
+    assert normalize_query(query) == (
+        'SELECT ?s WHERE { ?s <http://x/a#b> "a  # b" ; ?p \'\'\'multi\n'
+        '            line\'\'\' }'
+    )
+
+
+def test_cache_key(query_cache):
+    key = query_cache.make_key(SELECT_QUERY, 'g', 'text/csv')
+    spaced = query_cache.make_key(
+        'SELECT ?s\nWHERE {\n    ?s ?p ?o\n}', 'g', 'text/csv'
+    )
+    assert key == spaced
+    assert key != query_cache.make_key(SELECT_QUERY, 'h', 'text/csv')
+    assert key != query_cache.make_key(SELECT_QUERY, 'g', 'text/turtle')
+
+
+def test_cache_invalidate(query_cache):
+    key_g = query_cache.make_key(SELECT_QUERY, 'g', 'text/csv')
+    key_h = query_cache.make_key(SELECT_QUERY, 'h', 'text/csv')
+    query_cache.set(key_g, 'g')
+    query_cache.set(key_h, 'h')
+    assert query_cache.get(key_g) == 'g'
+    query_cache.invalidate('g')
+    assert query_cache.get(query_cache.make_key(SELECT_QUERY, 'g', 'text/csv')) is None
+    key_h = query_cache.make_key(SELECT_QUERY, 'h', 'text/csv')
+    assert query_cache.get(key_h) == 'h'
+    query_cache.invalidate()
+    assert query_cache.get(query_cache.make_key(SELECT_QUERY, 'h', 'text/csv')) is None
+
+
+def test_temporary_graphs(query_cache):
+    key = query_cache.make_key(SELECT_QUERY, None, 'text/csv')
+    query_cache.set(key, 'all')
+    version = graph_versions.version(None)
+    graph_from_triples(((ITEM, RDF.type, SCHEMA.Thing),))
+    assert graph_versions.version(None) == version
+    key = query_cache.make_key(SELECT_QUERY, None, 'text/csv')
+    assert query_cache.get(key) == 'all'
+
+
+def test_local_cache_eviction():
+    cache = LocalQueryCache(max_entries=2)
+    for value in 'abc':
+        cache.set(value, value)
+    assert len(cache) == 2
+    assert cache.get('a') is None
+    assert cache.get('c') == 'c'
+
+
+def test_local_cache_timeout():
+    cache = LocalQueryCache(timeout=-1)
+    cache.set('a', 'a')
+    assert cache.get('a') is None
+
+
+def make_view(graph, cache):
+    executed = []
+
+    class View(SPARQLQueryAPIView):
+        query_cache = cache
+
+        def graph(self):
+            return graph
+
+        def execute_query(self, querystring):
+            executed.append(querystring)
+            return super().execute_query(querystring)
+
+    return View.as_view(), executed
+
+
+def test_cached_view(query_cache):
+    # Changes of temporary graphs with a blank node identifier are ignored.
+    graph = Graph(identifier=URIRef('http://example.com/graph'))
+    graph.add((ITEM, RDF.type, SCHEMA.Thing))
+    view, executed = make_view(graph, query_cache)
+    factory = APIRequestFactory()
+
+    def get(query, accept='application/sparql-results+json'):
+        return view(factory.get('/', {'query': query}, HTTP_ACCEPT=accept))
+
+    first = get(SELECT_QUERY)
+    second = get(' SELECT ?s\tWHERE { ?s ?p ?o } ')
+    assert len(executed) == 1
+    assert first.content == second.content
+    assert second['content-type'] == 'application/sparql-results+json'
+    bindings = json.loads(second.content)['results']['bindings']
+    assert bindings == [{'s': {'type': 'uri', 'value': str(ITEM)}}]
+
+    # Different media type and query type miss the cache.
+    assert get(SELECT_QUERY, 'text/csv')['content-type'].startswith('text/csv')
+    construct = get('CONSTRUCT WHERE { ?s ?p ?o }', 'text/turtle, */*')
+    assert len(executed) == 3
+    assert len(Graph().parse(data=construct.content, format='turtle')) == 1
+    get('CONSTRUCT WHERE { ?s ?p ?o }', 'text/turtle, */*')
+    assert len(executed) == 3
+
+    # Changes made through rdf.utils invalidate the results.
+    append_triples(graph, ((ITEM, SCHEMA.name, Literal('item')),))
+    get(SELECT_QUERY)
+    assert len(executed) == 4
+    prune_triples(graph, ((ITEM, SCHEMA.name, Literal('item')),))
+    get(SELECT_QUERY)
+    assert len(executed) == 5
+
+
+def test_cached_conjunctive_view(query_cache):
+    store = graph_from_triples(((ITEM, RDF.type, SCHEMA.Thing),)).store
+    named = Graph(store, identifier=URIRef('http://example.com/graph'))
+    view, executed = make_view(None, query_cache)
+    view.cls.graph = lambda self: ConjunctiveGraph(store)
+    factory = APIRequestFactory()
+
+    def get():
+        return view(factory.get('/', {'query': SELECT_QUERY}))
+
+    get()
+    get()
+    # Every ConjunctiveGraph has a new identifier, but the view still hits.
+    assert len(executed) == 1
+    # A change of a named graph is a change of the view's graph.
+    append_triples(named, ((ITEM, SCHEMA.name, Literal('item')),))
+    get()
+    assert len(executed) == 2
+    # A change through a conjunctive graph may affect any other graph.
+    key = query_cache.make_key(SELECT_QUERY, 'g', 'text/csv')
+    query_cache.set(key, 'g')
+    prune_triples(ConjunctiveGraph(store), ((ITEM, SCHEMA.name, Literal('item')),))
+    assert query_cache.get(query_cache.make_key(SELECT_QUERY, 'g', 'text/csv')) is None
+    get()
+    assert len(executed) == 3
@@ -6,7 +6,7 @@ from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
 from rdf.ns import RDF, SCHEMA
 from rdf.utils import graph_from_triples
 from rdflib import Literal
-from rdf.conftest import sparqlstore
+from rdf.conftest import local_endpoint, sparqlstore
 from sparql.test_app.graphs import sources_graph as graph
 from sparql.test_app.constants import *
 
@@ -6,9 +6,43 @@ from django.conf import settings
 # TODO: wiki reference
 UPDATE_NOT_SUPPORTED = ['Load', 'Clear',
                         'Drop', 'Add', 'Move', 'Copy', 'Create']
+# Matches the keywords only, not prefixed names or variables. Apply it
+# to updates without literals, IRIs and comments (see sparql.utils).
 UPDATE_NOT_SUPPORTED_PATTERN = re.compile(
-    '|'.join(UPDATE_NOT_SUPPORTED), re.IGNORECASE)
+    r'(?<![\w:?$.-])({})(?![\w:-])'.format('|'.join(UPDATE_NOT_SUPPORTED)),
+    re.IGNORECASE)
 
-BLANK_NODE_PATTERN = re.compile(r'\[.*\]|_:')
+# Query forms, solution slices and VALUES clauses. Apply them to
+# queries without literals, IRIs and comments.
+QUERY_FORM_PATTERN = re.compile(
+    r'(?<![\w:?$.-])(SELECT|CONSTRUCT|DESCRIBE|ASK)(?![\w:-])', re.IGNORECASE)
+SLICE_PATTERN = re.compile(
+    r'(?<![\w:?$.-])(LIMIT|OFFSET)\s+(\d+)', re.IGNORECASE)
+VALUES_PATTERN = re.compile(r'(?<![\w:?$.-])VALUES(?![\w:-])', re.IGNORECASE)
+
+# Blank node property lists and labels. Apply it to updates without
+# literals, IRIs and comments.
+BLANK_NODE_PATTERN = re.compile(r'\[|_:')
+
+# String literals and IRI references: the parts of a SPARQL string in
+# which keywords and whitespace carry no syntactic meaning.
+LITERAL_OR_IRI_PATTERN = (
+    r'"""(?:[^"\\]|\\.|"(?!""))*"""'
+    r"|'''(?:[^'\\]|\\.|'(?!''))*'''"
+    r'|"(?:[^"\\\n]|\\.)*"'
+    r"|'(?:[^'\\\n]|\\.)*'"
+    r'|<[^<>"{}|^`\\\s]*>'
+)
+COMMENT_PATTERN = r'#[^\n]*'
+# Insignificant whitespace and comments, or (group 1) a literal or IRI.
+WHITESPACE_PATTERN = re.compile(r'({})|(?:\s|{})+'.format(
+    LITERAL_OR_IRI_PATTERN, COMMENT_PATTERN
+))
+
+# Number of update validation verdicts kept by sparql.utils.update_verdict.
+UPDATE_VERDICT_CACHE_SIZE = getattr(settings, 'SPARQL_UPDATE_VERDICT_CACHE_SIZE', 1024)
+
+# Number of query cost estimates kept by sparql.cost.estimate_query_cost.
+QUERY_COST_CACHE_SIZE = 1024
 
 SPARQL_NS = '{}/sparql'.format(settings.RDF_NAMESPACE_ROOT)
@@ -0,0 +1,171 @@
+"""
+Static cost estimates of SPARQL queries.
+
+`estimate_query_cost` translates a query to SPARQL algebra and scores
+it without running it. The score is a rough, relative measure of the
+number of intermediate solutions that a store may have to produce:
+
+- a triple pattern scores VARIABLE_COST to the power of the number of
+  its positions that are unbound; a property path with `*` or `+`
+  counts as unbound, so `?s ?p ?o` scores far higher than
+  `?s rdf:type ex:Thing`;
+- patterns and groups that share a variable are joined on it, so their
+  scores add up;
+- patterns and groups that share no variable form a cross product, so
+  their scores multiply;
+- the branches of a UNION add up.
+
+A query is bounded if the store can stop early: if it has a LIMIT that
+is not applied to the result of ORDER BY or GROUP BY, which need all
+solutions first. ASK queries are always bounded.
+"""
+
+from functools import lru_cache
+
+from rdflib import Variable
+from rdflib.paths import (AlternativePath, InvPath, MulPath, NegatedPath,
+                          Path, SequencePath, ZeroOrOne)
+from rdflib.plugins.sparql.algebra import translateQuery
+from rdflib.plugins.sparql.parser import parseQuery
+
+from .constants import QUERY_COST_CACHE_SIZE
+
+VARIABLE_COST = 10
+# Nodes below the top-level LIMIT that need all solutions before the
+# first one can be returned.
+BLOCKING_NODES = ('OrderBy', 'Group', 'AggregateJoin')
+
+
+class QueryCost:
+    """ Estimated `score`, `form` and top-level `limit` of a query. """
+
+    def __init__(self, form, score, limit=None, blocking=False):
+        self.form = form
+        self.score = score
+        self.limit = limit
+        self.blocking = blocking
+
+    @property
+    def bounded(self):
+        return self.form == 'ASK' or (
+            self.limit is not None and not self.blocking
+        )
+
+    def __repr__(self):
+        return '<QueryCost {} score={} limit={}>'.format(
+            self.form, self.score, self.limit
+        )
+
+
+def is_unbounded_path(path):
+    """ Whether property `path` may match any number of steps or predicates. """
+    if isinstance(path, MulPath):
+        return path.mod != ZeroOrOne or is_unbounded_path(path.path)
+    if isinstance(path, NegatedPath):
+        return True
+    if isinstance(path, (SequencePath, AlternativePath)):
+        return any(map(is_unbounded_path, path.args))
+    if isinstance(path, InvPath):
+        return is_unbounded_path(path.arg)
+    return False
+
+
+def is_unbound(term):
+    if isinstance(term, Path):
+        return is_unbounded_path(term)
+    return isinstance(term, Variable)
+
+
+def pattern_cost(triple):
+    """ Score and variables of a triple pattern. """
+    variables = {term for term in triple if isinstance(term, Variable)}
+    return VARIABLE_COST ** sum(map(is_unbound, triple)), variables
+
+
+def join_costs(costs):
+    """
+    Score and variables of the join of (score, variables) pairs.
+
+    Pairs that are connected by shared variables are summed; the sums
+    of the unconnected groups are multiplied.
+    """
+    groups = []
+    for score, variables in costs:
+        variables = set(variables)
+        unconnected = []
+        for group_score, group_variables in groups:
+            if group_variables & variables:
+                score += group_score
+                variables |= group_variables
+            else:
+                unconnected.append((group_score, group_variables))
+        groups = unconnected + [(score, variables)]
+    total = 1
+    variables = set()
+    for score, group_variables in groups:
+        total *= score
+        variables |= group_variables
+    return total, variables
+
+
+def algebra_cost(node):
+    """ Score and variables of a node of SPARQL algebra. """
+    name = getattr(node, 'name', None)
+    if name == 'BGP':
+        return join_costs(map(pattern_cost, node.triples))
+    if name in ('Join', 'LeftJoin'):
+        return join_costs((algebra_cost(node.p1), algebra_cost(node.p2)))
+    if name == 'Union':
+        score1, variables1 = algebra_cost(node.p1)
+        score2, variables2 = algebra_cost(node.p2)
+        return score1 + score2, variables1 | variables2
+    if name == 'Minus':
+        score1, variables = algebra_cost(node.p1)
+        return score1 + algebra_cost(node.p2)[0], variables
+    if name == 'Graph':
+        score, variables = algebra_cost(node.p)
+        if isinstance(node.term, Variable):
+            return score * VARIABLE_COST, variables | {node.term}
+        return score, variables
+    if name == 'values':
+        variables = {var for row in node.res for var in row}
+        return max(len(node.res), 1), variables
+    if name is not None and 'p' in node:
+        return algebra_cost(node.p)
+    # Parts that cannot be inspected, such as SERVICE, are unknown.
+    return VARIABLE_COST ** 3, set()
+
+
+def top_level_slice(root):
+    """ The LIMIT of the query with algebra `root` and whether it blocks. """
+    node = root.p
+    if getattr(node, 'name', None) != 'Slice' or node.length is None:
+        return None, False
+    limit = node.length
+    node = node.p
+    while getattr(node, 'name', None) not in (None, 'BGP', 'Join', 'LeftJoin',
+                                               'Union', 'Minus', 'Graph'):
+        if node.name in BLOCKING_NODES:
+            return limit, True
+        node = node.p
+    return limit, False
+
+
+@lru_cache(maxsize=QUERY_COST_CACHE_SIZE)
+def estimate_query_cost(query, namespaces=()):
+    """
+    Estimate the cost of SPARQL `query` and return a QueryCost.
+
+    `namespaces` is a tuple of (prefix, namespace) pairs for prefixes
+    that the query may use without declaring them, for example
+    `tuple(graph.namespaces())`. Queries that fail to parse raise
+    pyparsing's ParseException.
+    """
+    parsed = parseQuery(query)
+    form = parsed[1].name[:-len('Query')].upper()
+    if 'where' not in parsed[1]:
+        # DESCRIBE of constant resources.
+        return QueryCost(form, 1)
+    root = translateQuery(parsed, initNs=dict(namespaces)).algebra
+    limit, blocking = top_level_slice(root)
+    return QueryCost(form, algebra_cost(root.p)[0], limit, blocking)
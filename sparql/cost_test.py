@@ -0,0 +1,46 @@
+import pytest
+from pyparsing import ParseException
+
+from .cost import VARIABLE_COST, estimate_query_cost
+
+NAMESPACES = (('ex', 'http://example.com/'),)
+
+
+def cost(query):
+    return estimate_query_cost(query, NAMESPACES)
+
+
+def test_pattern_scores():
+    assert cost('SELECT * { ?s ?p ?o }').score == VARIABLE_COST ** 3
+    assert cost('SELECT * { ?s a ex:Thing }').score == VARIABLE_COST
+    assert cost('SELECT * { ex:s ?p ex:o }').score == VARIABLE_COST
+    assert cost('SELECT * { ?s ex:p+ ex:o }').score == VARIABLE_COST ** 2
+    assert cost('SELECT * { ?s ex:p? ex:o }').score == VARIABLE_COST
+
+
+def test_joins():
+    joined = cost('SELECT * { ?s a ex:Thing ; ex:name ?name }')
+    assert joined.score == VARIABLE_COST + VARIABLE_COST ** 2
+    crossed = cost('SELECT * { ?s a ex:Thing . ?t a ex:Thing }')
+    assert crossed.score == VARIABLE_COST ** 2
+    union = cost('SELECT * { { ?s a ex:A } UNION { ?s a ex:B } }')
+    assert union.score == 2 * VARIABLE_COST
+    graphs = cost('SELECT * { GRAPH ?g { ?s a ex:Thing } }')
+    assert graphs.score == VARIABLE_COST ** 2
+
+
+def test_bounded():
+    assert not cost('SELECT * { ?s ?p ?o }').bounded
+    limited = cost('SELECT * { ?s ?p ?o } LIMIT 10')
+    assert limited.bounded
+    assert limited.limit == 10
+    assert not cost('SELECT * { ?s ?p ?o } ORDER BY ?o LIMIT 10').bounded
+    assert cost('ASK { ?s ?p ?o }').bounded
+    described = cost('DESCRIBE ex:s')
+    assert described.form == 'DESCRIBE'
+    assert described.score == 1
+
+
+def test_parse_error():
+    with pytest.raises(ParseException):
+        cost('this is no SPARQL query!')
@@ -20,3 +20,21 @@ class UnsupportedUpdateError(ParseError):
 class BlankNodeError(ParseError):
     default_detail = 'Blank nodes are not supported.'
     default_code = 'sparql_blanknode'
+
+
+class QueryCostError(APIException):
+    status_code = 400
+    default_detail = 'The query is too expensive; add a LIMIT or narrow it down.'
+    default_code = 'sparql_query_cost'
+
+
+class ResultSizeError(APIException):
+    status_code = 400
+    default_detail = 'The query has too many results.'
+    default_code = 'sparql_result_size'
+
+
+class QueryTimeoutError(APIException):
+    status_code = 504
+    default_detail = 'The query did not finish in time.'
+    default_code = 'sparql_query_timeout'
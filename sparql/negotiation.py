@@ -1,5 +1,5 @@
-from rdf.renderers import (JsonLdRenderer, NTriplesRenderer, RdfXMLRenderer,
-                           TurtleRenderer)
+from rdf.renderers import (JsonLdRenderer, NQuadsRenderer, NTriplesRenderer,
+                           RdfXMLRenderer, TurtleRenderer)
 from rest_framework.negotiation import DefaultContentNegotiation
 
 from .renderers import (QueryResultsCSVRenderer, QueryResultsJSONRenderer,
@@ -10,7 +10,7 @@ class SPARQLContentNegotiator(DefaultContentNegotiation):
     results_renderers = [QueryResultsJSONRenderer, QueryResultsXMLRenderer,
                          QueryResultsCSVRenderer]
     rdf_renderers = [TurtleRenderer, RdfXMLRenderer,
-                     JsonLdRenderer, NTriplesRenderer]
+                     JsonLdRenderer, NTriplesRenderer, NQuadsRenderer]
     querytype_accepts = {
         'SELECT': results_renderers,
         'ASK': results_renderers,
@@ -1,12 +1,15 @@
+import csv
 import json
 from io import StringIO
+from xml.sax.saxutils import escape, quoteattr
 
-from rdf.ns import HTTP, HTTPSC, RDF
-from rdf.renderers import RDFLibRenderer, TurtleRenderer
-from rdf.utils import graph_from_triples
-from rdflib import BNode, Literal
-from rdflib.plugins.sparql.results.jsonresults import JSONResultSerializer
-from rest_framework.renderers import JSONRenderer
+from rdf.renderers import TurtleRenderer
+from rdf.utils import chunked, graph_from_triples
+from rdf.xml import XMLSanitizer
+from rdflib import BNode, Literal, URIRef
+from rest_framework.renderers import BaseRenderer
+
+SPARQL_RESULTS_NS = 'http://www.w3.org/2005/sparql-results#'
 
 
 class QueryResultsTurtleRenderer(TurtleRenderer):
@@ -16,33 +19,158 @@ class QueryResultsTurtleRenderer(TurtleRenderer):
         results_graph = graph_from_triples(query_results)
         return super().render(results_graph, media_type, renderer_context)
 
+    def render_stream(self, query_results, media_type=None, renderer_context=None):
+        results_graph = graph_from_triples(query_results)
+        return super().render_stream(results_graph, media_type, renderer_context)
+
+
+class QueryResultsRenderer(BaseRenderer):
+    ''' Base class for renderers of SELECT and ASK query results.
+
+    Subclasses implement `render_stream`, which writes the result
+    incrementally: first the header, then the bindings in chunks of
+    `chunk_size` rows. `render` joins the chunks for views that do not
+    stream (see `rdf.views.StreamingMixin`).
+    '''
+    chunk_size = 1000
+
+    def render(self, query_results, media_type=None, renderer_context=None):
+        return b''.join(
+            self.render_stream(query_results, media_type, renderer_context)
+        )
+
+    def render_stream(self, query_results, media_type=None, renderer_context=None):
+        raise NotImplementedError
+
+
+def term_to_json(term):
+    ''' SPARQL Query Results JSON representation of an RDF term. '''
+    if isinstance(term, URIRef):
+        return {'type': 'uri', 'value': str(term)}
+    if isinstance(term, Literal):
+        result = {'type': 'literal', 'value': str(term)}
+        if term.datatype is not None:
+            result['datatype'] = str(term.datatype)
+        if term.language is not None:
+            result['xml:lang'] = term.language
+        return result
+    if isinstance(term, BNode):
+        return {'type': 'bnode', 'value': str(term)}
+    raise ValueError('Unsupported RDF term: {}'.format(term))
 
-class QueryResultsJSONRenderer(JSONRenderer):
+
+def dump_json(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class QueryResultsJSONRenderer(QueryResultsRenderer):
     ''' Renders SPARQL Query Results JSON Format from rdflib query results'''
     media_type = 'application/sparql-results+json'
     format = 'srj'
+    charset = None
+
+    def render_stream(self, query_results, media_type=None, renderer_context=None):
+        if query_results.type == 'ASK':
+            yield dump_json({
+                'head': {}, 'boolean': query_results.askAnswer
+            }).encode()
+            return
+        yield '{{"head":{{"vars":{}}},"results":{{"bindings":['.format(
+            dump_json([str(var) for var in query_results.vars])
+        ).encode()
+        separator = ''
+        for rows in chunked(query_results.bindings, self.chunk_size):
+            yield (separator + ','.join(
+                dump_json({
+                    str(var): term_to_json(term)
+                    for var, term in row.items() if term is not None
+                })
+                for row in rows
+            )).encode()
+            separator = ','
+        yield b']}}'
 
-    def render(self, query_results, media_type=None, renderer_context=None):
-        with StringIO() as stream:
-            JSONResultSerializer(query_results).serialize(stream)
-            json_str = stream.getvalue()
-            serialized_results = json.loads(json_str)
-            return super().render(serialized_results,
-                                  media_type,
-                                  renderer_context)
 
+def term_to_xml(term, sanitizer=None):
+    ''' SPARQL Query Results XML representation of an RDF term.
+    Characters that XML does not allow are removed from literals with
+    `sanitizer` (an `rdf.xml.XMLSanitizer`), if given. '''
+    if isinstance(term, URIRef):
+        return '<uri>{}</uri>'.format(escape(term))
+    if isinstance(term, Literal):
+        if term.language:
+            attribute = ' xml:lang={}'.format(quoteattr(term.language))
+        elif term.datatype:
+            attribute = ' datatype={}'.format(quoteattr(term.datatype))
+        else:
+            attribute = ''
+        if sanitizer is not None:
+            term = sanitizer.clean_literal(term)
+        return '<literal{}>{}</literal>'.format(attribute, escape(term))
+    if isinstance(term, BNode):
+        return '<bnode>{}</bnode>'.format(escape(term))
+    raise ValueError('Unsupported RDF term: {}'.format(term))
 
-class QueryResultsXMLRenderer(RDFLibRenderer):
+
+class QueryResultsXMLRenderer(QueryResultsRenderer):
+    ''' Renders SPARQL Query Results XML Format from rdflib query results'''
     media_type = 'application/sparql-results+xml'
     format = 'xml'
 
-    def render(self, query_results, media_type=None, renderer_context=None):
-        return query_results.serialize(format='xml')
+    def render_stream(self, query_results, media_type=None, renderer_context=None):
+        header = '<?xml version="1.0" encoding="utf-8"?>\n<sparql xmlns={}>'.format(
+            quoteattr(SPARQL_RESULTS_NS)
+        )
+        if query_results.type == 'ASK':
+            yield '{}<head/><boolean>{}</boolean></sparql>\n'.format(
+                header, str(query_results.askAnswer).lower()
+            ).encode()
+            return
+        sanitizer = XMLSanitizer()
+        yield '{}<head>{}</head><results>'.format(header, ''.join(
+            '<variable name={}/>'.format(quoteattr(str(var)))
+            for var in query_results.vars
+        )).encode()
+        for rows in chunked(query_results.bindings, self.chunk_size):
+            yield ''.join(
+                '<result>{}</result>'.format(''.join(
+                    '<binding name={}>{}</binding>'.format(
+                        quoteattr(str(var)), term_to_xml(term, sanitizer)
+                    )
+                    for var, term in row.items() if term is not None
+                ))
+                for row in rows
+            ).encode()
+        yield b'</results></sparql>\n'
+
 
+def term_to_csv(term):
+    if term is None:
+        return ''
+    if isinstance(term, BNode):
+        return '_:{}'.format(term)
+    return str(term)
 
-class QueryResultsCSVRenderer(RDFLibRenderer):
+
+class QueryResultsCSVRenderer(QueryResultsRenderer):
+    ''' Renders SPARQL Query Results CSV Format from rdflib SELECT results'''
     media_type = 'text/csv'
     format = 'csv'
-    rdflib_args = {
-        'format': 'csv'
-    }
+
+    def render_stream(self, query_results, media_type=None, renderer_context=None):
+        if query_results.type != 'SELECT':
+            raise ValueError('Only SELECT query results can be rendered as CSV')
+        variables = query_results.vars
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([str(var) for var in variables])
+        for rows in chunked(query_results.bindings, self.chunk_size):
+            writer.writerows(
+                [term_to_csv(row.get(var)) for var in variables]
+                for row in rows
+            )
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
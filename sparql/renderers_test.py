@@ -0,0 +1,73 @@
+import csv
+from io import BytesIO, StringIO
+
+import pytest
+from rdf.ns import RDF, RDFS
+from rdf.utils import graph_from_triples
+from rdflib import BNode, Literal, URIRef, Variable
+from rdflib.query import Result
+
+from .renderers import (QueryResultsCSVRenderer, QueryResultsJSONRenderer,
+                        QueryResultsXMLRenderer)
+
+SELECT = 'SELECT ?s ?p ?o WHERE { ?s ?p ?o } ORDER BY ?s ?p ?o'
+ASK = 'ASK { ?s a ?o }'
+
+
+@pytest.fixture
+def results_graph():
+    return graph_from_triples((
+        (RDF.type, RDFS.label, Literal('type', lang='en')),
+        (RDF.type, RDFS.comment, Literal('<escaped> & "quoted"')),
+        (RDF.type, RDFS.seeAlso, BNode('b0')),
+        (URIRef('http://example.com/ü'), RDF.value, Literal(42)),
+    ))
+
+
+@pytest.fixture
+def select_results(results_graph):
+    return results_graph.query(SELECT)
+
+
+def parsed_bindings(renderer, results, format):
+    renderer.chunk_size = 2
+    chunks = list(renderer.render_stream(results))
+    assert len(chunks) > 2
+    parsed = Result.parse(BytesIO(b''.join(chunks)), format=format)
+    return [dict(row) for row in parsed.bindings]
+
+
+@pytest.mark.parametrize('renderer_class, format', [
+    (QueryResultsJSONRenderer, 'json'),
+    (QueryResultsXMLRenderer, 'xml'),
+])
+def test_select(renderer_class, format, select_results):
+    parsed = parsed_bindings(renderer_class(), select_results, format)
+    assert parsed == [dict(row) for row in select_results.bindings]
+
+
+@pytest.mark.parametrize('renderer_class, format', [
+    (QueryResultsJSONRenderer, 'json'),
+    (QueryResultsXMLRenderer, 'xml'),
+])
+def test_ask(renderer_class, format, results_graph):
+    rendered = renderer_class().render(results_graph.query(ASK))
+    assert Result.parse(BytesIO(rendered), format=format).askAnswer is False
+
+
+def test_xml_sanitized(results_graph):
+    results_graph.add((RDF.type, RDFS.label, Literal('bell\x07', lang='en')))
+    rendered = QueryResultsXMLRenderer().render(results_graph.query(SELECT))
+    parsed = Result.parse(BytesIO(rendered), format='xml')
+    assert Literal('bell ', lang='en') in [row[Variable('o')] for row in parsed.bindings]
+
+
+def test_csv(select_results):
+    renderer = QueryResultsCSVRenderer()
+    renderer.chunk_size = 3
+    rendered = renderer.render(select_results).decode()
+    rows = list(csv.reader(StringIO(rendered)))
+    assert rows[0] == ['s', 'p', 'o']
+    assert len(rows) == len(select_results) + 1
+    assert ['http://example.com/ü', str(RDF.value), '42'] in rows
+    assert [str(RDF.type), str(RDFS.seeAlso), '_:b0'] in rows
@@ -0,0 +1,14 @@
+"""
+Signals sent by the sparql app.
+
+`update_validated` is sent each time `SPARQLUpdateAPIView` checks an
+update for unsupported operations and blank nodes. Its `duration`
+argument is the time the check took in seconds and `cached` tells
+whether the verdict came from the cache of
+`sparql.utils.update_verdict`. Receivers can use it to record the
+validation latency.
+"""
+
+from django.dispatch import Signal
+
+update_validated = Signal()
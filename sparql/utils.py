@@ -1,50 +1,165 @@
-import sys
 import re
-from rdflib import Literal
-from rdf.ns import XSD
+from functools import lru_cache
+from threading import local
 
-# via http://stackoverflow.com/questions/1707890/fast-way-to-filter-illegal-xml-unicode-chars-in-python
-ILLEGAL_UNICHRS = [
-    (0x00, 0x08), (0x0B, 0x1F), (0x7F, 0x84), (0x86, 0x9F),
-    (0xD800, 0xDFFF), (0xFDD0, 0xFDDF), (0xFFFE, 0xFFFF),
-    (0x1FFFE, 0x1FFFF), (0x2FFFE, 0x2FFFF), (0x3FFFE, 0x3FFFF),
-    (0x4FFFE, 0x4FFFF), (0x5FFFE, 0x5FFFF), (0x6FFFE, 0x6FFFF),
-    (0x7FFFE, 0x7FFFF), (0x8FFFE, 0x8FFFF), (0x9FFFE, 0x9FFFF),
-    (0xAFFFE, 0xAFFFF), (0xBFFFE, 0xBFFFF), (0xCFFFE, 0xCFFFF),
-    (0xDFFFE, 0xDFFFF), (0xEFFFE, 0xEFFFF), (0xFFFFE, 0xFFFFF),
-    (0x10FFFE, 0x10FFFF)
-]
-ILLEGAL_RANGES = ["%s-%s" % (chr(low), chr(high))
-                  for (low, high) in ILLEGAL_UNICHRS if low < sys.maxunicode]
+from rdflib import BNode, Literal
+from rdflib.plugins.sparql.parser import parseUpdate
+from rdflib.plugins.sparql.parserutils import CompValue
+# The XML names are re-exported for code that imported them from here.
+from rdf.xml import (CLEANABLE_DATATYPES, ILLEGAL_RANGES, ILLEGAL_UNICHRS,
+                     ILLEGAL_XML_RE, XMLSanitizer, clean_xml_text,
+                     is_cleanable)
 
-ILLEGAL_XML_RE = re.compile(u'[%s]' % u''.join(ILLEGAL_RANGES))
+from .constants import (BLANK_NODE_PATTERN, LITERAL_OR_IRI_PATTERN,
+                        COMMENT_PATTERN, QUERY_FORM_PATTERN, SLICE_PATTERN,
+                        UPDATE_NOT_SUPPORTED, UPDATE_NOT_SUPPORTED_PATTERN,
+                        UPDATE_VERDICT_CACHE_SIZE, VALUES_PATTERN)
+from .exceptions import BlankNodeError, UnsupportedUpdateError
 
-CLEANABLE_DATATYPES = (None, XSD.string, XSD.normalizedString)
+_sanitizer = XMLSanitizer()
 
 
 def invalid_xml_remove(c):
-    return re.sub(ILLEGAL_XML_RE, ' ', c)
+    return clean_xml_text(c)
 
 
 def find_invalid_xml(c):
-    return re.search(ILLEGAL_XML_RE, c)
-
-
-def is_cleanable(term):
-    return isinstance(term, Literal) and term.datatype in CLEANABLE_DATATYPES
+    return ILLEGAL_XML_RE.search(c)
 
 
 def clean_term(term):
     if not is_cleanable(term):
         return term
-    return Literal(invalid_xml_remove(term.value),
-                   lang=term.language,
-                   datatype=term.datatype)
+    return _sanitizer.clean_literal(term)
 
 
 def xml_sanitize_triple(triple):
-    if any((is_cleanable(term)) for term in triple):
-        cleaned_triple = tuple([clean_term(t) for t in triple])
-        if cleaned_triple != triple:
-            return (True, cleaned_triple)
+    """ Return whether `triple` had to be cleaned and the cleaned triple. """
+    object = triple[2]
+    if isinstance(object, Literal):
+        cleaned = clean_term(object)
+        if cleaned is not object:
+            return (True, (triple[0], triple[1], cleaned))
     return (False, triple)
+
+
+STRIPPABLE_PATTERN = re.compile(
+    '{}|{}'.format(LITERAL_OR_IRI_PATTERN, COMMENT_PATTERN)
+)
+
+
+def strip_literals(sparql):
+    """ Replace the literals, IRIs and comments in `sparql` by a space. """
+    return STRIPPABLE_PATTERN.sub(' ', sparql)
+
+
+def mask_literals(sparql):
+    """ Like `strip_literals`, but keep the positions of the other text. """
+    return STRIPPABLE_PATTERN.sub(lambda match: ' ' * len(match.group()), sparql)
+
+
+def is_top_level(masked, position):
+    """ Whether `position` in masked SPARQL lies outside all groups. """
+    return masked.count('{', 0, position) == masked.count('}', 0, position)
+
+
+def page_query(query, limit, offset):
+    """
+    Restrict SELECT `query` to `limit` solutions, starting at `offset`.
+
+    The page is taken from the solutions that `query` selects with its
+    own LIMIT and OFFSET, if any. Returns None if `query` is not a
+    SELECT query or if it ends with a VALUES clause.
+    """
+    masked = mask_literals(query)
+    forms = [
+        match.group(1).upper() for match in QUERY_FORM_PATTERN.finditer(masked)
+        if is_top_level(masked, match.start())
+    ]
+    if not forms or forms[0] != 'SELECT':
+        return None
+    # Inline VALUES are nested in a group; a trailing one is top-level.
+    if any(is_top_level(masked, match.start())
+           for match in VALUES_PATTERN.finditer(masked)):
+        return None
+    slices = [
+        match for match in SLICE_PATTERN.finditer(masked)
+        if is_top_level(masked, match.start())
+    ]
+    own = {match.group(1).upper(): int(match.group(2)) for match in slices}
+    if 'LIMIT' in own:
+        limit = max(0, min(limit, own['LIMIT'] - offset))
+    for match in reversed(slices):
+        query = query[:match.start()] + query[match.end():]
+    # Start on a new line, in case the query ends with a comment.
+    return '{}\nLIMIT {} OFFSET {}'.format(
+        query.rstrip(), limit, own.get('OFFSET', 0) + offset
+    )
+
+
+def update_part(node, name):
+    """ Child `name` of a node of a parsed update, or None. """
+    # CompValue.get returns the name itself for missing children.
+    if isinstance(node, CompValue) and name in node:
+        return node[name]
+    return None
+
+
+def update_quads(operation):
+    """ Quad templates in a parsed update operation. """
+    for clause in (operation, update_part(operation, 'delete'),
+                   update_part(operation, 'insert')):
+        quads = update_part(clause, 'quads')
+        if quads is not None:
+            yield quads
+
+
+def template_triples(quads):
+    """ Triples of a quad template, including those in GRAPH blocks. """
+    yield from update_part(quads, 'triples') or ()
+    for block in update_part(quads, 'quadsNotTriples') or ():
+        yield from update_part(block, 'triples') or ()
+
+
+def contains_blank_nodes(operation):
+    return any(
+        isinstance(term, BNode)
+        for quads in update_quads(operation)
+        for triple in template_triples(quads)
+        for term in triple
+    )
+
+
+_validation = local()
+
+
+def update_verdict(updatestring):
+    """
+    Check a SPARQL update for unsupported operations and blank nodes.
+
+    Returns a pair of the exception that the update should be rejected
+    with (None if it is fine) and whether the verdict was cached.
+    Cheap regular expressions decide whether the update needs to be
+    parsed at all; if so, it is parsed once. Verdicts are kept in an
+    LRU cache of UPDATE_VERDICT_CACHE_SIZE entries. Updates that fail
+    to parse raise pyparsing's ParseException and are not cached.
+    """
+    _validation.computed = False
+    verdict = _update_verdict(updatestring)
+    return verdict, not _validation.computed
+
+
+@lru_cache(maxsize=UPDATE_VERDICT_CACHE_SIZE)
+def _update_verdict(updatestring):
+    _validation.computed = True
+    stripped = strip_literals(updatestring)
+    unsupported = UPDATE_NOT_SUPPORTED_PATTERN.search(stripped)
+    blank = BLANK_NODE_PATTERN.search(stripped)
+    if not (unsupported or blank):
+        return None
+    operations = parseUpdate(updatestring).request
+    if any(part.name in UPDATE_NOT_SUPPORTED for part in operations):
+        return UnsupportedUpdateError('Update operation is not supported.')
+    if blank and any(map(contains_blank_nodes, operations)):
+        return BlankNodeError()
+    return None
@@ -1,4 +1,10 @@
-from .utils import invalid_xml_remove
+from rdflib.plugins.sparql.parser import parseUpdate
+
+from . import utils
+from .exceptions import BlankNodeError, UnsupportedUpdateError
+from .signals import update_validated
+from .utils import invalid_xml_remove, page_query, update_verdict
+from .views import SPARQLUpdateAPIView
 
 INVALID_STR = '''La trilogie a en eet
 comptabilisé plus de 26 millions de vente.'''
@@ -12,3 +18,88 @@ def test_xml_sanitize():
     assert INVALID_STR[18] == chr(0x1b) == '\x1b'
     sanitized_str = invalid_xml_remove(INVALID_STR)
     assert sanitized_str[18] == chr(0x20) == ' '
+
+
+def test_update_verdict(unsupported_queries, blanknode_queries):
+    for query in unsupported_queries.values():
+        verdict, cached = update_verdict(query)
+        assert isinstance(verdict, UnsupportedUpdateError)
+    for query in blanknode_queries:
+        verdict, cached = update_verdict(query)
+        assert isinstance(verdict, BlankNodeError)
+    multiline = 'INSERT DATA {\n  [\n    <http://x/p> "v"\n  ]\n}'
+    assert isinstance(update_verdict(multiline)[0], BlankNodeError)
+    # Keywords and brackets in IRIs, literals and prefixed names are fine.
+    harmless = '''
+        PREFIX my: <http://x/Add/[Create]>
+        # CLEAR ALL
+        INSERT DATA { my:load my:copy "Drop it [_:b]", my:move-add . }
+    '''
+    assert update_verdict(harmless) == (None, False)
+    assert update_verdict(harmless) == (None, True)
+
+
+def test_update_verdict_templates():
+    rejected = (
+        'INSERT DATA { GRAPH <http://x/g> { _:b <http://x/p> "v" } }',
+        'INSERT { [] <http://x/p> ?o } WHERE { ?s ?p ?o }',
+        'DELETE { GRAPH <http://x/g> { ?s ?p ?o } } '
+        'INSERT { GRAPH <http://x/g> { _:b ?p ?o } } WHERE { ?s ?p ?o }',
+    )
+    for query in rejected:
+        assert isinstance(update_verdict(query)[0], BlankNodeError)
+    # Blank nodes in the WHERE clause are variables.
+    accepted = (
+        'DELETE { ?s ?p ?o } WHERE { ?s ?p [] }',
+        'DELETE { GRAPH <http://x/g> { ?s ?p ?o } } WHERE { ?s ?p [] }',
+        'INSERT { GRAPH <http://x/g> { ?s ?p "v" } } WHERE { _:b ?p ?s }',
+    )
+    for query in accepted:
+        assert update_verdict(query)[0] is None
+
+
+def test_update_verdict_parses_once(monkeypatch, blanknode_queries):
+    parsed = []
+
+    def parse(updatestring):
+        parsed.append(updatestring)
+        return parseUpdate(updatestring)
+
+    monkeypatch.setattr(utils, 'parseUpdate', parse)
+    query = 'CLEAR GRAPH <http://x/g> ; ' + blanknode_queries[0]
+    update_verdict(query)
+    update_verdict(query)
+    assert parsed == [query]
+    update_verdict('INSERT DATA { <http://x/s> <http://x/p> "Add" }')
+    assert len(parsed) == 1
+
+
+def test_update_validated():
+    received = []
+
+    def receiver(sender, **kwargs):
+        received.append(kwargs)
+
+    update_validated.connect(receiver)
+    try:
+        query = 'INSERT DATA { <http://x/s> <http://x/p> "validated" }'
+        view = SPARQLUpdateAPIView()
+        view.check_supported(query)
+        view.check_supported(query)
+    finally:
+        update_validated.disconnect(receiver)
+    assert [r['cached'] for r in received] == [False, True]
+    assert all(r['duration'] >= 0 for r in received)
+    assert all(r['update'] == query for r in received)
+
+
+def test_page_query():
+    select = 'SELECT ?s WHERE { ?s ?p "LIMIT 3" . { SELECT ?s WHERE { ?s ?p ?o } LIMIT 1 } } ORDER BY ?s'
+    assert page_query(select, 10, 20) == select + '\nLIMIT 10 OFFSET 20'
+    limited = 'PREFIX ex: <http://example.com/>\nSELECT * { ?s ex:p ?o } OFFSET 5 LIMIT 25 # comment'
+    assert page_query(limited, 10, 0).endswith('{ ?s ex:p ?o }   # comment\nLIMIT 10 OFFSET 5')
+    assert page_query(limited, 10, 20).endswith('\nLIMIT 5 OFFSET 25')
+    assert page_query(limited, 10, 30).endswith('\nLIMIT 0 OFFSET 35')
+    assert page_query('ASK { ?s ?p ?o }', 10, 0) is None
+    assert page_query('CONSTRUCT { ?s ?p ?o } WHERE { SELECT * { ?s ?p ?o } }', 10, 0) is None
+    assert page_query('SELECT * { ?s ?p ?o } VALUES ?s { <http://a> }', 10, 0) is None
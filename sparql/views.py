@@ -1,27 +1,66 @@
-import re
+import asyncio
+import socket
+from time import perf_counter
 
-from django.http.response import HttpResponseBase
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
 from pyparsing import ParseException
 from rdf.ns import HTTP, HTTPSC, RDF
 from rdf.renderers import TurtleRenderer
-from rdf.utils import graph_from_triples
+from rdf.utils import graph_from_triples, graph_identifier, notify_graph_changed
+from rdf.connection import query_graph, query_timeout, update_graph
+from rdf.views import (AsyncViewMixin, ConditionalGetMixin, PaginationMixin,
+                       StreamingMixin, renderer_content_type)
 from rdf.views import custom_exception_handler as turtle_exception_handler
 from rdflib import BNode, Literal
-from rdflib.plugins.sparql.parser import parseUpdate
 from requests.exceptions import HTTPError
 from urllib.error import HTTPError as urllibHTTPError
 from rest_framework.exceptions import APIException, NotAcceptable, ParseError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .constants import (BLANK_NODE_PATTERN, SPARQL_NS, UPDATE_NOT_SUPPORTED,
-                        UPDATE_NOT_SUPPORTED_PATTERN)
-from .exceptions import (BlankNodeError, NoParamError, ParseSPARQLError,
-                         UnsupportedUpdateError)
+from .cost import estimate_query_cost
+from .exceptions import (NoParamError, ParseSPARQLError, QueryCostError,
+                         QueryTimeoutError, ResultSizeError)
 from .negotiation import SPARQLContentNegotiator
+from .signals import update_validated
+from .utils import page_query, update_verdict
 
 
 
+def sparql_error(error):
+    ''' The APIException to respond with for an error from a query or update. '''
+    if isinstance(error, (ParseException, ParseError, ValueError)):
+        # Raised when SPARQL syntax is not valid, or parsing fails
+        return ParseSPARQLError(error)
+    if isinstance(error, APIException):
+        return error
+    if isinstance(error, (TimeoutError, socket.timeout, asyncio.TimeoutError)):
+        return QueryTimeoutError()
+    if isinstance(error, HTTPError):
+        status = error.response.status_code
+    elif isinstance(error, urllibHTTPError):
+        status = error.code
+    else:
+        return APIException(error)
+    if 400 <= status < 500:
+        return ParseSPARQLError(error)
+    return APIException(error)
+
+
+def update_success_graph():
+    blank = BNode()
+    status = 200
+    return graph_from_triples(
+        (
+            (blank, RDF.type, HTTP.Response),
+            (blank, HTTP.statusCodeValue, Literal(status)),
+            (blank, HTTP.reasonPhrase, Literal("Updated successfully")),
+            (blank, HTTP.sc, HTTPSC.OK),
+        )
+    )
+
+
 class SPARQLUpdateAPIView(APIView):
     '''
     Parent class for an SPARL update request.
@@ -33,28 +72,21 @@ class SPARQLUpdateAPIView(APIView):
         return turtle_exception_handler
 
     def check_supported(self, updatestring):
-        # check the entire string for unsupported keywords
-        if re.match(UPDATE_NOT_SUPPORTED_PATTERN, updatestring):
-            # do a dry-run parse of the updatestring
-            parse_request = parseUpdate(updatestring).request
-            # check if the parse contains any unsupported operations
-            if any(part.name in UPDATE_NOT_SUPPORTED for part in parse_request):
-                raise UnsupportedUpdateError(
-                    'Update operation is not supported.'
-                )
-
-        # Do a quick check for blank nodes
-        if re.search(BLANK_NODE_PATTERN, updatestring):
-            parse_request = parseUpdate(updatestring).request
-            for part in parse_request:
-                if any(
-                        isinstance(term, BNode)
-                        for triple in part.quads.triples
-                        for term in triple
-                ):
-                    raise BlankNodeError()
-
-        return
+        ''' Raise if the update contains unsupported operations or blank
+        nodes. The `sparql.signals.update_validated` signal reports how
+        long the check took. '''
+        started = perf_counter()
+        cached = False
+        try:
+            verdict, cached = update_verdict(updatestring)
+        finally:
+            update_validated.send(
+                sender=type(self), update=updatestring,
+                duration=perf_counter() - started, cached=cached,
+            )
+        if verdict is not None:
+            # Raise a copy, so the cached verdict keeps no traceback.
+            raise type(verdict)(verdict.detail)
 
     def execute_update(self, updatestring):
         graph = self.graph()
@@ -62,25 +94,14 @@ class SPARQLUpdateAPIView(APIView):
         try:
             self.check_supported(updatestring)
             graph.update(updatestring)
-        except (ParseException, ParseError, ValueError) as p_e:
-            # Raised when SPARQL syntax is not valid, or parsing fails
-            graph.rollback()
-            raise ParseSPARQLError(p_e)
-        except HTTPError as h_e:
-            graph.rollback()
-            if 400 <= h_e.response.status_code < 500:
-                raise ParseSPARQLError(h_e)
-            else:
-                raise APIException(h_e)
-        except urllibHTTPError as u_h_e:
-            graph.rollback()
-            if 400 <= u_h_e.code < 500:
-                raise ParseSPARQLError(u_h_e)
-            else:
-                raise APIException(u_h_e)
         except Exception as e:
             graph.rollback()
-            raise APIException(e)
+            raise sparql_error(e)
+        notify_graph_changed(graph)
+
+    def update_response(self, updatestring):
+        self.execute_update(updatestring)
+        return Response(update_success_graph())
 
     def post(self, request, **kwargs):
         """ Accepts POST request with SPARQL-Query in body parameter 'query'
@@ -90,29 +111,43 @@ class SPARQLUpdateAPIView(APIView):
         if not sparql_string:
             # POST must contain an update
             raise NoParamError()
-        blank = BNode()
-        status = 200
-        response = graph_from_triples(
-            (
-                (blank, RDF.type, HTTP.Response),
-                (blank, HTTP.statusCodeValue, Literal(status)),
-                (blank, HTTP.reasonPhrase, Literal("Updated successfully")),
-                (blank, HTTP.sc, HTTPSC.OK),
-            )
-        )
-        self.execute_update(sparql_string)
-
-        return Response(response)
+        return self.update_response(sparql_string)
 
     def graph(self):
         raise NotImplementedError
 
 
-class SPARQLQueryAPIView(APIView):
+class SPARQLQueryAPIView(ConditionalGetMixin, PaginationMixin, StreamingMixin,
+                         APIView):
     '''
     Parent class for a SPARQL query request.
+    Set `streaming = True` to stream large results (see
+    `rdf.views.StreamingMixin`).
+    Set `query_cache` to an instance of one of the classes in
+    `sparql.cache` to reuse the rendered results of repeated queries.
+    Cached results are not streamed.
+    Set `conditional = True` to answer repeated GET requests with
+    304 Not Modified while the graph is unchanged (see
+    `rdf.views.ConditionalGetMixin`).
+    Set `pagination_class` to `rdf.pagination.GraphPagination` to
+    page the graph (without a query) and the results of SELECT queries,
+    which are rewritten with LIMIT and OFFSET. Paginated responses are
+    not cached in `query_cache`.
+
+    Queries can be guarded against overloading the store:
+    `query_timeout` is the number of seconds that requests to a pooled
+    SPARQL store may take (see `rdf.connection.query_timeout`).
+    `max_rows` is the maximum number of SELECT solutions or CONSTRUCT
+    and DESCRIBE triples; SELECT queries are limited to one more
+    solution before they are sent. `max_query_cost` rejects queries that
+    are not bounded by a LIMIT when their estimated cost (see
+    `sparql.cost`) is higher.
     '''
-    
+    query_cache = None
+    query_timeout = None
+    max_rows = None
+    max_query_cost = None
+
     renderer_classes = SPARQLContentNegotiator.rdf_renderers + \
         SPARQLContentNegotiator.results_renderers
     content_negotiation_class = SPARQLContentNegotiator
@@ -136,39 +171,132 @@ class SPARQLQueryAPIView(APIView):
                 query_results = graph
                 query_type = "EMPTY"
             else:
+                querystring = self.guard_query(graph, querystring)
                 # See SPARQLUpdateAPIView.execute_update
-                query_results = graph.query(querystring)
+                with query_timeout(self.query_timeout):
+                    query_results = graph.query(querystring)
+                    self.check_result_size(query_results)
                 query_type = query_results.type
-            self.request.data["query_type"] = query_type
-
-            # re-perform content negotiation to determine if
-            # querytype satisfies accept header
-            neg = self.perform_content_negotiation(self.request)
-            self.request.accepted_renderer, self.request.accepted_media_type = neg
+            self.negotiate_query_type(query_type)
             return query_results
 
-        except (ParseException, ValueError) as p_e:
-            # Raised when SPARQL syntax is not valid, or parsing fails
-            graph.rollback()
-            raise ParseSPARQLError(p_e)
-        except HTTPError as h_e:
-            graph.rollback()
-            if 400 <= h_e.response.status_code < 500:
-                raise ParseSPARQLError(h_e)
-            else:
-                raise APIException(h_e)
-        except urllibHTTPError as u_h_e:
-            graph.rollback()
-            if 400 <= u_h_e.code < 500:
-                raise ParseSPARQLError(u_h_e)
-            else:
-                raise APIException(u_h_e)
         except NotAcceptable:
             graph.rollback()
             raise
-        except Exception as n_e:
+        except Exception as e:
             graph.rollback()
-            raise APIException(n_e)
+            raise sparql_error(e)
+
+    def guard_query(self, graph, querystring):
+        """
+        Apply `max_rows` and `max_query_cost` before a query is sent.
+
+        Returns the query to send.
+        """
+        if self.max_rows is not None:
+            limited = page_query(querystring, self.max_rows + 1, 0)
+            querystring = limited or querystring
+        if self.max_query_cost is not None:
+            cost = estimate_query_cost(querystring, tuple(graph.namespaces()))
+            if not cost.bounded and cost.score > self.max_query_cost:
+                raise QueryCostError()
+        return querystring
+
+    def check_result_size(self, query_results):
+        """ Raise ResultSizeError if the results exceed `max_rows`. """
+        if self.paginator is not None and query_results.type == 'SELECT':
+            # Checked per page, see results_page_response.
+            return
+        if self.max_rows is not None and query_results.type != 'ASK' and \
+                len(query_results) > self.max_rows:
+            raise ResultSizeError()
+
+    def negotiate_query_type(self, query_type):
+        self.request.data["query_type"] = query_type
+        # re-perform content negotiation to determine if
+        # querytype satisfies accept header
+        neg = self.perform_content_negotiation(self.request)
+        self.request.accepted_renderer, self.request.accepted_media_type = neg
+
+    def query_response(self, querystring):
+        """ Respond with the results of a query, from `query_cache` if possible.
+        """
+        if self.paginator is not None:
+            return self.paginated_response(querystring)
+        key, response = self.cached_response(querystring)
+        if response is not None:
+            return response
+        return self.results_response(key, self.execute_query(querystring))
+
+    def cached_response(self, querystring):
+        """ Return the cache key for a query and the cached response, if any.
+        """
+        cache = self.query_cache
+        if cache is None or not querystring:
+            return None, None
+        key = cache.make_key(
+            querystring, graph_identifier(self.graph()),
+            self.request.accepted_media_type
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            query_type, media_type, content = cached
+            self.negotiate_query_type(query_type)
+            # The key only covers the initially negotiated media type.
+            if self.request.accepted_media_type == media_type:
+                return key, HttpResponse(content, content_type=renderer_content_type(
+                    self.request.accepted_renderer
+                ))
+            self.request.data.pop("query_type")
+        return key, None
+
+    def paginated_response(self, querystring):
+        """ Respond with one page of the graph or of the SELECT results.
+        """
+        if not querystring:
+            return self.graph_page_response()
+        paged, limit = self.paged_query(querystring)
+        if paged is None:
+            return Response(self.execute_query(querystring))
+        return self.results_page_response(self.execute_query(paged), limit)
+
+    def graph_page_response(self):
+        paginator = self.paginator
+        page = paginator.paginate_graph(self.execute_query(None), self.request)
+        return paginator.get_paginated_response(page)
+
+    def paged_query(self, querystring):
+        """ Return the query for the requested page, or None, and its size.
+        One more solution than the page size is requested, in order to
+        find out whether there is a next page.
+        """
+        limit, offset = self.paginator.get_bounds(self.request)
+        return page_query(querystring, limit + 1, offset), limit
+
+    def results_page_response(self, query_results, limit):
+        bindings = query_results.bindings
+        self.paginator.has_next = len(bindings) > limit
+        query_results.bindings = bindings[:limit]
+        if self.max_rows is not None and len(query_results) > self.max_rows:
+            raise ResultSizeError()
+        return self.paginator.get_paginated_response(query_results)
+
+    def results_response(self, key, query_results):
+        """ Respond with `query_results`, storing them under `key` if given.
+        """
+        if key is None:
+            return Response(query_results)
+        renderer = self.request.accepted_renderer
+        media_type = self.request.accepted_media_type
+        content = renderer.render(
+            query_results, media_type, self.get_renderer_context()
+        )
+        if isinstance(content, str):
+            content = content.encode(renderer.charset or 'utf-8')
+        self.query_cache.set(key, (query_results.type, media_type, content))
+        return HttpResponse(
+            content, content_type=renderer_content_type(renderer)
+        )
 
     def get(self, request, **kwargs):
         """ Accepts GET request, optional SPARQL-Query
@@ -181,9 +309,7 @@ class SPARQLQueryAPIView(APIView):
         if request.data:
             raise ParseSPARQLError(
                 "GET request should provide query in parameter, not request body.")
-        query_results = self.execute_query(sparql_string)
-
-        return Response(query_results)
+        return self.query_response(sparql_string)
 
     def post(self, request, **kwargs):
         """ Accepts POST request with SPARQL-Query in body parameter 'query'.
@@ -195,9 +321,77 @@ class SPARQLQueryAPIView(APIView):
             raise NoParamError()
         # request.data is immutable for POST requests
         request.data._mutable = True
-        query_results = self.execute_query(sparql_string)
-
-        return Response(query_results)
+        return self.query_response(sparql_string)
 
     def graph(self):
         raise NotImplementedError
+
+
+class AsyncSPARQLUpdateAPIView(AsyncViewMixin, SPARQLUpdateAPIView):
+    '''
+    Asynchronous version of `SPARQLUpdateAPIView`, for use under ASGI.
+    Updates are sent with `rdf.connection.update_graph`.
+    '''
+
+    async def aexecute_update(self, updatestring):
+        graph = self.graph()
+
+        try:
+            self.check_supported(updatestring)
+            await update_graph(graph, updatestring)
+        except Exception as e:
+            graph.rollback()
+            raise sparql_error(e)
+        notify_graph_changed(graph)
+
+    async def update_response(self, updatestring):
+        await self.aexecute_update(updatestring)
+        return Response(update_success_graph())
+
+
+class AsyncSPARQLQueryAPIView(AsyncViewMixin, SPARQLQueryAPIView):
+    '''
+    Asynchronous version of `SPARQLQueryAPIView`, for use under ASGI.
+    Queries are sent with `rdf.connection.query_graph`.
+    '''
+
+    async def aexecute_query(self, querystring):
+        graph = self.graph()
+        try:
+            if not querystring:
+                # Rendered in a thread, like the graph of execute_query.
+                query_results = graph
+                query_type = "EMPTY"
+            else:
+                querystring = self.guard_query(graph, querystring)
+                with query_timeout(self.query_timeout):
+                    query_results = await query_graph(graph, querystring)
+                    self.check_result_size(query_results)
+                query_type = query_results.type
+            self.negotiate_query_type(query_type)
+            return query_results
+
+        except NotAcceptable:
+            graph.rollback()
+            raise
+        except Exception as e:
+            graph.rollback()
+            raise sparql_error(e)
+
+    async def query_response(self, querystring):
+        if self.paginator is not None:
+            return await self.apaginated_response(querystring)
+        key, response = self.cached_response(querystring)
+        if response is not None:
+            return response
+        return self.results_response(key, await self.aexecute_query(querystring))
+
+    async def apaginated_response(self, querystring):
+        if not querystring:
+            return await sync_to_async(
+                self.graph_page_response, thread_sensitive=False
+            )()
+        paged, limit = self.paged_query(querystring)
+        if paged is None:
+            return Response(await self.aexecute_query(querystring))
+        return self.results_page_response(await self.aexecute_query(paged), limit)
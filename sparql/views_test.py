@@ -1,13 +1,18 @@
 import json
 
 import pytest
+from asgiref.sync import async_to_sync
+from rdf.connection import PooledSPARQLUpdateStore
 from rdf.ns import SCHEMA
+from rdf.pagination import GraphPagination
 from rdflib.namespace import Namespace
 from rdf.utils import graph_from_triples
-from rdflib import XSD, Graph, Literal
+from rdflib import XSD, Graph, Literal, URIRef
 
 from .exceptions import BlankNodeError
-from .views import SPARQLUpdateAPIView
+from .views import (AsyncSPARQLQueryAPIView, AsyncSPARQLUpdateAPIView,
+                    SPARQLQueryAPIView, SPARQLUpdateAPIView)
+from .test_app.constants import SOURCES_NS
 from .test_app.views import QueryView, UpdateView, NLPQueryView
 from .conftest import nlp
 
@@ -204,3 +209,132 @@ def test_result_negotiation(query_client, accept_headers, test_queries):
         QUERY_URL, {'query': test_queries.SELECT},
         HTTP_ACCEPT=accept_headers.json)
     assert regular_json.status_code == 406
+
+
+def test_async_views(local_endpoint, test_queries, triples):
+    store = PooledSPARQLUpdateStore(local_endpoint.url, local_endpoint.url)
+    graph = Graph(store, identifier=URIRef(SOURCES_NS))
+    factory = APIRequestFactory()
+    query_view = type('AsyncQueryView', (AsyncSPARQLQueryAPIView,), {
+        'graph': lambda self: graph,
+    }).as_view()
+    update_view = type('AsyncUpdateView', (AsyncSPARQLUpdateAPIView,), {
+        'graph': lambda self: graph,
+    }).as_view()
+
+    def get(data=None, **kwargs):
+        request = factory.get(QUERY_URL, data, **kwargs)
+        return async_to_sync(query_view)(request).render()
+
+    def post(data):
+        request = factory.post(UPDATE_URL, data)
+        return async_to_sync(update_view)(request).render()
+
+    assert post({'update': test_queries.INSERT}).status_code == 200
+    stored = local_endpoint.dataset.get_context(URIRef(SOURCES_NS))
+    assert set(stored) == set(triples)
+
+    response = get()
+    assert check_content_type(response, 'text/turtle')
+    assert len(Graph().parse(data=response.content, format='turtle')) == 3
+    # The whole graph is not copied, but rendered through the store.
+    queries = store._queries
+    assert queries > 0
+    response = get({'query': test_queries.ASK_TRUE})
+    assert json.loads(response.content)['boolean']
+    response = get({'query': test_queries.SELECT}, HTTP_ACCEPT='text/csv')
+    assert check_content_type(response, 'text/csv')
+    assert get({'query': 'this is no SPARQL query!'}).status_code == 400
+
+    conditional_view = type('ConditionalQueryView', (AsyncSPARQLQueryAPIView,), {
+        'graph': lambda self: graph,
+        'conditional': True,
+    }).as_view()
+    request = factory.get(QUERY_URL, {'query': test_queries.ASK_TRUE})
+    etag = async_to_sync(conditional_view)(request).render()['ETag']
+    requests = len(local_endpoint.log)
+    request = factory.get(
+        QUERY_URL, {'query': test_queries.ASK_TRUE}, HTTP_IF_NONE_MATCH=etag,
+    )
+    assert async_to_sync(conditional_view)(request).status_code == 304
+    assert len(local_endpoint.log) == requests
+
+    unsupported = post({'update': 'CLEAR ALL'})
+    assert unsupported.status_code == 400
+    assert b'Update operation is not supported.' in unsupported.content
+    assert store._queries == queries
+    assert store._updates == 0
+
+
+def test_paginated_select(local_endpoint, triples):
+    store = PooledSPARQLUpdateStore(local_endpoint.url, local_endpoint.url)
+    graph = Graph(store, identifier=URIRef(SOURCES_NS))
+    graph.addN((s, p, o, graph) for s, p, o in triples)
+    factory = APIRequestFactory()
+    attributes = {
+        'graph': lambda self: graph,
+        'pagination_class': GraphPagination,
+    }
+    sync_view = type('PagedQueryView', (SPARQLQueryAPIView,), attributes).as_view()
+    async_view = type('AsyncPagedQueryView', (AsyncSPARQLQueryAPIView,), attributes).as_view()
+    query = 'SELECT ?s ?p ?o WHERE { ?s ?p ?o } ORDER BY ?s ?p ?o'
+
+    for view in (sync_view, async_to_sync(async_view)):
+        def get(data, **kwargs):
+            return view(factory.get(QUERY_URL, data, **kwargs)).render()
+
+        first = get({'query': query, 'page_size': 2})
+        assert first.status_code == 200
+        assert 'rel="next"' in first['Link']
+        rows = json.loads(first.content)['results']['bindings']
+        assert len(rows) == 2
+        second = get({'query': query, 'page_size': 2, 'page': 2})
+        assert 'rel="next"' not in second['Link']
+        assert 'rel="prev"' in second['Link']
+        rest = json.loads(second.content)['results']['bindings']
+        assert len(rows + rest) == len(triples)
+        assert rows[0] not in rest
+        ask = get({'query': 'ASK { ?s ?p ?o }'})
+        assert 'Link' not in ask
+        assert json.loads(ask.content)['boolean']
+        page = get({'page_size': 1}, HTTP_ACCEPT='text/turtle')
+        assert 'rel="next"' in page['Link']
+
+
+def test_query_guards(local_endpoint, triples):
+    graph = graph_from_triples(triples)
+    factory = APIRequestFactory()
+
+    def get(view_class, data, **attributes):
+        view = type('GuardedQueryView', (view_class,), {
+            'graph': lambda self: graph, **attributes,
+        }).as_view()
+        if view_class is AsyncSPARQLQueryAPIView:
+            view = async_to_sync(view)
+        return view(factory.get(QUERY_URL, data)).render()
+
+    everything = {'query': 'SELECT * WHERE { ?s ?p ?o }'}
+    limited = {'query': 'SELECT * WHERE { ?s ?p ?o } LIMIT 1'}
+    for view_class in (SPARQLQueryAPIView, AsyncSPARQLQueryAPIView):
+        costly = get(view_class, everything, max_query_cost=100)
+        assert costly.status_code == 400
+        assert b'too expensive' in costly.content
+        assert get(view_class, limited, max_query_cost=100).status_code == 200
+        # With max_rows, SELECT queries are limited before they run.
+        response = get(view_class, everything, max_query_cost=100,
+                       max_rows=len(triples))
+        assert response.status_code == 200
+        rows = json.loads(response.content)['results']['bindings']
+        assert len(rows) == len(triples)
+        too_many = get(view_class, everything, max_rows=len(triples) - 1)
+        assert too_many.status_code == 400
+        assert b'too many results' in too_many.content
+        construct = {'query': 'CONSTRUCT WHERE { ?s ?p ?o }'}
+        assert get(view_class, construct, max_rows=1).status_code == 400
+
+    store = PooledSPARQLUpdateStore(local_endpoint.url, local_endpoint.url)
+    graph = Graph(store, identifier=URIRef(SOURCES_NS))
+    local_endpoint.delay = 0.5
+    for view_class in (SPARQLQueryAPIView, AsyncSPARQLQueryAPIView):
+        response = get(view_class, limited, query_timeout=0.1)
+        assert response.status_code == 504